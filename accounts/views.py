@@ -4,6 +4,9 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import generics
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.views import TokenObtainPairView
+from store import guest_cart
 from .serializers import UserRegistrationSerializer, CustomerProfileSerializer
 from .models import User
 from .models import CustomerProfile
@@ -34,4 +37,25 @@ class CustomerProfileView(generics.RetrieveUpdateAPIView):
 
     def get_object(self):
         profile, _ = CustomerProfile.objects.get_or_create(user=self.request.user)
-        return profile
\ No newline at end of file
+        return profile
+
+
+class LoginView(TokenObtainPairView):
+    """
+    JWT login. If the request carries a guest cart token (X-Cart-Token),
+    that cart is merged into the customer's cart and the outcome is
+    returned under "cart".
+    """
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except TokenError as e:
+            raise InvalidToken(e.args[0])
+
+        data = dict(serializer.validated_data)
+        cart_token = request.headers.get(guest_cart.HEADER)
+        if cart_token and guest_cart.is_valid_token(cart_token) and serializer.user.is_customer():
+            data["cart"] = guest_cart.merge_into_user(cart_token, serializer.user)
+        return Response(data, status=status.HTTP_200_OK)
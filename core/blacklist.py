@@ -0,0 +1,185 @@
+"""
+In-process snapshot of the active IP blacklist.
+
+IPBlacklistMiddleware runs on every request, so it must not query the
+database. Each process keeps the active BlacklistedIP rows in memory:
+single addresses in a dict {(4 or 6, address as int): expires_at (epoch
+seconds, or inf)}, so any spelling of an address finds its entry; CIDR
+blocks and ranges in one radix trie per address family (core/iptrie.py).
+is_blocked() is an address parse and a dict lookup, plus a trie walk (one
+step per address bit at most) only when there are blocks. An entry past its expires_at stops
+blocking right away even though its row is still active.
+
+Invalidation: every change to BlacklistedIP (admin, analyze_logs, seeds,
+API) bumps a version number in the shared cache (core/signals.py, on
+commit). A process compares its snapshot's version with the shared one at
+most every BLACKLIST_VERSION_CHECK_INTERVAL seconds and reloads on a mismatch, so a
+change reaches every worker within about that long; the process that
+made the change reloads immediately.
+
+Expired rows are deactivated in bulk by deactivate_expired(), run from
+Celery beat ("deactivate_expired_blacklist"), instead of inside a request.
+"""
+import logging
+import math
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .iptrie import PrefixTrie
+from .models import BlacklistedIP
+from .utils import parse_ip_block
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "blacklist:version"
+DEFAULT_VERSION_CHECK_INTERVAL = 1.0
+V4_MAPPED = b"\x00" * 10 + b"\xff\xff"
+
+
+def bump_version():
+    """
+    Make every process reload its snapshot.
+    """
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+    snapshot.invalidate()
+
+
+def _current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # never set, or evicted: seed one so all processes agree on it
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+class BlacklistSnapshot:
+    def __init__(self):
+        # (hosts, IPv4 trie, IPv6 trie), replaced as a whole; empty tries are None
+        self._state = ({}, None, None)
+        self._loaded = False
+        self._version = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def is_blocked(self, ip):
+        if time.monotonic() >= self._next_check:
+            self._refresh()
+        hosts, v4, v6 = self._state
+        # normalized first: "::ffff:1.2.3.4" or a long IPv6 form must hit
+        # the same entry as the canonical address
+        version, address = _parse(ip)
+        if version is None:
+            return False
+        expires_at = hosts.get((version, address))
+        if expires_at is not None and time.time() < expires_at:
+            return True
+        trie = v4 if version == 4 else v6
+        return trie is not None and trie.longest_match(address, time.time()) >= 0
+
+    def invalidate(self):
+        self._version = None
+        self._next_check = 0.0
+
+    def _refresh(self):
+        # one thread checks; the others keep using the current snapshot
+        # (unless there is none yet)
+        if not self._lock.acquire(blocking=not self._loaded):
+            return
+        try:
+            interval = getattr(settings, "BLACKLIST_VERSION_CHECK_INTERVAL", DEFAULT_VERSION_CHECK_INTERVAL)
+            self._next_check = time.monotonic() + interval
+            version = _current_version()
+            if version != self._version:
+                # version first: a change landing during the load bumps it again
+                self._state = self._load()
+                self._version = version
+                self._loaded = True
+        except Exception:
+            # keep serving the last snapshot; try again next interval
+            logger.exception("Could not refresh the IP blacklist")
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def _load():
+        hosts, tries = {}, {4: PrefixTrie(32), 6: PrefixTrie(128)}
+        rows = (
+            BlacklistedIP.objects
+            .filter(active=True)
+            .exclude(expires_at__lte=timezone.now())
+            .values_list("ip_address", "expires_at")
+        )
+        for entry, expires_at in rows:
+            expires_at = expires_at.timestamp() if expires_at else math.inf
+            try:
+                networks = parse_ip_block(entry)
+            except ValueError:
+                logger.warning("Ignoring blacklist entry %r: not an address, block or range", entry)
+                continue
+            for network in networks:
+                version, address, length = _normalize(network)
+                if length == (32 if version == 4 else 128):
+                    host = (version, address)
+                    hosts[host] = max(hosts.get(host, 0), expires_at)
+                else:
+                    tries[version].insert(address, length, expires_at)
+        return hosts, tries[4] or None, tries[6] or None
+
+
+def _normalize(network):
+    """
+    (version, network address as int, prefix length), with IPv4-mapped
+    IPv6 networks (::ffff:a.b.c.d/96 and longer) as IPv4, like _parse().
+    """
+    address = int(network.network_address)
+    if network.version == 6 and network.prefixlen >= 96 and address >> 32 == 0xFFFF:
+        return 4, address & 0xFFFFFFFF, network.prefixlen - 96
+    return network.version, address, network.prefixlen
+
+
+def _parse(ip):
+    """
+    (4 or 6, address as int), or (None, None) for anything else.
+    IPv4-mapped IPv6 addresses count as IPv4.
+    """
+    try:
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, ip), "big")
+    except (OSError, ValueError):
+        pass
+    try:
+        packed = socket.inet_pton(socket.AF_INET6, ip)
+    except (OSError, ValueError):
+        return None, None
+    if packed[:12] == V4_MAPPED:
+        return 4, int.from_bytes(packed[12:], "big")
+    return 6, int.from_bytes(packed, "big")
+
+
+snapshot = BlacklistSnapshot()
+
+
+def is_blocked(ip):
+    return snapshot.is_blocked(ip)
+
+
+def deactivate_expired(now=None):
+    """
+    Mark every expired, still active entry inactive in one UPDATE. Returns
+    the number of rows changed.
+    """
+    changed = BlacklistedIP.objects.filter(
+        active=True,
+        expires_at__lte=now or timezone.now(),
+    ).update(active=False)
+    if changed:
+        bump_version()
+    return changed
@@ -0,0 +1,394 @@
+"""
+Cache backends shared by all gunicorn workers.
+
+TwoTierCache
+    A small bounded in-process LRU (L1) in front of a shared cache (L2),
+    which is any other alias in settings.CACHES: Redis in production, or
+    SQLiteCache below on a single box / in tests. Counters (incr/decr) and
+    keys listed in L2_ONLY_PREFIXES always go to L2 so every worker sees
+    the same value.
+
+SQLiteCache
+    File-backed stand-in for Redis. Every process on the host that points at
+    the same file shares entries, and incr() is atomic across them.
+"""
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# Django builds one backend instance per thread, so (like LocMemCache) the
+# in-process tier lives at module level, keyed by cache name.
+_l1_stores = {}
+_l1_locks = {}
+_fill_locks = {}
+_stats = {}
+
+
+class TwoTierCache(BaseCache):
+    """
+    OPTIONS:
+        L2                 alias of the shared cache (required)
+        L1_MAX_ENTRIES     size of the in-process LRU (default 1000)
+        L1_TIMEOUT         max seconds a value lives in L1 (default 5)
+        L2_ONLY_PREFIXES   keys that must never be served from L1
+        LOCK_TIMEOUT       seconds to wait on another worker filling a key
+    """
+
+    def __init__(self, name, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._l2_alias = options["L2"]
+        self._l1_max_entries = int(options.get("L1_MAX_ENTRIES", 1000))
+        self._l1_timeout = float(options.get("L1_TIMEOUT", 5))
+        self._l2_only_prefixes = tuple(options.get("L2_ONLY_PREFIXES", ()))
+        self._lock_timeout = float(options.get("LOCK_TIMEOUT", 10))
+
+        self._l1 = _l1_stores.setdefault(name, OrderedDict())
+        self._l1_lock = _l1_locks.setdefault(name, threading.Lock())
+        self._fill_locks = _fill_locks.setdefault(name, {})
+        self._stats = _stats.setdefault(
+            name, {"l1_hits": 0, "l1_misses": 0, "l2_hits": 0, "l2_misses": 0}
+        )
+
+    @property
+    def l2(self):
+        return caches[self._l2_alias]
+
+    # ---------- L1 helpers ----------
+
+    def _l1_key(self, key, version):
+        return self.make_and_validate_key(key, version=version)
+
+    def _uses_l1(self, key):
+        return not key.startswith(self._l2_only_prefixes)
+
+    def _l1_get(self, key, version):
+        l1_key = self._l1_key(key, version)
+        with self._l1_lock:
+            entry = self._l1.get(l1_key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._l1[l1_key]
+                self._stats["l1_misses"] += 1
+                return self._missing_key
+            self._l1.move_to_end(l1_key)
+            self._stats["l1_hits"] += 1
+            pickled = entry[1]
+        return pickle.loads(pickled)
+
+    def _l1_set(self, key, value, timeout, version):
+        if not self._uses_l1(key):
+            return
+        ttl = self._l1_timeout
+        if timeout is not DEFAULT_TIMEOUT and timeout is not None:
+            ttl = min(ttl, timeout)
+        if ttl <= 0:
+            self._l1_delete(key, version)
+            return
+        l1_key = self._l1_key(key, version)
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._l1_lock:
+            self._l1[l1_key] = (time.monotonic() + ttl, pickled)
+            self._l1.move_to_end(l1_key)
+            while len(self._l1) > self._l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_delete(self, key, version):
+        with self._l1_lock:
+            self._l1.pop(self._l1_key(key, version), None)
+
+    def _count_l2(self, hit):
+        with self._l1_lock:
+            self._stats["l2_hits" if hit else "l2_misses"] += 1
+
+    # ---------- cache API ----------
+
+    def get(self, key, default=None, version=None):
+        if self._uses_l1(key):
+            value = self._l1_get(key, version)
+            if value is not self._missing_key:
+                return value
+
+        value = self.l2.get(key, self._missing_key, version=version)
+        self._count_l2(value is not self._missing_key)
+        if value is self._missing_key:
+            return default
+        self._l1_set(key, value, DEFAULT_TIMEOUT, version)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l2.set(key, value, timeout=timeout, version=version)
+        self._l1_set(key, value, timeout, version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.l2.add(key, value, timeout=timeout, version=version)
+        if added:
+            self._l1_set(key, value, timeout, version)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.l2.touch(key, timeout=timeout, version=version)
+
+    def delete(self, key, version=None):
+        self._l1_delete(key, version)
+        return self.l2.delete(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        # Atomic in L2; L1 must not keep an old copy
+        self._l1_delete(key, version)
+        return self.l2.incr(key, delta, version=version)
+
+    def decr(self, key, delta=1, version=None):
+        return self.incr(key, -delta, version=version)
+
+    def has_key(self, key, version=None):
+        return self.get(key, self._missing_key, version=version) is not self._missing_key
+
+    def get_many(self, keys, version=None):
+        found = {}
+        remaining = []
+        for key in keys:
+            value = self._l1_get(key, version) if self._uses_l1(key) else self._missing_key
+            if value is self._missing_key:
+                remaining.append(key)
+            else:
+                found[key] = value
+
+        if remaining:
+            from_l2 = self.l2.get_many(remaining, version=version)
+            with self._l1_lock:
+                self._stats["l2_hits"] += len(from_l2)
+                self._stats["l2_misses"] += len(remaining) - len(from_l2)
+            for key, value in from_l2.items():
+                self._l1_set(key, value, DEFAULT_TIMEOUT, version)
+            found.update(from_l2)
+        return found
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.l2.set_many(data, timeout=timeout, version=version)
+        for key, value in data.items():
+            if key not in failed:
+                self._l1_set(key, value, timeout, version)
+        return failed
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._l1_delete(key, version)
+        self.l2.delete_many(keys, version=version)
+
+    def clear(self):
+        with self._l1_lock:
+            self._l1.clear()
+        self.l2.clear()
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        """
+        Stampede-protected get_or_set.
+
+        On a miss only one caller per key computes `default`: threads in this
+        process wait on a local lock, other workers wait on a short-lived L2
+        lock key and poll for the value. A callable returning None is not
+        cached.
+        """
+        value = self.get(key, self._missing_key, version=version)
+        if value is not self._missing_key:
+            return value
+        if not callable(default):
+            self.add(key, default, timeout=timeout, version=version)
+            return self.get(key, default, version=version)
+
+        with self._local_fill_lock(key):
+            value = self.get(key, self._missing_key, version=version)
+            if value is not self._missing_key:
+                return value
+
+            lock_key = f"{key}:fill-lock"
+            deadline = time.monotonic() + self._lock_timeout
+            locked = self.l2.add(lock_key, 1, timeout=self._lock_timeout, version=version)
+            while not locked:
+                if time.monotonic() >= deadline:
+                    # compute anyway, but the lock is still someone else's
+                    break
+                time.sleep(0.05)
+                value = self.l2.get(key, self._missing_key, version=version)
+                if value is not self._missing_key:
+                    self._l1_set(key, value, timeout, version)
+                    return value
+                locked = self.l2.add(lock_key, 1, timeout=self._lock_timeout, version=version)
+
+            try:
+                value = default()
+                if value is not None:
+                    self.set(key, value, timeout=timeout, version=version)
+                return value
+            finally:
+                if locked:
+                    self.l2.delete(lock_key, version=version)
+
+    def _local_fill_lock(self, key):
+        with self._l1_lock:
+            lock = self._fill_locks.get(key)
+            if lock is None:
+                if len(self._fill_locks) > self._l1_max_entries:
+                    self._fill_locks.clear()
+                lock = self._fill_locks[key] = threading.Lock()
+        return lock
+
+    def tier_stats(self):
+        with self._l1_lock:
+            stats = dict(self._stats)
+            stats["l1_entries"] = len(self._l1)
+        return stats
+
+
+class SQLiteCache(BaseCache):
+    """
+    Shared cache in a local SQLite file (LOCATION is the file path).
+    Meant for tests and single-host deployments without Redis.
+    """
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+    # purge expired rows every N writes from this process
+    cull_every = 500
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._writes = 0
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entry ("
+                " key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)"
+            )
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return _Transaction(conn)
+
+    def _expiry(self, timeout):
+        # absolute unix time, or None for "never expires"
+        return self.get_backend_timeout(timeout)
+
+    @staticmethod
+    def _live(row):
+        return row is not None and (row[1] is None or row[1] > time.time())
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._connection() as conn:
+            row = conn.execute("SELECT value, expires FROM cache_entry WHERE key = ?", (key,)).fetchone()
+        if not self._live(row):
+            return default
+        return pickle.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        key_map = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not key_map:
+            return {}
+        placeholders = ",".join("?" * len(key_map))
+        with self._connection() as conn:
+            rows = conn.execute(
+                f"SELECT key, value, expires FROM cache_entry WHERE key IN ({placeholders})",
+                list(key_map),
+            ).fetchall()
+        return {
+            key_map[key]: pickle.loads(value)
+            for key, value, expires in rows
+            if expires is None or expires > time.time()
+        }
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout=timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self._expiry(timeout)
+        rows = [
+            (self.make_and_validate_key(key, version=version), pickle.dumps(value, self.pickle_protocol), expires)
+            for key, value in data.items()
+        ]
+        with self._connection() as conn:
+            conn.executemany("INSERT OR REPLACE INTO cache_entry (key, value, expires) VALUES (?, ?, ?)", rows)
+            self._writes += 1
+            if self._writes % self.cull_every == 0:
+                conn.execute("DELETE FROM cache_entry WHERE expires < ?", (time.time(),))
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        with self._connection() as conn:
+            row = conn.execute("SELECT value, expires FROM cache_entry WHERE key = ?", (key,)).fetchone()
+            if self._live(row):
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entry (key, value, expires) VALUES (?, ?, ?)",
+                (key, pickled, self._expiry(timeout)),
+            )
+        return True
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._connection() as conn:
+            row = conn.execute("SELECT value, expires FROM cache_entry WHERE key = ?", (key,)).fetchone()
+            if not self._live(row):
+                raise ValueError("Key '%s' not found" % key)
+            new_value = pickle.loads(row[0]) + delta
+            conn.execute(
+                "UPDATE cache_entry SET value = ? WHERE key = ?",
+                (pickle.dumps(new_value, self.pickle_protocol), key),
+            )
+        return new_value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._connection() as conn:
+            cursor = conn.execute(
+                "UPDATE cache_entry SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)",
+                (self._expiry(timeout), key, time.time()),
+            )
+        return cursor.rowcount > 0
+
+    def has_key(self, key, version=None):
+        return self.get(key, self._missing_key, version=version) is not self._missing_key
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._connection() as conn:
+            cursor = conn.execute("DELETE FROM cache_entry WHERE key = ?", (key,))
+        return cursor.rowcount > 0
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self.delete(key, version=version)
+
+    def clear(self):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM cache_entry")
+
+
+class _Transaction:
+    """
+    BEGIN IMMEDIATE ... COMMIT, so read-modify-write (incr/add) is atomic
+    across processes sharing the file.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+from django.core.exceptions import ImproperlyConfigured
+
+from .ratelimit import load_policies, parse_rate
+from .request_log import OVERFLOW_POLICIES
+
+LOGGING_MIDDLEWARE = "core.middleware.SecurityLoggingMiddleware"
+
+
+@register()
+def check_request_logging(app_configs, **kwargs):
+    problems = []
+    listed = list(getattr(settings, "MIDDLEWARE", [])).count(LOGGING_MIDDLEWARE)
+    if listed > 1:
+        problems.append(Warning(
+            f"{LOGGING_MIDDLEWARE} is listed {listed} times in MIDDLEWARE.",
+            hint="Keep one entry; the extra ones skip requests that were already logged.",
+            id="core.W001",
+        ))
+    overflow = getattr(settings, "REQUEST_LOG_OVERFLOW", OVERFLOW_POLICIES[0])
+    if overflow not in OVERFLOW_POLICIES:
+        problems.append(Error(
+            f"REQUEST_LOG_OVERFLOW must be one of {', '.join(OVERFLOW_POLICIES)}, not {overflow!r}.",
+            id="core.E001",
+        ))
+    return problems
+
+
+@register()
+def check_rate_limits(app_configs, **kwargs):
+    problems = []
+    try:
+        load_policies(getattr(settings, "RATE_LIMIT_POLICIES", []))
+    except ImproperlyConfigured as exc:
+        problems.append(Error(str(exc), id="core.E002"))
+    rates = getattr(settings, "REST_FRAMEWORK", {}).get("DEFAULT_THROTTLE_RATES", {})
+    for scope, rate in rates.items():
+        if rate is None:
+            continue
+        try:
+            parse_rate(rate)
+        except ValueError as exc:
+            problems.append(Error(f"DEFAULT_THROTTLE_RATES[{scope!r}]: {exc}", id="core.E003"))
+    return problems
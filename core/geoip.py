@@ -0,0 +1,406 @@
+"""
+Local IP geolocation, with no network on the request path.
+
+The database is a list of address ranges [start, end] per family, sorted
+and non-overlapping, each pointing at a (country_code, country,
+continent_code, continent) record. Ranges sit in flat arrays (array('I')
+for IPv4; IPv6 starts/ends are Python ints), so a lookup is one bisect
+over the starts and one comparison with the matching end. It is built
+from a CSV or MMDB dump by `python manage.py import_geoip` and saved at
+GEOIP_DB_PATH in a compact binary file. Each process loads the file on
+first use. A process checks the file's mtime at most every
+GEOIP_RELOAD_CHECK_INTERVAL seconds and reloads it when it changes.
+
+In front of the database is a bounded LRU of recent addresses
+(GEOIP_CACHE_SIZE) to skip the parse and the search for regular clients.
+
+An address the database doesn't cover comes back empty. When
+GEOIP_HTTP_FALLBACK is on, it is also queued for a background thread that
+asks IPinfo Lite. The answer goes into the LRU, so later requests from
+that address get it. The queue is bounded and deduplicated, and private
+or reserved addresses are never sent. A failed fetch is remembered as
+unknown until it falls out of the LRU or the database reloads.
+
+stats() gives this process's counters: hits (LRU), found, missed, fetched,
+fetch_failed, dropped (queue full).
+"""
+import bisect
+import json
+import logging
+import os
+import queue
+import socket
+import struct
+import tempfile
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from ipaddress import ip_address
+
+import requests
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+IPINFO_LITE_URL = "https://ipinfo.io/{ip}/lite"
+RECORD_FIELDS = ("country_code", "country", "continent_code", "continent")
+UNKNOWN = (None, None, None, None)
+
+MAGIC = b"DUKAGEO1\n"
+V4_MAPPED = b"\x00" * 10 + b"\xff\xff"
+
+DEFAULT_CACHE_SIZE = 10000
+DEFAULT_RELOAD_CHECK_INTERVAL = 60.0
+DEFAULT_FALLBACK_QUEUE_SIZE = 1000
+DEFAULT_FALLBACK_TIMEOUT = 2.0
+
+
+def _parse(ip):
+    """
+    (4 or 6, address as int), or (None, None) for anything else.
+    IPv4-mapped IPv6 addresses count as IPv4.
+    """
+    try:
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, ip), "big")
+    except (OSError, ValueError, TypeError):
+        pass
+    try:
+        packed = socket.inet_pton(socket.AF_INET6, ip)
+    except (OSError, ValueError, TypeError):
+        return None, None
+    if packed[:12] == V4_MAPPED:
+        return 4, int.from_bytes(packed[12:], "big")
+    return 6, int.from_bytes(packed, "big")
+
+
+class RangeTable:
+    """
+    Sorted, non-overlapping ranges of one address family; `values[i]` is
+    the record index of [starts[i], ends[i]].
+    """
+
+    def __init__(self, bits, starts=None, ends=None, values=None):
+        self.bits = bits
+        # IPv6 addresses don't fit an array type; they stay Python ints
+        self.starts = starts if starts is not None else (array('I') if bits <= 32 else [])
+        self.ends = ends if ends is not None else (array('I') if bits <= 32 else [])
+        self.values = values if values is not None else array('I')
+
+    def __len__(self):
+        return len(self.values)
+
+    def find(self, address):
+        """
+        Record index of the range containing `address`, or -1.
+        """
+        index = bisect.bisect_right(self.starts, address) - 1
+        if index >= 0 and address <= self.ends[index]:
+            return self.values[index]
+        return -1
+
+    def nbytes(self):
+        size = self.values.itemsize * len(self.values)
+        if self.bits <= 32:
+            return size + self.starts.itemsize * (len(self.starts) + len(self.ends))
+        # ints of up to 128 bits: ~44 bytes each, plus the list slot
+        return size + 52 * (len(self.starts) + len(self.ends))
+
+
+class GeoDatabase:
+    def __init__(self, records=(), v4=None, v6=None):
+        self.records = list(records)
+        self.v4 = v4 or RangeTable(32)
+        self.v6 = v6 or RangeTable(128)
+
+    def __len__(self):
+        return len(self.v4) + len(self.v6)
+
+    def find(self, ip):
+        """
+        Record tuple for `ip` (str), or None when no range covers it.
+        """
+        version, address = _parse(ip)
+        if version is None:
+            return None
+        index = (self.v4 if version == 4 else self.v6).find(address)
+        return self.records[index] if index >= 0 else None
+
+    @classmethod
+    def build(cls, ranges):
+        """
+        From (version, start, end, record) tuples in any order. Overlaps
+        are cut (the range that starts first keeps the overlap) and
+        touching ranges with the same record are merged.
+        """
+        records, record_index = [], {}
+        by_family = {4: [], 6: []}
+        for version, start, end, record in ranges:
+            if start > end:
+                continue
+            index = record_index.get(record)
+            if index is None:
+                index = record_index[record] = len(records)
+                records.append(record)
+            by_family[version].append((start, end, index))
+
+        tables = {}
+        for version, bits in ((4, 32), (6, 128)):
+            table = tables[version] = RangeTable(bits)
+            last_end = -1
+            for start, end, index in sorted(by_family[version]):
+                start = max(start, last_end + 1)
+                if start > end:
+                    continue
+                if len(table) and table.values[-1] == index and table.ends[-1] + 1 == start:
+                    table.ends[-1] = end
+                else:
+                    table.starts.append(start)
+                    table.ends.append(end)
+                    table.values.append(index)
+                last_end = end
+        return cls(records, tables[4], tables[6])
+
+    # ---------- file format ----------
+    # MAGIC, header length (4 bytes), JSON header {records, v4, v6 counts},
+    # then per family: starts, ends (big-endian, 4 or 16 bytes each) and
+    # record indexes (big-endian uint32).
+
+    def save(self, path):
+        """
+        Write atomically: readers see the old file or the new one.
+        """
+        header = json.dumps({"records": self.records, "v4": len(self.v4), "v6": len(self.v6)}).encode()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".geoip-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                out.write(MAGIC)
+                out.write(struct.pack(">I", len(header)))
+                out.write(header)
+                for column in (self.v4.starts, self.v4.ends, self.v4.values):
+                    out.write(_big_endian(column).tobytes())
+                for column in (self.v6.starts, self.v6.ends):
+                    out.write(b"".join(value.to_bytes(16, "big") for value in column))
+                out.write(_big_endian(self.v6.values).tobytes())
+            # mkstemp makes it private; workers may run as another user
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as source:
+            if source.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a geolocation database (run import_geoip).")
+            (header_length,) = struct.unpack(">I", source.read(4))
+            header = json.loads(source.read(header_length))
+            tables = []
+            for key, bits, width in (("v4", 32, 4), ("v6", 128, 16)):
+                count = header[key]
+                starts, ends = (_read_column(source, count, width) for _ in range(2))
+                values = array('I')
+                values.frombytes(source.read(4 * count))
+                tables.append(RangeTable(bits, starts, ends, _big_endian(values)))
+        return cls([tuple(record) for record in header["records"]], *tables)
+
+
+def _big_endian(column):
+    # array has no byte order; swapping is its own inverse
+    if struct.pack("=I", 1) == struct.pack(">I", 1):
+        return column
+    swapped = array(column.typecode, column)
+    swapped.byteswap()
+    return swapped
+
+
+def _read_column(source, count, width):
+    raw = source.read(width * count)
+    if width == 4:
+        return _big_endian(array('I', raw))
+    return [int.from_bytes(raw[offset:offset + width], "big") for offset in range(0, len(raw), width)]
+
+
+def fetch(ip):
+    """
+    Ask IPinfo Lite about `ip` (blocking). Record tuple, or UNKNOWN.
+    """
+    params = {}
+    token = getattr(settings, "IP_GEOLOCATION_SETTINGS", {}).get("BACKEND_API_KEY")
+    if token:
+        params["token"] = token
+    try:
+        response = requests.get(
+            IPINFO_LITE_URL.format(ip=ip),
+            params=params,
+            timeout=getattr(settings, "GEOIP_FALLBACK_TIMEOUT", DEFAULT_FALLBACK_TIMEOUT),
+        )
+        response.raise_for_status()
+        raw = response.json()
+    except Exception:
+        logger.warning("IPinfo lookup failed for %s", ip, exc_info=True)
+        return None
+    return (
+        raw.get("country_code"),
+        raw.get("country") or raw.get("country_name"),
+        raw.get("continent_code"),
+        raw.get("continent") or raw.get("continent_name"),
+    )
+
+
+class Geolocator:
+    def __init__(self):
+        self._db = GeoDatabase()
+        self._mtime = None
+        self._loaded = False
+        self._next_check = 0.0
+        self._load_lock = threading.Lock()
+
+        self._recent = OrderedDict()
+        self._recent_lock = threading.Lock()
+        self._counters = {"hits": 0, "found": 0, "missed": 0, "fetched": 0, "fetch_failed": 0, "dropped": 0}
+
+        self._pid = None
+        self._queue = None
+        self._pending = set()
+
+    # ---------- request side ----------
+
+    def lookup(self, ip):
+        """
+        {"ip", "country_code", "country", "continent_code", "continent"}
+        for `ip`, or {} when it isn't known (yet). Never touches the
+        network.
+        """
+        if not ip:
+            return {}
+        if time.monotonic() >= self._next_check:
+            self._refresh()
+        with self._recent_lock:
+            record = self._recent.get(ip)
+            if record is not None:
+                self._recent.move_to_end(ip)
+                self._counters["hits"] += 1
+        if record is None:
+            record = self._db.find(ip)
+            if record is None:
+                self._count("missed")
+                self._request_fetch(ip)
+                return {}
+            self._count("found")
+            self._remember(ip, record)
+        if record is UNKNOWN:
+            return {}
+        return dict(zip(RECORD_FIELDS, record), ip=ip)
+
+    def _remember(self, ip, record):
+        size = getattr(settings, "GEOIP_CACHE_SIZE", DEFAULT_CACHE_SIZE)
+        with self._recent_lock:
+            self._recent[ip] = record
+            self._recent.move_to_end(ip)
+            while len(self._recent) > size:
+                self._recent.popitem(last=False)
+
+    def _count(self, name):
+        with self._recent_lock:
+            self._counters[name] += 1
+
+    # ---------- database file ----------
+
+    def _refresh(self):
+        # one thread checks; the others keep using the loaded database
+        # (unless there is none yet)
+        if not self._load_lock.acquire(blocking=not self._loaded):
+            return
+        try:
+            interval = getattr(settings, "GEOIP_RELOAD_CHECK_INTERVAL", DEFAULT_RELOAD_CHECK_INTERVAL)
+            self._next_check = time.monotonic() + interval
+            path = getattr(settings, "GEOIP_DB_PATH", None)
+            try:
+                mtime = os.stat(path).st_mtime_ns if path else None
+            except OSError:
+                mtime = None
+            if self._loaded and mtime == self._mtime:
+                return
+            if mtime is None:
+                logger.warning("No geolocation database at %s; run import_geoip", path)
+                db = GeoDatabase()
+            else:
+                db = GeoDatabase.load(path)
+            self._db, self._mtime, self._loaded = db, mtime, True
+            with self._recent_lock:
+                self._recent.clear()
+        except Exception:
+            # keep the last database; try again next interval
+            logger.exception("Could not load the geolocation database")
+        finally:
+            self._load_lock.release()
+
+    def reload(self):
+        self._loaded = False
+        self._next_check = 0.0
+
+    # ---------- HTTP fallback ----------
+
+    def _request_fetch(self, ip):
+        if not getattr(settings, "GEOIP_HTTP_FALLBACK", True):
+            return
+        try:
+            if not ip_address(ip).is_global:
+                return
+        except ValueError:
+            return
+        jobs = self._ensure_started()
+        with self._recent_lock:
+            if ip in self._pending:
+                return
+            self._pending.add(ip)
+        try:
+            jobs.put_nowait(ip)
+        except queue.Full:
+            with self._recent_lock:
+                self._pending.discard(ip)
+                self._counters["dropped"] += 1
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return self._queue
+        with self._recent_lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(
+                    maxsize=getattr(settings, "GEOIP_FALLBACK_QUEUE_SIZE", DEFAULT_FALLBACK_QUEUE_SIZE)
+                )
+                self._pending = set()
+                threading.Thread(target=self._run, args=(self._queue,), name="geoip-fallback", daemon=True).start()
+                self._pid = os.getpid()
+        return self._queue
+
+    def _run(self, jobs):
+        while True:
+            ip = jobs.get()
+            record = fetch(ip)
+            self._count("fetched" if record is not None else "fetch_failed")
+            self._remember(ip, record or UNKNOWN)
+            with self._recent_lock:
+                self._pending.discard(ip)
+
+    def stats(self):
+        with self._recent_lock:
+            counters = dict(self._counters)
+            counters["cached"] = len(self._recent)
+        counters["ranges"] = len(self._db)
+        return counters
+
+
+geolocator = Geolocator()
+
+
+def lookup(ip):
+    return geolocator.lookup(ip)
+
+
+def stats():
+    return geolocator.stats()
@@ -1,32 +1,27 @@
-import requests
 from django_ip_geolocation.backends.base import GeolocationBackend
 
+from . import geoip
+
 
 class IPinfoLiteBackend(GeolocationBackend):
     """
-    Custom backend for django-ip-geolocation that talks to IPinfo Lite.
+    Custom backend for django-ip-geolocation with IPinfo Lite's fields.
+
+    Answers come from the local range database (core/geoip.py), so the
+    request and response hooks never wait on the network; addresses it
+    doesn't know are looked up at IPinfo Lite in the background.
 
     IPinfo Lite docs: https://ipinfo.io/developers/lite-api
     """
 
-    
-    API_URL = "https://ipinfo.io/{ip}/lite"
+    API_URL = geoip.IPINFO_LITE_URL
 
     def geolocate(self):
         """
-        Call IPinfo Lite for this IP, store response in _raw_data,
-        and return parsed data dict (via base .data()).
+        Look this IP up locally, store the result in _raw_data (empty when
+        unknown), and return parsed data dict (via base .data()).
         """
-        url = self.API_URL.format(ip=self._ip or "")
-
-        try:
-            resp = requests.get(url, timeout=2)
-            resp.raise_for_status()
-            self._raw_data = resp.json()
-        except Exception:
-            # On failure, keep _raw_data empty; base .data() will still return a dict
-            self._raw_data = {}
-
+        self._raw_data = geoip.lookup(self._ip)
         return self.data()
 
     def _parse(self):
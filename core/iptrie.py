@@ -0,0 +1,132 @@
+"""
+Longest-prefix match over IP networks.
+
+PrefixTrie is a path-compressed binary (radix) trie for one address
+family. Nodes live in flat arrays indexed by node number rather than as
+Python objects, so a node costs ~17 bytes (IPv4) instead of a few hundred,
+and a trie of N prefixes has at most 2N - 1 nodes. A lookup walks at most
+one node per address bit, whatever the number of prefixes.
+
+Each prefix carries an expiry (epoch seconds, or NEVER); lookups skip
+expired ones, so a shorter prefix that is still live keeps matching.
+"""
+import math
+import sys
+from array import array
+
+NEVER = 0xFFFFFFFF
+
+
+def _expiry(expires_at):
+    """
+    Epoch seconds (float, or inf for never) -> stored value. 0 marks a
+    node that is only a branch point, so real expiries are at least 1.
+    """
+    if expires_at is None or math.isinf(expires_at):
+        return NEVER
+    return min(max(int(expires_at), 1), NEVER - 1)
+
+
+class PrefixTrie:
+    def __init__(self, bits):
+        self.bits = bits
+        # IPv6 keys don't fit an array type; they stay Python ints
+        self._keys = array('I') if bits <= 32 else []
+        self._lengths = array('B')
+        self._zero = array('i')
+        self._one = array('i')
+        self._expires = array('I')
+        self._root = -1
+        self.prefixes = 0
+
+    def __len__(self):
+        return self.prefixes
+
+    def _node(self, key, length, expires):
+        self._keys.append(key)
+        self._lengths.append(length)
+        self._zero.append(-1)
+        self._one.append(-1)
+        self._expires.append(expires)
+        return len(self._lengths) - 1
+
+    def _bit(self, key, position):
+        return (key >> (self.bits - 1 - position)) & 1
+
+    def _link(self, parent, bit, child):
+        if parent == -1:
+            self._root = child
+        else:
+            (self._one if bit else self._zero)[parent] = child
+
+    def insert(self, network, length, expires_at=None):
+        """
+        Add `network` (int, host bits zero) / `length`. Inserting the same
+        prefix again keeps the later expiry.
+        """
+        expires = _expiry(expires_at)
+        if self._root == -1:
+            self._root = self._node(network, length, expires)
+            self.prefixes += 1
+            return
+
+        parent, side, node = -1, 0, self._root
+        while True:
+            node_key, node_length = self._keys[node], self._lengths[node]
+            shortest = min(length, node_length)
+            diff = (network ^ node_key) >> (self.bits - shortest) if shortest else 0
+            common = shortest - diff.bit_length()
+
+            if common < node_length:
+                # `node` doesn't cover the new prefix: put a node above it
+                if common == length:
+                    top = self._node(network, length, expires)
+                    self.prefixes += 1
+                else:
+                    mask = ((1 << common) - 1) << (self.bits - common)
+                    top = self._node(network & mask, common, 0)
+                    leaf = self._node(network, length, expires)
+                    self.prefixes += 1
+                    self._link(top, self._bit(network, common), leaf)
+                self._link(top, self._bit(node_key, common), node)
+                self._link(parent, side, top)
+                return
+
+            if node_length == length:
+                if not self._expires[node]:
+                    self.prefixes += 1
+                self._expires[node] = max(self._expires[node], expires)
+                return
+
+            bit = self._bit(network, node_length)
+            child = (self._one if bit else self._zero)[node]
+            if child == -1:
+                self._link(node, bit, self._node(network, length, expires))
+                self.prefixes += 1
+                return
+            parent, side, node = node, bit, child
+
+    def longest_match(self, address, now):
+        """
+        Length of the longest unexpired prefix containing `address` (int),
+        or -1.
+        """
+        bits, keys, lengths, expires = self.bits, self._keys, self._lengths, self._expires
+        zero, one = self._zero, self._one
+        best, node = -1, self._root
+        while node != -1:
+            length = lengths[node]
+            if (address ^ keys[node]) >> (bits - length):
+                break
+            if expires[node] > now:
+                best = length
+            if length == bits:
+                break
+            node = (one if (address >> (bits - 1 - length)) & 1 else zero)[node]
+        return best
+
+    def nbytes(self):
+        size = sum(part.itemsize * len(part) for part in (self._lengths, self._zero, self._one, self._expires))
+        if isinstance(self._keys, array):
+            return size + self._keys.itemsize * len(self._keys)
+        return size + sys.getsizeof(self._keys) + sum(sys.getsizeof(key) for key in self._keys)
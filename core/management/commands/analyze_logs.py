@@ -1,10 +1,12 @@
 from datetime import timedelta
 
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from django.db.models import Count
 
 from core.models import RequestLog, SuspiciousIP, BlacklistedIP
+from core.utils import anonymized_block
 
 
 class Command(BaseCommand):
@@ -13,7 +15,21 @@ class Command(BaseCommand):
     WINDOW_MINUTES = 10
     THRESHOLD_REQUESTS = 200
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--exact",
+            action="store_true",
+            help=(
+                "Blacklist the logged address itself. By default, when logs are "
+                "anonymized (ANONYMIZE_IP), the whole block it stands for is "
+                "blacklisted (/24 for IPv4, /48 for IPv6)."
+            ),
+        )
+
     def handle(self, *args, **options):
+        # An anonymized address like 102.68.1.0 never matches a real client;
+        # its block does.
+        as_blocks = getattr(settings, "ANONYMIZE_IP", True) and not options["exact"]
         now = timezone.now()
         window_start = now - timedelta(minutes=self.WINDOW_MINUTES)
 
@@ -38,8 +54,12 @@ class Command(BaseCommand):
                 suspicious.save()
 
             # Optional: auto-blacklist
+            try:
+                block = anonymized_block(ip) if as_blocks else ip
+            except ValueError:
+                block = ip
             BlacklistedIP.objects.get_or_create(
-                ip_address=ip,
+                ip_address=block,
                 defaults={"reason": f"Auto-blacklisted due to {count} requests in {self.WINDOW_MINUTES} minutes"}
             )
 
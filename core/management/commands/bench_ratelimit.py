@@ -0,0 +1,92 @@
+import time
+import uuid
+
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.throttling import SimpleRateThrottle
+
+from core.ratelimit import SlidingWindowLimiter
+
+
+class Command(BaseCommand):
+    help = (
+        "Cost of one rate-limit check as a client's request count grows: "
+        "DRF's SimpleRateThrottle (a list of timestamps per client) against "
+        "the sliding-window engine in core/ratelimit.py (two counters per "
+        "client). Uses throwaway cache keys."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--history",
+            default="10,100,1000,10000",
+            help="Comma-separated numbers of earlier requests by the client (default: 10,100,1000,10000)",
+        )
+        parser.add_argument(
+            "--checks",
+            type=int,
+            default=500,
+            help="Checks timed per history size (default: 500)",
+        )
+        parser.add_argument(
+            "--cache",
+            default="",
+            help="Cache alias from CACHES to run against (default: a private in-memory cache)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(value) for value in options["history"].split(",") if value.strip()]
+        except ValueError:
+            raise CommandError("--history takes comma-separated integers, e.g. 10,100,1000.")
+        if not sizes or min(sizes) < 0:
+            raise CommandError("--history needs at least one size, none negative.")
+        checks = max(1, options["checks"])
+        store = caches[options["cache"]] if options["cache"] else LocMemCache("bench-ratelimit", {})
+        # high enough that every timed check is allowed, as for a normal client
+        limit = max(sizes) + checks + 1
+
+        self.stdout.write(f"{'history':>8}  {'DRF list':>12}  {'engine':>12}")
+        for size in sizes:
+            drf = self.time_drf(store, size, checks, limit)
+            engine = self.time_engine(store, size, checks, limit)
+            self.stdout.write(f"{size:>8}  {drf * 1e6:>10.1f}µs  {engine * 1e6:>10.1f}µs")
+
+    @staticmethod
+    def time_drf(store, size, checks, limit):
+        key = f"bench-ratelimit-drf-{uuid.uuid4().hex}"
+
+        class Throttle(SimpleRateThrottle):
+            cache = store
+            rate = f"{limit}/day"
+
+            def get_cache_key(self, request, view):
+                return key
+
+        throttle = Throttle()
+        store.set(key, [time.time()] * size, throttle.duration)
+        try:
+            started = time.perf_counter()
+            for _ in range(checks):
+                if not Throttle().allow_request(None, None):
+                    raise CommandError("DRF throttle refused a request below its limit.")
+            return (time.perf_counter() - started) / checks
+        finally:
+            store.delete(key)
+
+    @staticmethod
+    def time_engine(store, size, checks, limit):
+        key = f"bench-{uuid.uuid4().hex}"
+        window = 60 * 60 * 24
+        limiter = SlidingWindowLimiter(store)
+        for _ in range(size):
+            limiter.hit(key, limit, window)
+        try:
+            started = time.perf_counter()
+            for _ in range(checks):
+                if not limiter.hit(key, limit, window).allowed:
+                    raise CommandError("Rate limiter refused a request below its limit.")
+            return (time.perf_counter() - started) / checks
+        finally:
+            limiter.reset(key, window)
@@ -0,0 +1,158 @@
+import csv
+import gzip
+import io
+import os
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.geoip import GeoDatabase
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the local geolocation database (core/geoip.py) from a dump. "
+        "CSV (optionally .gz) with either a `network` column (CIDR, as in "
+        "IPinfo Lite) or `start_ip`/`end_ip` columns, plus country and "
+        "continent columns; or an MMDB file (needs the maxminddb package). "
+        "Running workers pick the new file up within GEOIP_RELOAD_CHECK_INTERVAL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV, CSV.gz or MMDB dump")
+        parser.add_argument(
+            "--format",
+            choices=["csv", "mmdb"],
+            default=None,
+            help="Dump format (default: from the file extension)",
+        )
+        parser.add_argument(
+            "--output",
+            default=None,
+            help="Where to write the database (default: GEOIP_DB_PATH)",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        output = options["output"] or getattr(settings, "GEOIP_DB_PATH", None)
+        if not output:
+            raise CommandError("Set GEOIP_DB_PATH or pass --output.")
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist.")
+        kind = options["format"] or ("mmdb" if path.endswith(".mmdb") else "csv")
+
+        started = time.perf_counter()
+        self.read = self.skipped = 0
+        ranges = self.read_mmdb(path) if kind == "mmdb" else self.read_csv(path)
+        db = GeoDatabase.build(ranges)
+        if not len(db):
+            raise CommandError(f"No usable ranges in {path} ({self.skipped} row(s) skipped).")
+        db.save(output)
+
+        self.stdout.write(
+            f"{self.read} row(s) read, {self.skipped} skipped -> {len(db.v4)} IPv4 and "
+            f"{len(db.v6)} IPv6 range(s), {len(db.records)} distinct location(s)."
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {output} ({os.path.getsize(output) / 1e6:.1f} MB) in {time.perf_counter() - started:.1f}s."
+        ))
+
+    def read_csv(self, path):
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rb") as raw:
+            rows = csv.DictReader(io.TextIOWrapper(raw, encoding="utf-8", newline=""))
+            columns = set(rows.fieldnames or ())
+            if "network" not in columns and not {"start_ip", "end_ip"} <= columns:
+                raise CommandError("The CSV needs a `network` column or `start_ip` and `end_ip` columns.")
+            for row in rows:
+                self.read += 1
+                try:
+                    if row.get("network"):
+                        version, start, end = network_span(row["network"])
+                    else:
+                        (version, start), (last_version, end) = (
+                            address(row["start_ip"]), address(row["end_ip"])
+                        )
+                        if version != last_version:
+                            raise ValueError("mixed address families")
+                except (ValueError, AttributeError):
+                    self.skipped += 1
+                    continue
+                yield version, start, end, location(row)
+
+    def read_mmdb(self, path):
+        try:
+            import maxminddb
+        except ImportError:
+            raise CommandError("Reading MMDB files needs the maxminddb package (pip install maxminddb).")
+        with maxminddb.open_database(path) as reader:
+            for network, record in reader:
+                self.read += 1
+                if not isinstance(record, dict):
+                    self.skipped += 1
+                    continue
+                yield (
+                    network.version,
+                    int(network.network_address),
+                    int(network.broadcast_address),
+                    location(record),
+                )
+
+
+def address(text):
+    """
+    "10.0.0.1" -> (4, int). inet_pton rather than ipaddress: dumps have
+    millions of rows. Raises ValueError.
+    """
+    text = text.strip()
+    for version, family in ((4, socket.AF_INET), (6, socket.AF_INET6)):
+        try:
+            return version, int.from_bytes(socket.inet_pton(family, text), "big")
+        except OSError:
+            pass
+    raise ValueError(f"{text!r} is not an IP address")
+
+
+def network_span(text):
+    """
+    "10.0.0.0/8" -> (4, first, last); host bits are ignored. Raises ValueError.
+    """
+    text, _, length = text.partition("/")
+    version, start = address(text)
+    bits = 32 if version == 4 else 128
+    length = int(length) if length else bits
+    if not 0 <= length <= bits:
+        raise ValueError(f"bad prefix length /{length}")
+    host_mask = (1 << (bits - length)) - 1
+    return version, start & ~host_mask, start | host_mask
+
+
+def location(record):
+    """
+    (country_code, country, continent_code, continent) from an IPinfo row
+    (country, country_code, continent, continent_code), IPinfo's older
+    country dump (country = code, country_name, continent = code,
+    continent_name) or a MaxMind record ({"country": {"iso_code", "names"}}).
+    """
+    def name(value):
+        if isinstance(value, dict):
+            return (value.get("names") or {}).get("en")
+        return value or None
+
+    def code(value):
+        if isinstance(value, dict):
+            return value.get("iso_code") or value.get("code")
+        return value or None
+
+    country, continent = record.get("country"), record.get("continent")
+    if "country_name" in record or isinstance(country, dict):
+        country_code, country = code(country), record.get("country_name") or name(country)
+    else:
+        country_code, country = record.get("country_code") or None, name(country)
+    if "continent_name" in record or isinstance(continent, dict):
+        continent_code, continent = code(continent), record.get("continent_name") or name(continent)
+    else:
+        continent_code, continent = record.get("continent_code") or None, name(continent)
+    return country_code, country, continent_code, continent
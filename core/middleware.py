@@ -2,9 +2,9 @@ import re
 from django.utils.deprecation import MiddlewareMixin
 from django.utils import timezone
 from django.conf import settings
-from .models import RequestLog, BlacklistedIP
+from . import blacklist, ratelimit, request_log
+from .models import RequestLog
 from .utils import get_client_ip, anonymize_ip
-from django.core.cache import cache
 from django.http import HttpResponse, HttpResponseForbidden
 
 SENSITIVE_PATHS = [
@@ -18,56 +18,56 @@ class IPBlacklistMiddleware(MiddlewareMixin):
     """
 
     def process_request(self, request):
-        ip = get_client_ip(request)
-
-        try:
-            entry = BlacklistedIP.objects.get(ip_address=ip, active=True)
-        except BlacklistedIP.DoesNotExist:
-            return None
-
-        # Optional: auto-deactivate expired entries
-        if entry.expires_at and entry.expires_at < timezone.now():
-            entry.active = False
-            entry.save()
-            return None
-
-        return HttpResponseForbidden("Access denied.")
+        # In-memory snapshot, no query; expired entries are skipped there
+        # and switched off by a scheduled sweep (core/blacklist.py)
+        if blacklist.is_blocked(get_client_ip(request)):
+            return HttpResponseForbidden("Access denied.")
+        return None
 
 class IPRateLimitMiddleware(MiddlewareMixin):
     """
-    IP-based rate limiting for non-API views like /admin.
-    Example: max 50 requests per 10 minutes per IP.
+    Per-route rate limits for any view, from RATE_LIMIT_POLICIES (by default
+    /admin: 30 requests per 10 minutes per IP, and login POSTs: 20 per
+    minute per IP). Every matching policy is checked, in order; the first
+    one over its limit answers 429 with Retry-After. Counting is atomic and
+    shared by all workers (core/ratelimit.py).
     """
 
-    WINDOW_SECONDS = 600  # 10 minutes
-    MAX_REQUESTS = 30
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.policies = ratelimit.load_policies(getattr(settings, "RATE_LIMIT_POLICIES", []))
 
     def process_request(self, request):
-        path = request.path
-        # Only apply to admin -can add other sensitive paths
-        if not path.startswith("/admin"):
-            return None
-
-        ip = get_client_ip(request)
-        key = f"rate:{ip}"
-
-        count = cache.get(key, 0)
-        if count >= self.MAX_REQUESTS:
-            return HttpResponse("Too many requests. Please try again later.", status=429)
-
-        # Increment
-        if count == 0:
-            cache.set(key, 1, timeout=self.WINDOW_SECONDS)
-        else:
-            cache.incr(key)
-
+        for policy in self.policies:
+            if policy.methods and request.method not in policy.methods:
+                continue
+            if not policy.path.search(request.path):
+                continue
+            ident = self._ident(request, policy.key)
+            if ident is None:
+                continue
+            decision = ratelimit.limiter.hit(f"{policy.name}:{ident}", policy.limit, policy.window)
+            if not decision.allowed:
+                response = HttpResponse("Too many requests. Please try again later.", status=429)
+                response["Retry-After"] = str(decision.retry_after)
+                return response
         return None
 
+    @staticmethod
+    def _ident(request, kind):
+        user = getattr(request, "user", None)
+        if kind != "ip" and user is not None and user.is_authenticated:
+            return f"user:{user.pk}"
+        if kind == "user":
+            return None
+        return f"ip:{get_client_ip(request)}"
+
 class SecurityLoggingMiddleware(MiddlewareMixin):
     """
     Logs IP, request path, method, UA, status.
     Flags sensitive endpoints like /admin.
     Supports IP anonymization for GDPR.
+    Rows are written in batches off the request path (core/request_log.py).
     """
 
     def process_request(self, request):
@@ -77,6 +77,10 @@ class SecurityLoggingMiddleware(MiddlewareMixin):
         return None
 
     def process_response(self, request, response):
+        # Listed twice in MIDDLEWARE (see core.checks): log once
+        if getattr(request, "_request_logged", False):
+            return response
+        request._request_logged = True
         try:
             ip = getattr(request, "_client_ip", None) or get_client_ip(request)
             path = request.path
@@ -94,15 +98,16 @@ class SecurityLoggingMiddleware(MiddlewareMixin):
             else:
                 ip_to_store = ip
 
-            # Use django-ip-geolocation’s geolocation object
-            geo = getattr(request, "geolocation", None)
-            country = getattr(geo, "country", None) if geo else None
-            country_code = getattr(geo, "country_code", None) if geo else None
+            # django-ip-geolocation's data dict; our backend's fields are under "geo"
+            geolocation = getattr(request, "geolocation", None)
+            geo = geolocation.get("geo") if isinstance(geolocation, dict) else None
+            country = geo.get("country") if geo else None
+            country_code = geo.get("country_code") if geo else None
             # IPinfo Lite doesn’t give city in Lite bundle, but it gives continent + ASN.:contentReference[oaicite:6]{index=6}
             city = None
 
-            RequestLog.objects.create(
-                user=user,
+            record = RequestLog(
+                user_id=user.pk if user else None,
                 ip_address=ip_to_store,
                 path=path,
                 method=method,
@@ -112,7 +117,12 @@ class SecurityLoggingMiddleware(MiddlewareMixin):
                 is_sensitive=is_sensitive,
                 country=country or country_code,
                 city=city,
+                created_at=getattr(request, "_requested_at", None) or timezone.now(),
             )
+            if request_log.buffered():
+                request_log.writer.add(record)
+            else:
+                record.save(force_insert=True)
         except Exception:
             pass
 
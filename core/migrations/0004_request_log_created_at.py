@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-17 06:47
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_suspiciousip'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='requestlog',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-17 06:53
+
+import core.utils
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_request_log_created_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='blacklistedip',
+            name='ip_address',
+            field=models.CharField(help_text='IP address, CIDR block (10.0.0.0/8) or range (10.0.0.1-10.0.0.9).', max_length=100, unique=True, validators=[core.utils.validate_ip_block]),
+        ),
+    ]
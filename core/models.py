@@ -1,5 +1,8 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
+
+from .utils import validate_ip_block
 
 
 class RequestLog(models.Model):
@@ -21,7 +24,8 @@ class RequestLog(models.Model):
     referer = models.TextField(blank=True, null=True)
     status_code = models.PositiveIntegerField(null=True, blank=True)
     is_sensitive = models.BooleanField(default=False)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # when the request arrived; rows are written later, in batches
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
 
     # Geolocation fields
     country = models.CharField(max_length=64, blank=True, null=True)
@@ -31,7 +35,13 @@ class RequestLog(models.Model):
         return f"{self.ip_address} {self.method} {self.path} [{self.status_code}]"
 
 class BlacklistedIP(models.Model):
-    ip_address = models.CharField(max_length=64, unique=True)
+    # an address, a CIDR block or a range (core.utils.parse_ip_block)
+    ip_address = models.CharField(
+        max_length=100,
+        unique=True,
+        validators=[validate_ip_block],
+        help_text="IP address, CIDR block (10.0.0.0/8) or range (10.0.0.1-10.0.0.9).",
+    )
     reason = models.TextField(blank=True, null=True)
     active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
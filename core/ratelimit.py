@@ -0,0 +1,144 @@
+"""
+One rate-limiting engine for the middleware and the DRF throttles.
+
+Sliding-window counter: each key counts hits in fixed windows, and a check
+estimates the hits in the last `window` seconds as
+
+    previous window's count * (share of it still inside the sliding window)
+    + current window's count
+
+The current count is bumped with the cache's atomic incr *before* the
+decision, so concurrent requests each see their own position and can't
+all slip under the limit together (the old get -> set/incr sequence could).
+A denied hit is taken back out, so clients hammering a limit don't extend
+their own lockout. Cost per check: two cache round trips (incr, get),
+whatever the rate or how many hits the key has had; DRF's own throttles
+keep every timestamp in a list and rewrite it on each request.
+
+Counters live under "rate:" keys, which TwoTierCache keeps out of its
+per-process tier so all workers share them.
+
+Rates are "<requests>/<period>": "30/10m", "5/s", "300/hour", "1000/d".
+
+Per-route limits for any view (admin included) are RATE_LIMIT_POLICIES,
+applied by core.middleware.IPRateLimitMiddleware:
+
+    {"name": "admin", "path": r"^/admin", "rate": "30/10m", "key": "ip"}
+
+with optional "methods": ["POST", ...]. "key" is "ip", "user" (requests
+without a session user aren't limited) or "user_or_ip". JWT users are only
+known once a DRF view authenticates, so per-user API limits belong to the
+throttles in core/throttling.py instead.
+"""
+import math
+import re
+import time
+from collections import namedtuple
+
+from django.core.cache import cache as default_cache
+from django.core.exceptions import ImproperlyConfigured
+
+KEY_PREFIX = "rate"
+
+Decision = namedtuple("Decision", ["allowed", "remaining", "retry_after"])
+Policy = namedtuple("Policy", ["name", "path", "methods", "limit", "window", "key"])
+
+PERIODS = {"s": 1, "m": 60, "h": 60 * 60, "d": 60 * 60 * 24}
+RATE_RE = re.compile(r"^\s*(\d+)\s*/\s*(\d*)\s*([smhd])[a-z]*\s*$", re.IGNORECASE)
+KEY_KINDS = ("ip", "user", "user_or_ip")
+
+
+def parse_rate(rate):
+    """
+    "30/10m" -> (30, 600). Raises ValueError.
+    """
+    match = RATE_RE.match(rate or "")
+    if not match:
+        raise ValueError(f"Invalid rate {rate!r}; expected e.g. '30/10m' or '300/hour'.")
+    requests, multiplier, unit = match.groups()
+    return int(requests), int(multiplier or 1) * PERIODS[unit.lower()]
+
+
+class SlidingWindowLimiter:
+    def __init__(self, cache=None):
+        self._cache = cache
+
+    @property
+    def cache(self):
+        return self._cache or default_cache
+
+    def hit(self, key, limit, window, now=None):
+        """
+        Count one hit on `key` if it fits `limit` per `window` seconds.
+        Returns Decision(allowed, remaining, retry_after seconds).
+        """
+        now = time.time() if now is None else now
+        bucket, offset = divmod(now, window)
+        bucket = int(bucket)
+        current_key = f"{KEY_PREFIX}:{key}:{window}:{bucket}"
+        previous_key = f"{KEY_PREFIX}:{key}:{window}:{bucket - 1}"
+
+        count = self._incr(current_key, window)
+        previous = self.cache.get(previous_key, 0)
+        weight = 1 - offset / window
+        estimate = previous * weight + count
+        if estimate <= limit:
+            return Decision(True, max(int(limit - estimate), 0), 0)
+
+        # over: give the hit back and work out when one would fit again
+        try:
+            self.cache.decr(current_key)
+        except ValueError:
+            pass
+        count -= 1
+        return Decision(False, 0, self._retry_after(limit, window, offset, previous, count))
+
+    def _incr(self, key, window):
+        # the key lives for this window and the next, where it's "previous"
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            if self.cache.add(key, 1, timeout=2 * window + 1):
+                return 1
+            return self.cache.incr(key)
+
+    @staticmethod
+    def _retry_after(limit, window, offset, previous, count):
+        # Next hit fits once previous * (1 - t / window) + count + 1 <= limit
+        if count + 1 <= limit and previous:
+            fits_at = window * (1 - (limit - count - 1) / previous)
+            return max(math.ceil(fits_at - offset), 1)
+        # not within this window: in the next one the current count decays
+        if limit < 1:
+            return math.ceil(window - offset + window)
+        fits_at = window * (1 - (limit - 1) / count) if count else 0
+        return max(math.ceil(window - offset + max(fits_at, 0)), 1)
+
+    def reset(self, key, window, now=None):
+        now = time.time() if now is None else now
+        bucket = int(now // window)
+        self.cache.delete_many([f"{KEY_PREFIX}:{key}:{window}:{bucket}", f"{KEY_PREFIX}:{key}:{window}:{bucket - 1}"])
+
+
+limiter = SlidingWindowLimiter()
+
+
+def load_policies(raw):
+    """
+    Validate and compile RATE_LIMIT_POLICIES entries into Policy tuples.
+    Raises ImproperlyConfigured.
+    """
+    policies = []
+    for index, entry in enumerate(raw or []):
+        name = entry.get("name") or f"policy{index}"
+        try:
+            limit, window = parse_rate(entry.get("rate"))
+            path = re.compile(entry.get("path", ""))
+        except (ValueError, re.error) as exc:
+            raise ImproperlyConfigured(f"RATE_LIMIT_POLICIES[{name}]: {exc}")
+        key = entry.get("key", "ip")
+        if key not in KEY_KINDS:
+            raise ImproperlyConfigured(f"RATE_LIMIT_POLICIES[{name}]: key must be one of {', '.join(KEY_KINDS)}.")
+        methods = frozenset(method.upper() for method in entry.get("methods", ()))
+        policies.append(Policy(name, path, methods, limit, window, key))
+    return policies
@@ -0,0 +1,224 @@
+"""
+Buffered writes for RequestLog.
+
+SecurityLoggingMiddleware doesn't INSERT in the request any more: it hands
+an unsaved RequestLog to the process-wide `writer`, which queues it in a
+bounded in-memory queue. A daemon thread drains the queue with one
+bulk_create per REQUEST_LOG_BATCH_SIZE records, or every
+REQUEST_LOG_FLUSH_INTERVAL seconds, whichever comes first. Anything still
+queued is flushed when the process exits (atexit, so on a gunicorn worker's
+graceful shutdown too); a hard kill loses at most one queue's worth.
+
+When the queue is full (the database can't keep up) REQUEST_LOG_OVERFLOW
+decides:
+    "drop"    discard the new record (default)
+    "sample"  once the queue is half full keep only REQUEST_LOG_SAMPLE_RATE
+              of new records (sensitive paths are always kept), and drop
+              when it's full
+    "block"   make the request wait up to REQUEST_LOG_BLOCK_TIMEOUT seconds
+              for room, then drop
+
+stats() gives this process's counters: queued, flushed, dropped, failed.
+Drops are also reported in the log by the writer thread.
+
+REQUEST_LOG_BUFFERED = False restores the INSERT per request.
+"""
+import atexit
+import logging
+import os
+import queue
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, close_old_connections
+
+from .models import RequestLog
+
+logger = logging.getLogger(__name__)
+
+DROP = "drop"
+SAMPLE = "sample"
+BLOCK = "block"
+OVERFLOW_POLICIES = (DROP, SAMPLE, BLOCK)
+
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL = 2.0
+DEFAULT_SAMPLE_RATE = 0.1
+DEFAULT_BLOCK_TIMEOUT = 0.05
+# "sample" starts thinning new records at this queue fill level
+SAMPLE_ABOVE = 0.5
+# seconds close() waits for the writer thread to drain the queue
+CLOSE_TIMEOUT = 10
+
+
+def buffered():
+    return getattr(settings, "REQUEST_LOG_BUFFERED", True)
+
+
+class RequestLogWriter:
+    """
+    Bounded queue plus one writer thread, started on first use (and again
+    in a forked child, which doesn't inherit threads).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._counters = {"queued": 0, "flushed": 0, "dropped": 0, "failed": 0}
+        self._reported_drops = 0
+
+    # ---------- request side ----------
+
+    def add(self, record):
+        """
+        Queue an unsaved RequestLog. Never raises and, except with the
+        "block" policy, never waits.
+        """
+        jobs = self._ensure_started()
+        policy = getattr(settings, "REQUEST_LOG_OVERFLOW", DROP)
+        try:
+            if policy == BLOCK:
+                jobs.put(record, timeout=getattr(settings, "REQUEST_LOG_BLOCK_TIMEOUT", DEFAULT_BLOCK_TIMEOUT))
+            else:
+                if policy == SAMPLE and not record.is_sensitive and self._thinning(jobs):
+                    self._count("dropped")
+                    return False
+                jobs.put_nowait(record)
+        except queue.Full:
+            self._count("dropped")
+            return False
+        self._count("queued")
+        return True
+
+    @staticmethod
+    def _thinning(jobs):
+        if jobs.qsize() < jobs.maxsize * SAMPLE_ABOVE:
+            return False
+        return random.random() >= getattr(settings, "REQUEST_LOG_SAMPLE_RATE", DEFAULT_SAMPLE_RATE)
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _ensure_started(self):
+        if self._pid == os.getpid() and self._thread is not None:
+            return self._queue
+        with self._lock:
+            if self._pid != os.getpid() or self._thread is None:
+                self._pid = os.getpid()
+                self._queue = queue.Queue(maxsize=getattr(settings, "REQUEST_LOG_QUEUE_SIZE", DEFAULT_QUEUE_SIZE))
+                self._stop = threading.Event()
+                self._thread = threading.Thread(target=self._run, name="request-log-writer", daemon=True)
+                self._thread.start()
+        return self._queue
+
+    # ---------- writer thread ----------
+
+    def _run(self):
+        jobs, stop = self._queue, self._stop
+        while not (stop.is_set() and jobs.empty()):
+            batch = self._collect(jobs, stop)
+            if batch:
+                self._write(batch)
+            self._report_drops()
+
+    @staticmethod
+    def _collect(jobs, stop):
+        """
+        Up to REQUEST_LOG_BATCH_SIZE records: waits at most one flush
+        interval for the first, then takes what arrives until the batch is
+        full or the interval is over. Doesn't wait once stopping.
+        """
+        batch_size = getattr(settings, "REQUEST_LOG_BATCH_SIZE", DEFAULT_BATCH_SIZE)
+        interval = getattr(settings, "REQUEST_LOG_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL)
+        batch = []
+        deadline = time.monotonic() + interval
+        while len(batch) < batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if stop.is_set() or remaining <= 0:
+                    batch.append(jobs.get_nowait())
+                else:
+                    batch.append(jobs.get(timeout=min(remaining, 0.5)))
+            except queue.Empty:
+                # (an idle writer wakes every 0.5s to notice `stop`)
+                if stop.is_set() or remaining <= 0:
+                    break
+        return batch
+
+    def _write(self, batch):
+        try:
+            try:
+                RequestLog.objects.bulk_create(batch)
+            except DatabaseError:
+                # most likely a user deleted since the request: log those
+                # requests as anonymous and try once more
+                user_ids = {record.user_id for record in batch if record.user_id}
+                existing = set(get_user_model().objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+                for record in batch:
+                    if record.user_id not in existing:
+                        record.user_id = None
+                RequestLog.objects.bulk_create(batch)
+        except Exception:
+            logger.exception("Could not write %d request log record(s)", len(batch))
+            self._count("failed", len(batch))
+        else:
+            self._count("flushed", len(batch))
+        finally:
+            close_old_connections()
+
+    def _report_drops(self):
+        dropped = self._counters["dropped"]
+        if dropped != self._reported_drops:
+            logger.warning(
+                "Request log queue overflowed: %d record(s) dropped (%d in total)",
+                dropped - self._reported_drops, dropped,
+            )
+            self._reported_drops = dropped
+
+    # ---------- shutdown / inspection ----------
+
+    def close(self, timeout=CLOSE_TIMEOUT):
+        """
+        Flush what's queued and stop the writer thread. add() starts a new
+        one if called afterwards.
+        """
+        with self._lock:
+            thread, stop, jobs = self._thread, self._stop, self._queue
+            started_here = self._pid == os.getpid()
+            self._thread = None
+        if thread is None or not started_here:
+            return
+        stop.set()
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.warning("Request log writer still busy after %ss; %d record(s) may be lost",
+                           timeout, jobs.qsize())
+
+    def flush(self, timeout=CLOSE_TIMEOUT):
+        """
+        Write everything queued so far (for tests and management commands).
+        """
+        self.close(timeout)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            jobs = self._queue if self._pid == os.getpid() else None
+        counters["pending"] = jobs.qsize() if jobs is not None else 0
+        return counters
+
+
+writer = RequestLogWriter()
+atexit.register(writer.close)
+
+
+def stats():
+    return writer.stats()
@@ -0,0 +1,13 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import blacklist
+from .models import BlacklistedIP
+
+
+@receiver(post_save, sender=BlacklistedIP)
+@receiver(post_delete, sender=BlacklistedIP)
+def blacklist_changed(sender, **kwargs):
+    # after commit, so no process reloads before the change is visible
+    transaction.on_commit(blacklist.bump_version)
@@ -0,0 +1,11 @@
+from celery import shared_task
+
+from core import blacklist
+
+
+@shared_task(name="deactivate_expired_blacklist")
+def deactivate_expired_blacklist():
+    """
+    Turn off blacklist entries past their expires_at (core/blacklist.py).
+    """
+    return blacklist.deactivate_expired()
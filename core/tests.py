@@ -1,3 +1,79 @@
-from django.test import TestCase
+import random
+from unittest import mock
 
-# Create your tests here.
+from django.test import TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from .models import RequestLog
+from .request_log import BLOCK, DROP, SAMPLE, RequestLogWriter
+
+
+def record(path="/api/products/", is_sensitive=False):
+    return RequestLog(ip_address="127.0.0.0", path=path, method="GET", status_code=200, is_sensitive=is_sensitive)
+
+
+class RequestLogWriterTests(TransactionTestCase):
+    """
+    The writer thread commits on its own connection, hence TransactionTestCase.
+    """
+
+    def test_flush_writes_queued_records(self):
+        writer = RequestLogWriter()
+        for _ in range(3):
+            self.assertTrue(writer.add(record()))
+
+        writer.flush()
+
+        self.assertEqual(RequestLog.objects.count(), 3)
+        self.assertEqual(writer.stats(), {"queued": 3, "flushed": 3, "dropped": 0, "failed": 0, "pending": 0})
+
+    @override_settings(REQUEST_LOG_BATCH_SIZE=2)
+    def test_records_are_written_in_batches(self):
+        writer = RequestLogWriter()
+        with mock.patch.object(RequestLog.objects, "bulk_create", wraps=RequestLog.objects.bulk_create) as bulk_create:
+            for _ in range(5):
+                writer.add(record())
+            writer.flush()
+
+        self.assertEqual(RequestLog.objects.count(), 5)
+        self.assertTrue(all(len(call.args[0]) <= 2 for call in bulk_create.call_args_list))
+
+    def test_unbuffered_under_the_test_runner(self):
+        APIClient().get("/api/categories/")
+
+        self.assertTrue(RequestLog.objects.filter(path="/api/categories/").exists())
+
+
+# No writer thread: the queue keeps whatever add() puts in it
+@mock.patch.object(RequestLogWriter, "_run", lambda self: None)
+@override_settings(REQUEST_LOG_QUEUE_SIZE=4)
+class OverflowPolicyTests(TransactionTestCase):
+
+    def fill(self, writer, count, **kwargs):
+        return [writer.add(record(**kwargs)) for _ in range(count)]
+
+    @override_settings(REQUEST_LOG_OVERFLOW=DROP)
+    def test_drop_discards_new_records_when_full(self):
+        writer = RequestLogWriter()
+
+        self.assertEqual(self.fill(writer, 6), [True] * 4 + [False] * 2)
+        self.assertEqual(writer.stats(), {"queued": 4, "flushed": 0, "dropped": 2, "failed": 0, "pending": 4})
+
+    @override_settings(REQUEST_LOG_OVERFLOW=SAMPLE, REQUEST_LOG_SAMPLE_RATE=0.5)
+    def test_sample_thins_past_half_full_but_keeps_sensitive_paths(self):
+        writer = RequestLogWriter()
+        # kept, kept, then the queue is half full: 0.4 is kept, 0.6 dropped
+        with mock.patch.object(random, "random", side_effect=[0.4, 0.6]):
+            self.assertEqual(self.fill(writer, 4), [True, True, True, False])
+        self.assertEqual(self.fill(writer, 2, path="/admin/", is_sensitive=True), [True, False])
+
+        stats = writer.stats()
+        self.assertEqual((stats["queued"], stats["dropped"], stats["pending"]), (4, 2, 4))
+
+    @override_settings(REQUEST_LOG_OVERFLOW=BLOCK, REQUEST_LOG_BLOCK_TIMEOUT=0.01)
+    def test_block_waits_then_drops(self):
+        writer = RequestLogWriter()
+
+        self.assertEqual(self.fill(writer, 5), [True] * 4 + [False])
+        stats = writer.stats()
+        self.assertEqual((stats["queued"], stats["dropped"], stats["pending"]), (4, 1, 4))
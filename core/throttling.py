@@ -0,0 +1,85 @@
+"""
+DRF throttles on the shared rate-limiting engine (core/ratelimit.py).
+
+Drop-in replacements for rest_framework.throttling's AnonRateThrottle,
+UserRateThrottle and ScopedRateThrottle: same scopes, same
+DEFAULT_THROTTLE_RATES, same identities (user pk, else the client address
+as DRF works it out, NUM_PROXIES included). The difference is the check:
+one atomic counter update instead of DRF's per-client list of request
+timestamps, which is read, trimmed and written back whole on every request
+and races between workers.
+
+Rates take the engine's format, so "20/10m" works as well as "50/hour".
+"""
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from .ratelimit import limiter, parse_rate
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    scope = None
+
+    def __init__(self):
+        self.retry_after = None
+
+    def get_rate(self, view=None):
+        """
+        (limit, window seconds) for this throttle's scope, or None when the
+        scope has no rate (not throttled).
+        """
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+        return parse_rate(rate) if rate else None
+
+    def get_cache_key(self, request, view):
+        """
+        Identity to count requests under, or None to let the request through.
+        """
+        raise NotImplementedError(".get_cache_key() must be overridden")
+
+    def allow_request(self, request, view):
+        rate = self.get_rate(view)
+        if rate is None:
+            return True
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+        decision = limiter.hit(key, *rate)
+        self.retry_after = decision.retry_after
+        return decision.allowed
+
+    def wait(self):
+        return self.retry_after or None
+
+
+class AnonRateThrottle(SlidingWindowThrottle):
+    scope = "anon"
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return f"{self.scope}:ip:{self.get_ident(request)}"
+
+
+class UserRateThrottle(SlidingWindowThrottle):
+    scope = "user"
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return f"{self.scope}:user:{request.user.pk}"
+        return f"{self.scope}:ip:{self.get_ident(request)}"
+
+
+class ScopedRateThrottle(UserRateThrottle):
+    """
+    Per-view rate: the view's `throttle_scope` names a DEFAULT_THROTTLE_RATES
+    entry. Views without one aren't throttled by this class.
+    """
+    scope_attr = "throttle_scope"
+    scope = None
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, self.scope_attr, None)
+        if not self.scope:
+            return True
+        return super().allow_request(request, view)
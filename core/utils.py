@@ -1,4 +1,9 @@
-from ipaddress import ip_address, IPv4Address, IPv6Address
+from ipaddress import ip_address, ip_network, summarize_address_range, IPv4Address, IPv6Address
+
+from django.core.exceptions import ValidationError
+
+# Bits kept by anonymize_ip: an anonymized address stands for this block
+ANONYMIZED_PREFIX = {4: 24, 6: 48}
 
 
 def get_client_ip(request):
@@ -28,6 +33,40 @@ def anonymize_ip(ip_str):
         parts = ip_str.split(".")
         return ".".join(parts[:3] + ["0"])
     elif isinstance(ip_obj, IPv6Address):
-        # Zero out the last segments
-        return ip_str.rsplit(":", 2)[0] + "::"
+        # Zero out everything past the /48
+        return str(ip_network(f"{ip_obj}/{ANONYMIZED_PREFIX[6]}", strict=False).network_address)
     return ip_str
+
+
+def anonymized_block(ip_str):
+    """
+    The block of real addresses an anonymized address stands for, e.g.
+    "102.68.1.0" -> "102.68.1.0/24".
+    """
+    ip_obj = ip_address(ip_str)
+    return str(ip_network(f"{ip_obj}/{ANONYMIZED_PREFIX[ip_obj.version]}", strict=False))
+
+
+def parse_ip_block(value):
+    """
+    Networks covered by a blacklist entry: an address ("10.1.2.3"), a CIDR
+    block ("10.1.0.0/16", "2001:db8::/32"; host bits are ignored) or an
+    inclusive range ("10.1.2.10-10.1.2.20"). Raises ValueError.
+    """
+    value = value.strip()
+    if "-" in value:
+        first, last = (ip_address(part.strip()) for part in value.split("-", 1))
+        if first.version != last.version or first > last:
+            raise ValueError(f"{value!r} is not a valid address range.")
+        return list(summarize_address_range(first, last))
+    return [ip_network(value, strict=False)]
+
+
+def validate_ip_block(value):
+    try:
+        parse_ip_block(value)
+    except ValueError:
+        raise ValidationError(
+            "Enter an IP address, a CIDR block (10.0.0.0/8) or a range (10.0.0.1-10.0.0.9).",
+            code="invalid_ip_block",
+        )
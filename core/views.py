@@ -78,11 +78,18 @@ class SecurityDashboardView(APIView):
             top_n = 10
 
         # ----- Caching: key based on date range + top_n -----
+        # get_or_set so concurrent misses build the payload only once
         cache_key = f"security_dashboard:{window_start.date()}:{window_end.date()}:{top_n}"
-        cached = cache.get(cache_key)
-        if cached is not None:
-            return Response(cached)
+        timeout = getattr(settings, "CACHE_TTL_5_MIN", 300)
+        data = cache.get_or_set(
+            cache_key,
+            lambda: self._build_payload(window_start, window_end, top_n),
+            timeout=timeout,
+        )
+        return Response(data)
 
+    @staticmethod
+    def _build_payload(window_start, window_end, top_n):
         # ----- Base queryset filtered by date range -----
         logs_qs = RequestLog.objects.filter(
             created_at__gte=window_start,
@@ -129,13 +136,7 @@ class SecurityDashboardView(APIView):
         }
 
         serializer = SecurityDashboardSerializer(payload)
-        data = serializer.data
-
-        # Cache for a short time so repeated dashboard hits don't pound the DB
-        timeout = getattr(settings, "CACHE_TTL_5_MIN", 300)
-        cache.set(cache_key, data, timeout=timeout)
-
-        return Response(data)
+        return serializer.data
 
     @staticmethod
     def _parse_date_to_start(date_str):
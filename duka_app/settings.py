@@ -16,6 +16,8 @@ from celery.schedules import crontab
 import dj_database_url 
 import environ
 import os
+import sys
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -23,6 +25,9 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 RENDER = os.environ.get("RENDER")  
 DEBUG = not bool(RENDER) 
 
+# `manage.py test`
+TESTING = len(sys.argv) > 1 and sys.argv[1] == "test"
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
@@ -46,6 +51,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'drf_spectacular',
     'django_crontab',
@@ -68,11 +74,11 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
     ],
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle',
+        'core.throttling.AnonRateThrottle',
+        'core.throttling.UserRateThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
-        'anon': '50/hour',    
+        'anon': '50/hour',
         'user': '300/hour',
     },
 }
@@ -101,11 +107,31 @@ MIDDLEWARE = [
     'core.middleware.IPBlacklistMiddleware',
     'core.middleware.IPRateLimitMiddleware',
     'core.middleware.SecurityLoggingMiddleware',
-    'core.middleware.SecurityLoggingMiddleware',
 ]
 
 ANONYMIZE_IP = True
 
+# How often each process checks whether the IP blacklist changed (core/blacklist.py)
+BLACKLIST_VERSION_CHECK_INTERVAL = float(os.environ.get("BLACKLIST_VERSION_CHECK_INTERVAL", 1.0))
+
+# Per-route limits applied by core.middleware.IPRateLimitMiddleware
+# (core/ratelimit.py). "key": "ip", "user" or "user_or_ip"; "methods" optional.
+RATE_LIMIT_POLICIES = [
+    {"name": "admin", "path": r"^/admin", "rate": "30/10m", "key": "ip"},
+    {"name": "login", "path": r"^/api/auth/token/$", "methods": ["POST"], "rate": "20/m", "key": "ip"},
+]
+
+# Request logs are queued in memory and written in batches by a background
+# thread (core/request_log.py). Overflow: "drop", "sample" or "block".
+# Not under the test runner: the thread writes outside the test transaction
+# and its exit flush would reach the real database once the test one is gone.
+REQUEST_LOG_BUFFERED = not TESTING and os.environ.get("REQUEST_LOG_BUFFERED", "true").lower() in ("1", "true", "yes")
+REQUEST_LOG_QUEUE_SIZE = int(os.environ.get("REQUEST_LOG_QUEUE_SIZE", 10000))
+REQUEST_LOG_BATCH_SIZE = int(os.environ.get("REQUEST_LOG_BATCH_SIZE", 500))
+REQUEST_LOG_FLUSH_INTERVAL = float(os.environ.get("REQUEST_LOG_FLUSH_INTERVAL", 2.0))
+REQUEST_LOG_OVERFLOW = os.environ.get("REQUEST_LOG_OVERFLOW", "drop")
+REQUEST_LOG_SAMPLE_RATE = float(os.environ.get("REQUEST_LOG_SAMPLE_RATE", 0.1))
+
 ROOT_URLCONF = 'duka_app.urls'
 
 TEMPLATES = [
@@ -239,19 +265,97 @@ CELERY_BEAT_SCHEDULE = {
         # Every Monday at 09:00
         "schedule": crontab(hour=9, minute=0, day_of_week="mon"),
     },
+    "release-expired-reservations": {
+        "task": "release_expired_reservations",
+        # Every minute; carts also free expired holds on demand
+        "schedule": crontab(),
+    },
+    "dispatch-outbox": {
+        "task": "dispatch_outbox",
+        "schedule": crontab(),
+    },
+    "prune-outbox": {
+        "task": "prune_outbox",
+        "schedule": crontab(hour=3, minute=30),
+    },
+    "deactivate-expired-blacklist": {
+        "task": "deactivate_expired_blacklist",
+        # requests already ignore expired entries (core/blacklist.py)
+        "schedule": crontab(minute="*/5"),
+    },
+    "compact-stock-ledger": {
+        "task": "compact_stock_ledger",
+        # folds sharded sales into Product.stock (store/inventory.py)
+        "schedule": crontab(),
+    },
 }
 
 # Configuring caches
+# "default" is two-tier: a small per-process LRU in front of the "shared"
+# cache every gunicorn worker sees (Redis when CACHE_REDIS_URL is set,
+# otherwise a SQLite file on this host). See core/cache_backends.py.
+CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL")
+
+if CACHE_REDIS_URL:
+    SHARED_CACHE = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": CACHE_REDIS_URL,
+    }
+else:
+    SHARED_CACHE = {
+        "BACKEND": "core.cache_backends.SQLiteCache",
+        "LOCATION": env("CACHE_SQLITE_PATH", default=os.path.join(tempfile.gettempdir(), "duka-cache.sqlite3")),
+    }
+
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-        "LOCATION": "duka-locmem-cache",
-    }
+        "BACKEND": "core.cache_backends.TwoTierCache",
+        "OPTIONS": {
+            "L2": "shared",
+            "L1_MAX_ENTRIES": 1000,
+            "L1_TIMEOUT": 5,
+            # counters and generations must be read fresh from the shared tier
+            "L2_ONLY_PREFIXES": ["rate:", "throttle_", "catalog:gen:", "catalog:changed:", "catalog:stats:", "idem:lock:", "guestcart:", "inventory:", "blacklist:"],
+        },
+    },
+    "shared": SHARED_CACHE,
 }
 
 # Some named TTLs (seconds)
 CACHE_TTL_5_MIN = 60 * 5
 CACHE_TTL_10_MIN = 60 * 10
+# Catalog responses are invalidated on write (store/cache.py), so this can be long
+CACHE_TTL_CATALOG = 60 * 60 * 6
+
+# How long adding to the cart holds the stock (store/reservations.py)
+CART_RESERVATION_TTL = int(os.environ.get("CART_RESERVATION_TTL", 60 * 15))
+
+# Idempotency-Key replays for checkout / cart adds (store/idempotency.py)
+IDEMPOTENCY_TTL = 60 * 60 * 24
+# How long a retry waits for the original request before answering 409
+IDEMPOTENCY_WAIT = 10
+
+# Queued checkout for flash sales (store/checkout_queue.py). Off: checkout
+# runs in the request unless the client sends `Prefer: respond-async`.
+CHECKOUT_ASYNC = os.environ.get("CHECKOUT_ASYNC", "false").lower() in ("1", "true", "yes")
+# "celery", or "memory" for in-process queues (tests, no broker)
+CHECKOUT_QUEUE_BACKEND = os.environ.get("CHECKOUT_QUEUE_BACKEND", "celery")
+# Celery queues checkout.0 .. checkout.<n-1>, one single-process worker each
+CHECKOUT_PARTITIONS = int(os.environ.get("CHECKOUT_PARTITIONS", 4))
+
+# Where outbox events go (store/outbox.py): "task:<celery task name>" or a
+# dotted path to a local handler. Events with no subscribers are just marked
+# dispatched; polling commands can still read them.
+OUTBOX_SUBSCRIBERS = {
+    "order.placed": ["task:send_order_confirmation"],
+}
+OUTBOX_RETENTION = timedelta(days=7)
+
+# Products under this many units count as low on stock (alerts, reports)
+LOW_STOCK_THRESHOLD = 10
+
+# Anonymous carts live in the cache this long after their last change (store/guest_cart.py)
+GUEST_CART_TTL = int(os.environ.get("GUEST_CART_TTL", 60 * 60 * 24 * 7))
 
 IP_GEOLOCATION_SETTINGS = {
     # Our custom IPinfo Lite backend
@@ -274,6 +378,14 @@ IP_GEOLOCATION_SETTINGS = {
     'USER_CONSENT_VALIDATOR': None,
 }
 
+# Local geolocation database (core/geoip.py), built by `manage.py import_geoip`.
+# Addresses it doesn't cover are looked up at IPinfo Lite in the background.
+GEOIP_DB_PATH = env("GEOIP_DB_PATH", default=str(BASE_DIR / "var" / "geoip.bin"))
+GEOIP_CACHE_SIZE = int(os.environ.get("GEOIP_CACHE_SIZE", 10000))
+GEOIP_RELOAD_CHECK_INTERVAL = float(os.environ.get("GEOIP_RELOAD_CHECK_INTERVAL", 60.0))
+GEOIP_HTTP_FALLBACK = os.environ.get("GEOIP_HTTP_FALLBACK", "true").lower() in ("1", "true", "yes")
+GEOIP_FALLBACK_QUEUE_SIZE = int(os.environ.get("GEOIP_FALLBACK_QUEUE_SIZE", 1000))
+
 if RENDER:
     # behind HTTPS/proxy on PythonAnywhere
     SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
@@ -1,24 +1,57 @@
 from django.contrib import admin
 
-from .models import Category, Product, CartItem, Order, OrderItem, OrderReminder
+from .models import (
+    Category, Product, CartItem, CheckoutJob, Order, OrderItem, OrderReminder, OutboxEvent, StockMovement,
+    StockReservation, StockShard,
+)
+from .search import search_products
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ('name', 'slug')
+    list_display = ('name', 'slug', 'parent', 'product_count')
+    list_select_related = ('parent',)
+    ordering = ('path',)
     prepopulated_fields = {'slug': ('name',)}
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('name', 'category', 'price', 'is_active')
+    list_display = ('name', 'category', 'price', 'effective_price', 'stock', 'reserved', 'stock_shards', 'is_active')
     list_filter = ('category', 'is_active')
-    search_fields = ('name', 'description')
+    search_fields = ('name', 'description', 'sku')
     prepopulated_fields = {'slug': ('name',)}
 
+    def get_search_results(self, request, queryset, search_term):
+        # Same indexed search as the API instead of ILIKE over every row
+        if not search_term:
+            return queryset, False
+        return search_products(queryset, search_term), False
+
 @admin.register(CartItem)
 class CartItemAdmin(admin.ModelAdmin):
     list_display = ("user", "product", "quantity", "created_at")
     search_fields = ("user__username", "product__name")
 
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ("user", "product", "quantity", "expires_at")
+    list_select_related = ("user", "product")
+    search_fields = ("user__username", "product__name")
+
+@admin.register(StockShard)
+class StockShardAdmin(admin.ModelAdmin):
+    list_display = ("product", "index", "available")
+    list_select_related = ("product",)
+    search_fields = ("product__name",)
+    readonly_fields = ("product", "index", "available")
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ("id", "product", "delta", "reason", "shard", "order", "created_at", "compacted_at")
+    list_filter = ("reason", ("compacted_at", admin.EmptyFieldListFilter))
+    list_select_related = ("product",)
+    search_fields = ("product__name",)
+    readonly_fields = ("product", "delta", "reason", "shard", "order", "created_at", "compacted_at")
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ("id", "user", "status", "total_amount", "created_at")
@@ -29,6 +62,20 @@ class OrderAdmin(admin.ModelAdmin):
 class OrderItemAdmin(admin.ModelAdmin):
     list_display = ("order", "product", "quantity", "price_at_purchase")
 
+@admin.register(CheckoutJob)
+class CheckoutJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "status", "partition", "order", "created_at", "finished_at")
+    list_filter = ("status", "partition")
+    search_fields = ("user__username",)
+    readonly_fields = ("order", "started_at", "finished_at")
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ("id", "topic", "key", "created_at", "dispatched_at", "attempts", "last_error")
+    list_filter = ("topic", ("dispatched_at", admin.EmptyFieldListFilter))
+    search_fields = ("key",)
+    readonly_fields = ("topic", "key", "payload", "created_at", "dispatched_at", "attempts", "last_error")
+
 @admin.register(OrderReminder)
 class OrderReminderAdmin(admin.ModelAdmin):
     list_display = ("order", "sent_at")
@@ -0,0 +1,225 @@
+"""
+Catalog response cache with generation keys.
+
+Every cached catalog response is keyed on the request URL *and* on the
+current value of the generations it depends on:
+
+    catalog                -> any product/category write
+    category:<id>          -> writes to that category or its products
+    product:<slug>         -> writes to that product
+    categories             -> writes to any category (names show up nested
+                              in product payloads)
+
+Writes never delete cached entries; they bump generations so old keys are
+simply never read again and age out. That lets catalog TTLs be hours long.
+Bumps wait for the writing transaction to commit (a rolled-back write
+bumps nothing). Each bump also records when the scope last changed, which
+is what catalog Last-Modified headers report (store/conditional.py).
+"""
+import hashlib
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+KEY_PREFIX = "catalog"
+STATS_HITS_KEY = f"{KEY_PREFIX}:stats:hits"
+STATS_MISSES_KEY = f"{KEY_PREFIX}:stats:misses"
+
+GLOBAL = "catalog"
+CATEGORIES = "categories"
+
+# Past this many products in one write, bump CATEGORIES (which every detail
+# key depends on) instead of one generation per slug.
+MAX_PRODUCT_SCOPES = 100
+
+
+def category_scope(category_id):
+    return f"category:{category_id}"
+
+
+def product_scope(slug):
+    return f"product:{slug}"
+
+
+def _gen_key(scope):
+    return f"{KEY_PREFIX}:gen:{scope}"
+
+
+def _changed_key(scope):
+    return f"{KEY_PREFIX}:changed:{scope}"
+
+
+def get_generations(scopes):
+    """
+    Current generation for each scope, fetched in one round trip.
+    A missing generation (never set, or evicted) is seeded with a fresh
+    timestamp so entries cached under an older value can't be reused.
+    """
+    keys = {scope: _gen_key(scope) for scope in scopes}
+    found = cache.get_many(list(keys.values()))
+
+    generations = {}
+    for scope, key in keys.items():
+        value = found.get(key)
+        if value is None:
+            cache.add(key, time.time_ns(), timeout=None)
+            value = cache.get(key)
+        generations[scope] = value
+    return generations
+
+
+def last_changed(scopes):
+    """
+    When the newest of the given scopes was last bumped, as an aware
+    datetime. Like a missing generation, a missing time is seeded with now:
+    nothing older can be vouched for.
+    """
+    keys = [_changed_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    for key in keys:
+        if found.get(key) is None:
+            cache.add(key, time.time(), timeout=None)
+            found[key] = cache.get(key) or time.time()
+    return datetime.fromtimestamp(max(found.values()), tz=timezone.utc)
+
+
+def bump(*scopes):
+    """
+    Invalidate everything cached under the given scopes, once the current
+    transaction commits (right away outside one). Bumping earlier would let
+    a read between the bump and the commit cache the old rows under the new
+    generation, where they'd be served until the TTL ran out.
+    """
+    scopes = set(scopes)
+    transaction.on_commit(lambda: _bump_now(scopes))
+
+
+def _bump_now(scopes):
+    cache.set_many({_changed_key(scope): time.time() for scope in scopes}, timeout=None)
+    for scope in scopes:
+        key = _gen_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Not set yet: seeding it makes any older entries unreachable
+            cache.set(key, time.time_ns(), timeout=None)
+
+
+def bump_products(category_ids=(), slugs=()):
+    """
+    Invalidate after product writes. Always bumps the global generation
+    because unfiltered and search listings can include any product.
+    """
+    scopes = [GLOBAL]
+    scopes += [category_scope(category_id) for category_id in category_ids if category_id is not None]
+    slugs = {slug for slug in slugs if slug}
+    if len(slugs) > MAX_PRODUCT_SCOPES:
+        scopes.append(CATEGORIES)
+    else:
+        scopes += [product_scope(slug) for slug in slugs]
+    bump(*scopes)
+
+
+def bump_categories(category_ids=()):
+    scopes = [GLOBAL, CATEGORIES]
+    scopes += [category_scope(category_id) for category_id in category_ids if category_id is not None]
+    bump(*scopes)
+
+
+def record_hit(hit):
+    key = STATS_HITS_KEY if hit else STATS_MISSES_KEY
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def get_stats():
+    values = cache.get_many([STATS_HITS_KEY, STATS_MISSES_KEY])
+    hits = values.get(STATS_HITS_KEY, 0)
+    misses = values.get(STATS_MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / total, 4) if total else None,
+    }
+
+
+def reset_stats():
+    cache.delete_many([STATS_HITS_KEY, STATS_MISSES_KEY])
+
+
+# ---------- scope resolvers used by the views ----------
+
+def product_list_scopes(request, view_kwargs):
+    category_id = request.GET.get("category")
+    # subtree listings span categories, so they follow the global generation
+    if category_id and not request.GET.get("category_tree"):
+        return [category_scope(category_id)]
+    return [GLOBAL]
+
+
+def product_detail_scopes(request, view_kwargs):
+    return [product_scope(view_kwargs.get("slug")), CATEGORIES]
+
+
+def category_scopes(request, view_kwargs):
+    # product_count in category payloads moves with every product write
+    return [CATEGORIES, GLOBAL]
+
+
+def cache_catalog_response(timeout=None, scopes=product_list_scopes):
+    """
+    Cache a DRF view method's response data under generation-aware keys.
+
+    Use with method_decorator, like cache_page. Only GET 200s are cached.
+    Adds an X-Catalog-Cache: HIT/MISS header.
+    """
+    if timeout is None:
+        timeout = getattr(settings, "CACHE_TTL_CATALOG", 60 * 60)
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method != "GET":
+                return view_func(request, *args, **kwargs)
+
+            generations = get_generations(scopes(request, kwargs))
+            gen_part = ".".join(f"{scope}={value}" for scope, value in sorted(generations.items()))
+            # full URL: paginated payloads embed absolute next/previous links
+            raw_key = f"{request.build_absolute_uri()}|{gen_part}"
+            cache_key = f"{KEY_PREFIX}:resp:{hashlib.md5(raw_key.encode('utf-8')).hexdigest()}"
+
+            rendered = {}
+
+            def render():
+                response = view_func(request, *args, **kwargs)
+                rendered["response"] = response
+                return response.data if response.status_code == 200 else None
+
+            # get_or_set lets the cache backend coalesce concurrent misses
+            data = cache.get_or_set(cache_key, render, timeout=timeout)
+
+            if "response" in rendered:
+                record_hit(False)
+                response = rendered["response"]
+                response["X-Catalog-Cache"] = "MISS"
+                return response
+            if data is None:
+                return view_func(request, *args, **kwargs)
+
+            record_hit(True)
+            response = Response(data)
+            response["X-Catalog-Cache"] = "HIT"
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,221 @@
+"""
+Cart mutations, kept in step with stock reservations.
+
+Every change to a user's cart, and checkout, first locks that user's row
+(lock_cart), so concurrent requests from the same user queue up instead of
+racing on the cart line and its reservation. Lock order everywhere:
+user -> cart lines -> reservations -> products.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from . import inventory
+from .models import CartItem, StockReservation
+from .reservations import ReservationError, release, reserve, reserve_many
+
+# Most distinct products a bulk cart call may touch
+MAX_BULK_LINES = 200
+
+
+class CartError(Exception):
+    """
+    The cart change can't be made; the message is user-facing. `errors`
+    maps product ids to messages for bulk changes.
+    """
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors or {}
+
+
+def lock_cart(user):
+    get_user_model().objects.select_for_update().filter(pk=user.pk).exists()
+
+
+def add_to_cart(user, product, quantity):
+    """
+    Add `quantity` units to the user's line for `product` (creating it if
+    needed) and reserve them. Returns the CartItem.
+    """
+    with transaction.atomic():
+        lock_cart(user)
+        cart_item = CartItem.objects.filter(user=user, product=product).first()
+        new_quantity = quantity + (cart_item.quantity if cart_item else 0)
+        message = "Not enough stock available." if cart_item is None else "Not enough stock for this quantity."
+        try:
+            reserve(user, product, new_quantity, message=message)
+        except ReservationError as exc:
+            raise CartError(str(exc))
+
+        if cart_item is None:
+            return CartItem.objects.create(user=user, product=product, quantity=new_quantity)
+        cart_item.quantity = new_quantity
+        cart_item.save(update_fields=['quantity', 'updated_at'])
+        return cart_item
+
+
+def update_cart_item(user, cart_item, product, quantity):
+    """
+    Set a line's product and quantity, moving/resizing its reservation.
+    """
+    with transaction.atomic():
+        lock_cart(user)
+        if product.pk != cart_item.product_id:
+            if CartItem.objects.filter(user=user, product=product).exists():
+                raise CartError("This product is already in your cart.")
+            release(user, [cart_item.product_id])
+        try:
+            reserve(user, product, quantity, message="Not enough stock for this quantity.")
+        except ReservationError as exc:
+            raise CartError(str(exc))
+
+        cart_item.product = product
+        cart_item.quantity = quantity
+        cart_item.save()
+        return cart_item
+
+
+def remove_from_cart(user, cart_item):
+    with transaction.atomic():
+        lock_cart(user)
+        release(user, [cart_item.product_id])
+        cart_item.delete()
+
+
+# ---------- bulk changes ----------
+#
+# Whatever the number of lines: lock the user, read the cart, then
+# reserve_many (lock holds, lock+check products, one counter UPDATE, one
+# hold upsert, one hold delete), one cart upsert on (user, product) and one
+# delete for dropped lines.
+
+def replace_cart(user, quantities):
+    """
+    Make the cart exactly {product_id: quantity}; lines not listed are removed.
+    """
+    with transaction.atomic():
+        lock_cart(user)
+        current = dict(CartItem.objects.filter(user=user).values_list('product_id', 'quantity'))
+        targets = {product_id: 0 for product_id in current}
+        targets.update(quantities)
+        _apply(user, current, targets)
+
+
+def apply_cart_deltas(user, deltas):
+    """
+    Add (or, with negative numbers, remove) units per product; lines that
+    drop to zero or below are removed.
+    """
+    with transaction.atomic():
+        lock_cart(user)
+        current = dict(
+            CartItem.objects
+            .filter(user=user, product_id__in=list(deltas))
+            .values_list('product_id', 'quantity')
+        )
+        targets = {
+            product_id: max(current.get(product_id, 0) + delta, 0)
+            for product_id, delta in deltas.items()
+        }
+        _apply(user, current, targets)
+
+
+def _apply(user, current, targets):
+    # lines that don't change still get their hold renewed
+    try:
+        reserve_many(user, targets)
+    except ReservationError as exc:
+        raise CartError(str(exc), exc.errors)
+
+    kept = {product_id: quantity for product_id, quantity in targets.items() if quantity > 0}
+    if kept:
+        CartItem.objects.bulk_create(
+            [
+                CartItem(user=user, product_id=product_id, quantity=quantity)
+                for product_id, quantity in kept.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['user', 'product'],
+            update_fields=['quantity', 'updated_at'],
+        )
+    dropped = [product_id for product_id, quantity in targets.items() if quantity <= 0 and product_id in current]
+    if dropped:
+        CartItem.objects.filter(user=user, product_id__in=dropped).delete()
+
+
+# ---------- summary ----------
+
+def _summary_lines(user):
+    """
+    The user's lines annotated with `short`: the line can't be checked out
+    as it is (product inactive, or more units than its own hold plus the
+    unreserved stock). Sharded products are only judged on is_active here:
+    their Product.stock lags the shards, see _sharded_short().
+    """
+    held = (
+        StockReservation.objects
+        .filter(user=user, product=OuterRef('product'))
+        .values('quantity')[:1]
+    )
+    return (
+        CartItem.objects
+        .filter(user=user)
+        .annotate(held=Coalesce(Subquery(held), Value(0)))
+        .annotate(short=Q(product__is_active=False) | Q(
+            product__stock_shards=0,
+            quantity__gt=F('product__stock') - F('product__reserved') + F('held'),
+        ))
+    )
+
+
+def _sharded_short(user):
+    """
+    Product ids of the user's active sharded lines asking for more than
+    inventory.available() (sharded products are never held).
+    """
+    rows = list(
+        CartItem.objects
+        .filter(user=user, product__is_active=True, product__stock_shards__gt=0)
+        .values_list('product_id', 'quantity', 'product__stock', 'product__reserved', 'product__stock_shards')
+    )
+    live = inventory.available((pk, stock, reserved, shards) for pk, _, stock, reserved, shards in rows)
+    return {product_id for product_id, quantity, *_ in rows if quantity > live[product_id]}
+
+
+def cart_summary(user, with_lines=False):
+    """
+    Totals for the user's cart in one aggregate query (plus one for
+    sharded lines and one for the compact line list when asked): line and
+    unit counts, subtotal at effective prices, discount against list
+    prices, and shortfall flags.
+    """
+    money = DecimalField(max_digits=12, decimal_places=2)
+    lines = _summary_lines(user)
+    summary = lines.aggregate(
+        line_count=Count('pk'),
+        item_count=Coalesce(Sum('quantity'), 0),
+        subtotal=Coalesce(Sum(F('quantity') * F('product__effective_price'), output_field=money), Decimal('0')),
+        list_total=Coalesce(Sum(F('quantity') * F('product__price'), output_field=money), Decimal('0')),
+        short_lines=Count('pk', filter=Q(short=True)),
+    )
+    sharded_short = _sharded_short(user)
+    summary['short_lines'] += len(sharded_short)
+    summary['discount_total'] = summary.pop('list_total') - summary['subtotal']
+    summary['has_shortfall'] = summary['short_lines'] > 0
+    if with_lines:
+        summary['lines'] = [
+            {
+                'product_id': product_id,
+                'quantity': quantity,
+                'effective_price': price,
+                'short': short or product_id in sharded_short,
+            }
+            for product_id, quantity, price, short in (
+                lines.order_by('product_id').values_list('product_id', 'quantity', 'product__effective_price', 'short')
+            )
+        ]
+    return summary
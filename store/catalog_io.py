@@ -0,0 +1,367 @@
+"""
+Streaming catalog import/export (CSV or JSON Lines), keyed by SKU.
+
+Import reads the file row by row and works in chunks: each chunk is
+validated with ProductImportRowSerializer, categories are fetched with one
+query, and in the chunk's own transaction the existing SKUs are locked
+with another and the chunk is written with a single INSERT ... ON CONFLICT
+(sku) DO UPDATE. The update only sets the columns the chunk supplies, so a
+file without a stock column never touches stock. A bad row only costs
+that row; a failed chunk only costs that chunk.
+
+Export walks the catalog through a server-side cursor and yields encoded
+lines, so memory stays flat whatever the catalog size.
+"""
+import csv
+import io
+import json
+from itertools import islice
+
+from django.db import DatabaseError, transaction
+from django.db.models import Q
+from django.utils.text import slugify
+from rest_framework import serializers
+
+from . import cache as catalog_cache, inventory
+from .models import Category, Product
+from .serializers import ProductImportRowSerializer, validate_prices
+
+CSV = "csv"
+JSONL = "jsonl"
+FORMATS = [CSV, JSONL]
+
+DEFAULT_CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 1000
+
+EXPORT_FIELDS = (
+    "sku",
+    "name",
+    "slug",
+    "description",
+    "price",
+    "discount_price",
+    "stock",
+    "is_active",
+    "category",
+)
+
+# Columns the importer can set; an upsert writes those its chunk supplies
+UPSERT_FIELDS = [
+    "category",
+    "name",
+    "slug",
+    "description",
+    "price",
+    "discount_price",
+    "stock",
+    "is_active",
+    "updated_at",
+]
+
+
+def guess_format(filename, default=CSV):
+    name = (filename or "").lower()
+    if name.endswith((".jsonl", ".ndjson", ".json")):
+        return JSONL
+    if name.endswith(".csv"):
+        return CSV
+    return default
+
+
+# ---------- reading ----------
+
+def iter_records(stream, file_format):
+    """
+    Yield (line_number, dict) from a text stream.
+    Unparseable JSON lines are yielded as (line_number, None).
+    """
+    if file_format == CSV:
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, _clean_csv_record(record)
+    elif file_format == JSONL:
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield line_number, record if isinstance(record, dict) else None
+    else:
+        raise ValueError(f"Unsupported format: {file_format}")
+
+
+def _clean_csv_record(record):
+    # Empty cells mean "leave unchanged", except an empty discount clears it
+    cleaned = {}
+    for key, value in record.items():
+        if key is None:
+            continue
+        key = key.strip()
+        value = value.strip() if isinstance(value, str) else value
+        if value == "":
+            if key == "discount_price":
+                cleaned[key] = None
+            continue
+        cleaned[key] = value
+    return cleaned
+
+
+# ---------- importing ----------
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, line, sku, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "sku": sku, "errors": errors})
+
+    def as_dict(self):
+        return {
+            "rows": self.rows,
+            "created": self.created,
+            "updated": self.updated,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
+
+
+def import_catalog(stream, file_format=CSV, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Upsert products by SKU from a CSV/JSONL text stream. Returns ImportReport.
+    """
+    report = ImportReport()
+    records = iter_records(stream, file_format)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            break
+        report.rows += len(chunk)
+        _import_chunk(chunk, report)
+    return report
+
+
+def _import_chunk(chunk, report):
+    # 1. field validation, no queries
+    valid = []
+    for line, record in chunk:
+        if record is None:
+            report.add_error(line, None, {"non_field_errors": ["Not a JSON object."]})
+            continue
+        serializer = ProductImportRowSerializer(data=record)
+        if serializer.is_valid():
+            valid.append((line, serializer.validated_data))
+        else:
+            report.add_error(line, record.get("sku"), serializer.errors)
+
+    # a SKU can only be upserted once per statement: keep the last row
+    last_line_for_sku = {data["sku"]: line for line, data in valid}
+    rows = []
+    for line, data in valid:
+        if last_line_for_sku[data["sku"]] != line:
+            report.add_error(line, data["sku"], {"sku": ["Repeated later in the same chunk; that row was used."]})
+        else:
+            rows.append((line, data))
+    if not rows:
+        return
+
+    categories = _resolve_categories({data["category"] for _, data in rows if "category" in data})
+    line_for_sku = {data["sku"]: line for line, data in rows}
+
+    products = []
+    try:
+        with transaction.atomic():
+            # 2. existing rows, locked (in pk order, like checkout) so the
+            # values merged below can't be overwritten by a concurrent
+            # checkout or edit before the upsert commits
+            existing = {
+                product.sku: product
+                for product in (
+                    Product.objects
+                    .select_for_update()
+                    .filter(sku__in=list(line_for_sku))
+                    .order_by("pk")
+                )
+            }
+
+            # 3. merge and cross-field validation
+            for line, data in rows:
+                try:
+                    products.append(_build_product(data, existing.get(data["sku"]), categories))
+                except serializers.ValidationError as exc:
+                    report.add_error(line, data["sku"], exc.detail)
+
+            products = _drop_slug_conflicts(products, report, line_for_sku)
+            if not products:
+                return
+
+            # 4. one upsert per chunk, writing only the columns the file set
+            Product.objects.bulk_create(
+                products,
+                update_conflicts=True,
+                unique_fields=["sku"],
+                update_fields=_update_fields(data for _, data in rows),
+            )
+    except DatabaseError as exc:
+        for sku in [product.sku for product in products] or list(line_for_sku):
+            report.add_error(None, sku, {"non_field_errors": [f"Chunk rolled back: {exc}"]})
+        return
+
+    # bulk_create bumps the new category/slug; also bump what products moved away from
+    moved = [
+        existing[product.sku] for product in products
+        if product.sku in existing and (
+            existing[product.sku].category_id != product.category_id
+            or existing[product.sku].slug != product.slug
+        )
+    ]
+    if moved:
+        catalog_cache.bump_products({p.category_id for p in moved}, {p.slug for p in moved})
+
+    for product in products:
+        if product.sku in existing:
+            report.updated += 1
+        else:
+            report.created += 1
+
+
+def _update_fields(rows):
+    """
+    UPSERT_FIELDS present in any of `rows`, plus updated_at. A column no
+    row supplies (stock, typically) is left as it is on existing products.
+    """
+    supplied = set()
+    for data in rows:
+        supplied.update(data)
+    return [field for field in UPSERT_FIELDS if field in supplied or field == "updated_at"]
+
+
+def _resolve_categories(refs):
+    ids = [int(ref) for ref in refs if ref.isdigit()]
+    slugs = [ref for ref in refs if not ref.isdigit()]
+    resolved = {}
+    for category in Category.objects.filter(Q(pk__in=ids) | Q(slug__in=slugs)):
+        resolved[str(category.pk)] = category
+        resolved[category.slug] = category
+    return resolved
+
+
+def _build_product(data, current, categories):
+    """
+    A new (unsaved, pk-less) Product carrying the merged values, ready for
+    the upsert. Raises ValidationError for rows that can't be applied.
+    """
+    values = {}
+    if current is not None:
+        values = {field: getattr(current, field) for field in UPSERT_FIELDS if field != "category"}
+        values["category_id"] = current.category_id
+
+    if current is not None and current.stock_shards and data.get("stock", current.stock) != current.stock:
+        # sharded stock lives in StockShard rows (store/inventory.py)
+        raise serializers.ValidationError({"stock": [inventory.SHARDED_STOCK_ERROR]})
+
+    for field in ("name", "slug", "description", "price", "discount_price", "stock", "is_active"):
+        if field in data:
+            values[field] = data[field]
+
+    if "category" in data:
+        category = categories.get(data["category"])
+        if category is None:
+            raise serializers.ValidationError({"category": [f"Unknown category '{data['category']}'."]})
+        values["category_id"] = category.pk
+
+    if current is None:
+        missing = [field for field in ("name", "price") if values.get(field) is None]
+        if values.get("category_id") is None:
+            missing.append("category")
+        if missing:
+            raise serializers.ValidationError({field: ["Required for new products."] for field in missing})
+        values.setdefault("slug", slugify(f"{values['name']}-{data['sku']}")[:220])
+        values.setdefault("stock", 0)
+        values.setdefault("is_active", True)
+
+    validate_prices(values.get("price"), values.get("discount_price"))
+
+    values.pop("updated_at", None)
+    return Product(sku=data["sku"], **values)
+
+
+def _drop_slug_conflicts(products, report, line_for_sku):
+    """
+    Slugs are unique too; a slug owned by another SKU would abort the chunk.
+    """
+    owners = dict(
+        Product.objects
+        .filter(slug__in=[product.slug for product in products])
+        .values_list("slug", "sku")
+    )
+    kept, seen = [], {}
+    for product in products:
+        owner = owners.get(product.slug, product.sku)
+        if owner != product.sku or seen.get(product.slug, product.sku) != product.sku:
+            report.add_error(
+                line_for_sku.get(product.sku), product.sku,
+                {"slug": [f"Slug '{product.slug}' is already used by another product."]},
+            )
+            continue
+        seen[product.slug] = product.sku
+        kept.append(product)
+    return kept
+
+
+# ---------- exporting ----------
+
+class _Echo:
+    """
+    File-like object whose write() hands the value back, so csv.writer can
+    produce one encoded line at a time (pattern from the Django docs).
+    """
+
+    def write(self, value):
+        return value
+
+
+def _export_rows(chunk_size):
+    columns = [field if field != "category" else "category__slug" for field in EXPORT_FIELDS]
+    # iterator() on Postgres uses a server-side cursor
+    return (
+        Product.objects
+        .order_by("pk")
+        .values_list(*columns)
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def stream_export(file_format=CSV, chunk_size=2000):
+    """
+    Generator of text lines for the whole catalog.
+    """
+    if file_format == CSV:
+        writer = csv.writer(_Echo())
+        yield writer.writerow(EXPORT_FIELDS)
+        for row in _export_rows(chunk_size):
+            yield writer.writerow(["" if value is None else value for value in row])
+    elif file_format == JSONL:
+        for row in _export_rows(chunk_size):
+            record = dict(zip(EXPORT_FIELDS, row))
+            for field in ("price", "discount_price"):
+                if record[field] is not None:
+                    record[field] = str(record[field])
+            yield json.dumps(record) + "\n"
+    else:
+        raise ValueError(f"Unsupported format: {file_format}")
+
+
+def open_text(uploaded_file):
+    """
+    Text stream over an uploaded file without reading it into memory.
+    """
+    return io.TextIOWrapper(uploaded_file.file, encoding="utf-8-sig", newline="")
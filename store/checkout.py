@@ -0,0 +1,230 @@
+"""
+Checkout: turn a user's cart into a paid order in one transaction.
+
+The query count doesn't depend on the cart size:
+
+    1. lock the user's cart                SELECT ... FOR UPDATE (user row)
+       and read it                         SELECT
+    2. lock the user's reservations        SELECT ... FOR UPDATE
+    3. lock the products, in pk order      SELECT ... ORDER BY id FOR UPDATE
+       (sharded products: read, not locked) SELECT
+    4. insert the order                    INSERT
+    5. insert every order line             INSERT (bulk, with name/SKU snapshots)
+    6. decrement every product's stock     UPDATE ... WHERE stock - reserved >= unreserved qty
+       and release the reserved units
+    7. drop the reservations, empty cart   DELETE, DELETE
+       record the sales in the ledger      INSERT (bulk)
+    8. publish order.placed / stock.low    INSERT (bulk, outbox)
+
+Locking products in primary-key order means two checkouts that share
+products always queue on the same row first, so they can't deadlock. The
+stock UPDATE is conditional as well, so even a caller that skipped the
+locks could never take stock below zero.
+
+Sharded products (store/inventory.py) are the exception: their units come
+off stock shards, picked with SKIP LOCKED, so checkouts of a hot product
+don't queue on its row. That costs two queries per sharded product.
+
+Units the user reserved when adding to the cart (store/reservations.py)
+are already set aside, so those lines always go through; only units
+without a live reservation are checked against unreserved stock.
+
+Side effects (confirmation email, low-stock alerts, ...) are not run here:
+the events go to the outbox in this transaction and are delivered later
+(store/outbox.py).
+
+`manage.py stress_checkout` runs concurrent checkouts against shared stock
+and checks nothing is oversold.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Prefetch, Value, When
+from django.db.models.functions import Greatest
+
+from . import inventory, outbox
+from .cart import lock_cart
+from .models import CartItem, Order, OrderItem, Product, StockReservation
+
+
+class CheckoutError(Exception):
+    """
+    The cart can't be checked out as it is; the message is user-facing.
+    """
+
+
+def _per_product(quantities):
+    return Case(
+        *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def _unreserved(quantities, held):
+    return {
+        product_id: max(quantity - held.get(product_id, 0), 0)
+        for product_id, quantity in quantities.items()
+    }
+
+
+def _check_stock(quantities, unreserved, products, sharded=None):
+    """
+    `sharded` maps sharded products to their live units, or to None to
+    leave the check to inventory.take().
+    """
+    sharded = sharded or {}
+    if len(products) != len(quantities) or not all(is_active for *_, is_active in products):
+        raise CheckoutError("Some items in your cart are no longer available.")
+
+    for product_id, name, _, _, stock, reserved, _ in products:
+        if product_id in sharded:
+            short = sharded[product_id] is not None and quantities[product_id] > sharded[product_id]
+        else:
+            short = unreserved[product_id] > stock - reserved or quantities[product_id] > stock
+        if short:
+            raise CheckoutError(f"Not enough stock for {name}.")
+
+
+def _events(order, quantities, stock_before):
+    """
+    order.placed, plus stock.low for each product this order took below
+    LOW_STOCK_THRESHOLD. `stock_before` is {product_id: units before it}.
+    """
+    threshold = getattr(settings, "LOW_STOCK_THRESHOLD", 10)
+    events = [outbox.Event(outbox.ORDER_PLACED, f"order:{order.pk}", {
+        'order_id': order.pk,
+        'user_id': order.user_id,
+        'total_amount': str(order.total_amount),
+        'items': [{'product_id': product_id, 'quantity': quantity} for product_id, quantity in quantities.items()],
+    })]
+    for product_id, stock in stock_before.items():
+        left = stock - quantities[product_id]
+        if left < threshold <= stock:
+            events.append(outbox.Event(outbox.STOCK_LOW, f"stock-low:{product_id}:{order.pk}", {
+                'product_id': product_id,
+                'stock': left,
+            }))
+    return events
+
+
+def validate_cart(user):
+    """
+    The same checks as place_order, without locks or writes, for queued
+    checkout to refuse obviously doomed carts up front. The job still runs
+    place_order, which re-checks under the locks. Returns the cart's
+    {product_id: quantity}.
+    """
+    quantities = dict(CartItem.objects.filter(user=user).values_list('product_id', 'quantity'))
+    if not quantities:
+        raise CheckoutError("Cart is empty.")
+    held = dict(
+        StockReservation.objects
+        .filter(user=user, product_id__in=quantities)
+        .values_list('product_id', 'quantity')
+    )
+    rows = list(
+        Product.objects
+        .filter(pk__in=quantities)
+        .values_list('pk', 'name', 'sku', 'effective_price', 'stock', 'reserved', 'is_active', 'stock_shards')
+    )
+    live = inventory.available(
+        (pk, stock, reserved, shards) for pk, _, _, _, stock, reserved, _, shards in rows if shards
+    )
+    products = [row[:-1] for row in rows]
+    _check_stock(quantities, _unreserved(quantities, held), products, sharded=live)
+    return quantities
+
+
+def place_order(user):
+    """
+    Check out `user`'s cart. Returns the paid Order (items prefetched) or
+    raises CheckoutError, in which case nothing was written.
+    """
+    with transaction.atomic():
+        # Serializes checkout with this user's other cart changes
+        lock_cart(user)
+        quantities = dict(
+            CartItem.objects
+            .filter(user=user)
+            .order_by('product_id')
+            .values_list('product_id', 'quantity')
+        )
+        if not quantities:
+            raise CheckoutError("Cart is empty.")
+
+        # Expired but not yet swept holds still count in Product.reserved, so
+        # they are released here all the same.
+        held = dict(
+            StockReservation.objects
+            .select_for_update()
+            .filter(user=user, product_id__in=quantities)
+            .values_list('product_id', 'quantity')
+        )
+        unreserved = _unreserved(quantities, held)
+
+        columns = ('pk', 'name', 'sku', 'effective_price', 'stock', 'reserved', 'is_active')
+        locked = list(
+            Product.objects
+            .select_for_update()
+            .filter(pk__in=quantities, stock_shards=0)
+            .order_by('pk')
+            .values_list(*columns)
+        )
+        # read after the locks: a product sharded meanwhile shows up here
+        sharded = []
+        if len(locked) != len(quantities):
+            sharded = list(Product.objects.filter(pk__in=quantities, stock_shards__gt=0).values_list(*columns))
+        products = locked + sharded
+        plain = {product_id: quantities[product_id] for product_id, *_ in locked}
+        _check_stock(quantities, unreserved, products, sharded={product_id: None for product_id, *_ in sharded})
+
+        total = sum(price * quantities[product_id] for product_id, _, _, price, *_ in products)
+        order = Order.objects.create(user=user, status=Order.Status.PAID, total_amount=total)
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product_id=product_id,
+                quantity=quantities[product_id],
+                price_at_purchase=price,
+                product_name=name,
+                product_sku=sku,
+            )
+            for product_id, name, sku, price, *_ in products
+        ])
+
+        if plain:
+            updated = (
+                Product.objects
+                .filter(pk__in=plain, stock__gte=F('reserved') + _per_product(unreserved))
+                .update(
+                    stock=F('stock') - _per_product(plain),
+                    reserved=Greatest(F('reserved') - _per_product(held), 0),
+                )
+            )
+            if updated != len(plain):
+                # Only reachable if the rows weren't locked; roll everything back
+                raise CheckoutError("Stock changed during checkout, please try again.")
+            inventory.record_sales(plain, order=order)
+        stock_before = {product_id: stock for product_id, _, _, _, stock, _, _ in locked}
+        if sharded:
+            # shard sums (cached for a moment), as carts see them
+            stock_before.update(inventory.available(
+                (product_id, stock, reserved, 1) for product_id, _, _, _, stock, reserved, _ in sharded
+            ))
+            try:
+                inventory.take({product_id: quantities[product_id] for product_id, *_ in sharded}, order=order)
+            except inventory.InventoryError as exc:
+                name = next(name for product_id, name, *_ in sharded if product_id == exc.product_id)
+                raise CheckoutError(f"Not enough stock for {name}.")
+
+        if held:
+            StockReservation.objects.filter(user=user, product_id__in=held).delete()
+        CartItem.objects.filter(user=user).delete()
+
+        outbox.publish_many(_events(order, quantities, stock_before))
+
+    return (
+        Order.objects
+        .prefetch_related(Prefetch('items', queryset=OrderItem.objects.select_related('product__category')))
+        .get(pk=order.pk)
+    )
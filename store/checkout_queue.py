@@ -0,0 +1,249 @@
+"""
+Queued checkout for flash sales.
+
+With CHECKOUT_ASYNC on (or a request sending `Prefer: respond-async`),
+POST /api/checkout/ only validates the cart, records a CheckoutJob and
+answers 202 with a status URL. The order is placed later by a worker
+running the usual place_order(), so web workers never wait on the
+contended product rows.
+
+Partitions: a job goes to queue "checkout.<n>", n = the cart's lowest
+product id modulo CHECKOUT_PARTITIONS. place_order locks products in pk
+order, so carts that share their first product would queue on the same row
+anyway; running each partition with a single worker process
+(`celery -A duka_app worker -Q checkout.0 -c 1`, ...) serializes them
+without any global lock. Correctness never depends on the partitioning,
+only throughput does: place_order's row locks still apply.
+
+CHECKOUT_QUEUE_BACKEND:
+    "celery"  publish to the Celery app in duka_app/celery.py (default)
+    "memory"  in-process queues with one worker thread per partition, for
+              tests and local runs without a broker. Jobs only run after
+              the creating transaction commits, so tests need
+              TransactionTestCase; memory_broker.join() waits for them.
+
+metrics() reports queue depth per partition and time-to-complete.
+"""
+import logging
+import queue
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .cart import lock_cart
+from .checkout import CheckoutError, place_order, validate_cart
+from .models import CheckoutJob
+
+logger = logging.getLogger(__name__)
+
+QUEUE_PREFIX = "checkout"
+CELERY = "celery"
+MEMORY = "memory"
+DEFAULT_PARTITIONS = 4
+# a job queued or running longer than this no longer blocks a new checkout
+# (e.g. its worker died)
+STALE_AFTER = timedelta(minutes=10)
+
+# finished jobs sampled for the time-to-complete percentiles
+METRICS_WINDOW = timedelta(minutes=15)
+METRICS_MAX_SAMPLES = 5000
+
+
+def requested(request):
+    """
+    Whether this checkout request should be queued.
+    """
+    if getattr(settings, "CHECKOUT_ASYNC", False):
+        return True
+    return "respond-async" in request.headers.get("Prefer", "").lower()
+
+
+def partitions():
+    return max(getattr(settings, "CHECKOUT_PARTITIONS", DEFAULT_PARTITIONS), 1)
+
+
+def partition_for(product_ids):
+    return min(product_ids) % partitions()
+
+
+def queue_name(partition):
+    return f"{QUEUE_PREFIX}.{partition}"
+
+
+def submit(user):
+    """
+    Queue a checkout of `user`'s cart. Raises CheckoutError if the cart
+    can't be checked out as it stands. Returns (job, created); a user with
+    a checkout already queued or running gets that job back.
+    """
+    with transaction.atomic():
+        lock_cart(user)
+        pending = (
+            CheckoutJob.objects
+            .filter(
+                user=user,
+                status__in=[CheckoutJob.Status.QUEUED, CheckoutJob.Status.RUNNING],
+                created_at__gte=timezone.now() - STALE_AFTER,
+            )
+            .first()
+        )
+        if pending is not None:
+            return pending, False
+
+        quantities = validate_cart(user)
+        job = CheckoutJob.objects.create(user=user, partition=partition_for(quantities))
+        transaction.on_commit(lambda: _dispatch(job))
+    return job, True
+
+
+def _dispatch(job):
+    try:
+        if getattr(settings, "CHECKOUT_QUEUE_BACKEND", CELERY) == MEMORY:
+            memory_broker.put(job.partition, job.pk)
+        else:
+            from .tasks import process_checkout_job
+
+            process_checkout_job.apply_async(args=[str(job.pk)], queue=queue_name(job.partition))
+    except Exception:
+        logger.exception("Could not enqueue checkout job %s", job.pk)
+        _finish(job.pk, CheckoutJob.Status.FAILED, error="Checkout is unavailable, please try again.")
+
+
+def run_job(job_id):
+    """
+    Worker side: place the order for a queued job. Duplicate deliveries are
+    ignored (only a QUEUED job can be claimed). Returns the final status,
+    or None if the job wasn't ours to run.
+    """
+    claimed = (
+        CheckoutJob.objects
+        .filter(pk=job_id, status=CheckoutJob.Status.QUEUED)
+        .update(status=CheckoutJob.Status.RUNNING, started_at=timezone.now())
+    )
+    if not claimed:
+        return None
+
+    job = CheckoutJob.objects.select_related('user').get(pk=job_id)
+    try:
+        order = place_order(job.user)
+    except CheckoutError as exc:
+        return _finish(job_id, CheckoutJob.Status.FAILED, error=str(exc))
+    except Exception:
+        logger.exception("Checkout job %s crashed", job_id)
+        return _finish(job_id, CheckoutJob.Status.FAILED, error="Checkout failed, please try again.")
+    return _finish(job_id, CheckoutJob.Status.DONE, order=order)
+
+
+def _finish(job_id, status, order=None, error=""):
+    CheckoutJob.objects.filter(pk=job_id).update(
+        status=status,
+        order=order,
+        error=error[:255],
+        finished_at=timezone.now(),
+    )
+    return status
+
+
+class MemoryBroker:
+    """
+    In-process stand-in for the broker: a FIFO queue and one daemon worker
+    thread per partition, started on first use.
+    """
+
+    def __init__(self):
+        self._queues = {}
+        self._lock = threading.Lock()
+
+    def put(self, partition, job_id):
+        with self._lock:
+            jobs = self._queues.get(partition)
+            if jobs is None:
+                jobs = self._queues[partition] = queue.Queue()
+                threading.Thread(
+                    target=self._work,
+                    args=(jobs,),
+                    name=f"{queue_name(partition)}-worker",
+                    daemon=True,
+                ).start()
+        jobs.put(job_id)
+
+    def _work(self, jobs):
+        while True:
+            job_id = jobs.get()
+            try:
+                run_job(job_id)
+            except Exception:
+                logger.exception("Checkout job %s failed in the memory broker", job_id)
+            finally:
+                close_old_connections()
+                jobs.task_done()
+
+    def depth(self):
+        with self._lock:
+            return {partition: jobs.qsize() for partition, jobs in self._queues.items()}
+
+    def join(self):
+        """
+        Block until every job put so far has been processed.
+        """
+        with self._lock:
+            queues = list(self._queues.values())
+        for jobs in queues:
+            jobs.join()
+
+
+memory_broker = MemoryBroker()
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return round(sorted_values[index], 3)
+
+
+def metrics(window=METRICS_WINDOW):
+    """
+    Queue depth (from the job table, so it covers every web and worker
+    process) and time-to-complete for jobs finished within `window`.
+    """
+    depth = dict(
+        CheckoutJob.objects
+        .filter(status=CheckoutJob.Status.QUEUED)
+        .values_list('partition')
+        .annotate(jobs=Count('pk'))
+        .order_by()
+    )
+    running = CheckoutJob.objects.filter(status=CheckoutJob.Status.RUNNING).count()
+
+    since = timezone.now() - window
+    finished = list(
+        CheckoutJob.objects
+        .filter(finished_at__gte=since)
+        .order_by('-finished_at')
+        .values_list('status', 'created_at', 'started_at', 'finished_at')[:METRICS_MAX_SAMPLES]
+    )
+    total = sorted((done - created).total_seconds() for _, created, _, done in finished)
+    waits = sorted((started - created).total_seconds() for _, created, started, _ in finished if started)
+
+    return {
+        "queued": sum(depth.values()),
+        "queued_by_partition": {queue_name(partition): jobs for partition, jobs in sorted(depth.items())},
+        "running": running,
+        "window_seconds": int(window.total_seconds()),
+        "completed": sum(1 for status, *_ in finished if status == CheckoutJob.Status.DONE),
+        "failed": sum(1 for status, *_ in finished if status == CheckoutJob.Status.FAILED),
+        "time_to_complete_seconds": {
+            "p50": _percentile(total, 0.5),
+            "p95": _percentile(total, 0.95),
+            "max": _percentile(total, 1.0),
+        },
+        "queue_wait_seconds": {
+            "p50": _percentile(waits, 0.5),
+            "p95": _percentile(waits, 0.95),
+        },
+    }
@@ -0,0 +1,79 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Count, DecimalField, F, Q
+from django.db.models.functions import Floor
+
+DEFAULT_BUCKET_SIZE = Decimal("50")
+MIN_BUCKET_SIZE = Decimal("1")
+
+
+def parse_bucket_size(raw):
+    """
+    ?bucket_size= value, falling back to the default on bad input.
+    """
+    try:
+        size = Decimal(raw) if raw else DEFAULT_BUCKET_SIZE
+    except (InvalidOperation, TypeError):
+        return DEFAULT_BUCKET_SIZE
+    if not size.is_finite() or size < MIN_BUCKET_SIZE:
+        return DEFAULT_BUCKET_SIZE
+    return size
+
+
+def compute_facets(queryset, bucket_size=DEFAULT_BUCKET_SIZE):
+    """
+    Category counts, price buckets (by effective price) and
+    discount/in-stock counts for a (filtered) Product queryset.
+
+    Runs one grouped query over (category, price bucket) and rolls the
+    rows up in Python, instead of one query per facet.
+    """
+    rows = (
+        queryset
+        .order_by()
+        .annotate(
+            bucket=Floor(F("effective_price") / bucket_size, output_field=DecimalField(max_digits=12, decimal_places=0)),
+        )
+        .values("category_id", "category__name", "category__slug", "bucket")
+        .annotate(
+            count=Count("id"),
+            discounted=Count("id", filter=Q(discount_price__isnull=False)),
+            in_stock=Count("id", filter=Q(stock__gt=0)),
+        )
+    )
+
+    categories = {}
+    buckets = {}
+    total = discounted = in_stock = 0
+
+    for row in rows:
+        total += row["count"]
+        discounted += row["discounted"]
+        in_stock += row["in_stock"]
+
+        category = categories.setdefault(row["category_id"], {
+            "id": row["category_id"],
+            "name": row["category__name"],
+            "slug": row["category__slug"],
+            "count": 0,
+        })
+        category["count"] += row["count"]
+
+        buckets[row["bucket"]] = buckets.get(row["bucket"], 0) + row["count"]
+
+    price_buckets = []
+    for bucket in sorted(buckets):
+        low = (Decimal(bucket) * bucket_size).quantize(Decimal("0.01"))
+        price_buckets.append({
+            "min": low,
+            "max": (low + bucket_size).quantize(Decimal("0.01")),
+            "count": buckets[bucket],
+        })
+
+    return {
+        "total": total,
+        "discounted": discounted,
+        "in_stock": in_stock,
+        "categories": sorted(categories.values(), key=lambda c: (-c["count"], c["name"])),
+        "price_buckets": price_buckets,
+    }
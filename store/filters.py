@@ -0,0 +1,22 @@
+from rest_framework.filters import OrderingFilter
+
+
+class ProductOrderingFilter(OrderingFilter):
+    """
+    OrderingFilter where ?ordering=price sorts by the price customers pay
+    (effective_price) and so uses the indexed generated column.
+    """
+    ordering_aliases = {
+        'price': 'effective_price',
+    }
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not ordering:
+            return ordering
+        return [self._resolve_alias(term) for term in ordering]
+
+    def _resolve_alias(self, term):
+        descending = term.startswith('-')
+        field = self.ordering_aliases.get(term.lstrip('-'), term.lstrip('-'))
+        return f"-{field}" if descending else field
@@ -0,0 +1,217 @@
+"""
+Guest carts: held in the cache, not in CartItem, until the shopper logs in.
+
+A guest cart is {product_id: quantity} stored under a random id for
+GUEST_CART_TTL seconds. The client holds a signed token for that id and
+sends it back in the X-Cart-Token header. Adding to a guest cart reads
+the products (to validate) but writes nothing to the database, and it
+reserves no stock.
+
+On login (accounts.views.LoginView) the guest cart is merged into the
+user's CartItem rows in one batched operation (store.cart.apply_cart_deltas)
+and the merged lines are dropped from the cache; lines that couldn't be
+merged stay in the guest cart.
+
+Changes and merges read, modify and write the cart back, so they hold a
+per-cart cache.add() lock (as store/idempotency.py does) and concurrent
+requests for one cart take turns instead of overwriting each other.
+"""
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+
+from . import inventory
+from .cart import MAX_BULK_LINES, CartError, apply_cart_deltas
+from .models import Product
+
+HEADER = "X-Cart-Token"
+KEY_PREFIX = "guestcart"
+SALT = "store.guest_cart"
+DEFAULT_TTL = 60 * 60 * 24 * 7
+# seconds to wait for another request on the same cart; how long a crashed
+# worker can keep it locked
+LOCK_WAIT = 5
+LOCK_TIMEOUT = 30
+POLL_INTERVAL = 0.02
+
+
+class GuestCartError(Exception):
+    """
+    The change can't be made; the message is user-facing. `errors` maps
+    product ids to messages.
+    """
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors or {}
+
+
+class GuestCartBusy(GuestCartError):
+    """
+    Another request kept the cart locked for longer than LOCK_WAIT.
+    """
+
+
+def _ttl():
+    return getattr(settings, "GUEST_CART_TTL", DEFAULT_TTL)
+
+
+def new_token():
+    return signing.Signer(salt=SALT).sign(uuid.uuid4().hex)
+
+
+def _cart_key(token):
+    """
+    Cache key for a token, or None if the token wasn't issued by us.
+    """
+    try:
+        cart_id = signing.Signer(salt=SALT).unsign(token)
+    except signing.BadSignature:
+        return None
+    return f"{KEY_PREFIX}:{cart_id}"
+
+
+def is_valid_token(token):
+    return bool(token) and _cart_key(token) is not None
+
+
+def get_lines(token):
+    key = _cart_key(token) if token else None
+    if key is None:
+        return {}
+    return cache.get(key) or {}
+
+
+def save_lines(token, lines):
+    key = _cart_key(token)
+    if not lines:
+        cache.delete(key)
+    else:
+        cache.set(key, lines, timeout=_ttl())
+
+
+def clear(token):
+    key = _cart_key(token) if token else None
+    if key is not None:
+        cache.delete(key)
+
+
+@contextmanager
+def _locked(key):
+    lock_key = f"{key}:lock"
+    deadline = time.monotonic() + LOCK_WAIT
+    while not cache.add(lock_key, 1, timeout=LOCK_TIMEOUT):
+        if time.monotonic() >= deadline:
+            raise GuestCartBusy("Your cart is being updated by another request; please try again.")
+        time.sleep(POLL_INTERVAL)
+    try:
+        yield
+    finally:
+        cache.delete(lock_key)
+
+
+def change_lines(token, quantities, replace):
+    """
+    Replace the guest cart with `quantities`, or add them as deltas.
+    Validates against active products and what they have available (one
+    read query, plus one for sharded products' shards). Returns the new {product_id: quantity}. Raises GuestCartError
+    (GuestCartBusy if the cart stays locked).
+    """
+    with _locked(_cart_key(token)):
+        return _change_lines(token, quantities, replace)
+
+
+def _change_lines(token, quantities, replace):
+    lines = {} if replace else dict(get_lines(token))
+    for product_id, quantity in quantities.items():
+        lines[product_id] = quantity if replace else lines.get(product_id, 0) + quantity
+    lines = {product_id: quantity for product_id, quantity in lines.items() if quantity > 0}
+
+    if len(lines) > MAX_BULK_LINES:
+        raise GuestCartError(f"A cart can hold at most {MAX_BULK_LINES} products.")
+
+    rows = list(
+        Product.objects
+        .filter(pk__in=list(lines), is_active=True)
+        .values_list('pk', 'name', 'stock', 'reserved', 'stock_shards')
+    )
+    # sharded products: Product.stock lags the shards until compaction
+    live = inventory.available((pk, stock, reserved, shards) for pk, _, stock, reserved, shards in rows)
+    available = {pk: (name, live[pk]) for pk, name, *_ in rows}
+    errors = {}
+    for product_id, quantity in lines.items():
+        if product_id not in available:
+            errors[product_id] = "Product not found."
+        elif quantity > available[product_id][1]:
+            errors[product_id] = f"Not enough stock for {available[product_id][0]}."
+    if errors:
+        raise GuestCartError("Some products can't be added to your cart.", errors)
+
+    save_lines(token, lines)
+    return lines
+
+
+def describe(lines):
+    """
+    Lines with the product details a cart view needs (one read query).
+    """
+    products = {
+        row['id']: row
+        for row in Product.objects.filter(pk__in=list(lines)).values('id', 'name', 'slug', 'effective_price')
+    }
+    return [
+        {
+            'product_id': product_id,
+            'name': products[product_id]['name'],
+            'slug': products[product_id]['slug'],
+            'effective_price': products[product_id]['effective_price'],
+            'quantity': quantity,
+        }
+        for product_id, quantity in lines.items()
+        if product_id in products
+    ]
+
+
+def merge_into_user(token, user):
+    """
+    Move the guest cart into the user's cart (quantities are added to any
+    existing lines). Lines that can't be served any more are skipped and
+    stay in the guest cart, as does the whole cart if another request
+    keeps it locked. Returns {"merged": n, "skipped": {product_id:
+    message}, "kept": lines left in the guest cart}.
+    """
+    try:
+        with _locked(_cart_key(token)):
+            lines = get_lines(token)
+            merged, skipped = _merge(lines, user)
+            save_lines(token, {product_id: quantity for product_id, quantity in lines.items() if product_id not in merged})
+    except GuestCartBusy:
+        return {"merged": 0, "skipped": {}, "kept": len(get_lines(token))}
+    return {"merged": len(merged), "skipped": skipped, "kept": len(lines) - len(merged)}
+
+
+def _merge(lines, user):
+    """
+    ({product_id: quantity} merged, {product_id: message} skipped).
+    """
+    if not lines:
+        return {}, {}
+    try:
+        apply_cart_deltas(user, lines)
+        return lines, {}
+    except CartError as exc:
+        skipped = dict(exc.errors)
+    # keep what still fits; one retry without the rejected products
+    rest = {product_id: quantity for product_id, quantity in lines.items() if product_id not in skipped}
+    if not rest:
+        return {}, skipped
+    try:
+        apply_cart_deltas(user, rest)
+    except CartError as exc:
+        skipped.update(exc.errors)
+        return {}, skipped
+    return rest, skipped
@@ -0,0 +1,130 @@
+"""
+Idempotency-Key support for non-idempotent endpoints (checkout, cart adds).
+
+A client sends `Idempotency-Key: <unique string>` with a POST. The first
+response for that user + key is stored in the cache for IDEMPOTENCY_TTL
+seconds and replayed for any retry with the same key, without running the
+view again. Replays carry `Idempotent-Replayed: true`.
+
+- A retry that arrives while the first request is still running waits for
+  it (up to IDEMPOTENCY_WAIT seconds) instead of executing a second time,
+  then gets 409 if it is still running.
+- Reusing a key with a different request body is a client bug: 422.
+- Only completed responses below 500 are stored. If the view raises, the
+  key is released and the next retry runs normally.
+
+The in-flight marker is a cache.add() lock, so it holds across processes
+as long as the cache's shared tier does (see core/cache_backends.py).
+"""
+import hashlib
+import json
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework import status
+from rest_framework.response import Response
+
+HEADER = "Idempotency-Key"
+REPLAY_HEADER = "Idempotent-Replayed"
+KEY_PREFIX = "idem"
+MAX_KEY_LENGTH = 255
+
+DEFAULT_TTL = 60 * 60 * 24
+DEFAULT_WAIT = 10
+# How long a crashed worker can keep a key locked
+LOCK_TIMEOUT = 60
+POLL_INTERVAL = 0.05
+
+# for extend_schema(parameters=[...]) on decorated endpoints
+SCHEMA_PARAMETER = OpenApiParameter(
+    name=HEADER,
+    location=OpenApiParameter.HEADER,
+    required=False,
+    type=str,
+    description="Unique per operation; retries with the same key replay the first response.",
+)
+
+
+def _fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.method}|{request.path}|{body}".encode("utf-8")).hexdigest()
+
+
+def _keys(request, scope, key):
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+    base = f"{request.user.pk}:{scope}:{digest}"
+    # locks must never be served from a per-process tier (L2_ONLY_PREFIXES)
+    return f"{KEY_PREFIX}:resp:{base}", f"{KEY_PREFIX}:lock:{base}"
+
+
+def _replay(stored, fingerprint):
+    if stored["fingerprint"] != fingerprint:
+        return Response(
+            {"detail": f"This {HEADER} was already used with a different request."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    response = Response(stored["data"], status=stored["status"])
+    response[REPLAY_HEADER] = "true"
+    return response
+
+
+def idempotent(scope):
+    """
+    Make a DRF handler replay-safe under the Idempotency-Key header.
+    Use with method_decorator; requests without the header are untouched.
+    """
+    ttl = getattr(settings, "IDEMPOTENCY_TTL", DEFAULT_TTL)
+    wait = getattr(settings, "IDEMPOTENCY_WAIT", DEFAULT_WAIT)
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key or not request.user.is_authenticated:
+                return view_func(request, *args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return Response(
+                    {"detail": f"{HEADER} must be at most {MAX_KEY_LENGTH} characters."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            fingerprint = _fingerprint(request)
+            response_key, lock_key = _keys(request, scope, key)
+
+            deadline = time.monotonic() + wait
+            while True:
+                stored = cache.get(response_key)
+                if stored is not None:
+                    return _replay(stored, fingerprint)
+                if cache.add(lock_key, fingerprint, timeout=LOCK_TIMEOUT):
+                    break
+                if time.monotonic() >= deadline:
+                    return Response(
+                        {"detail": f"A request with this {HEADER} is still being processed."},
+                        status=status.HTTP_409_CONFLICT,
+                    )
+                time.sleep(POLL_INTERVAL)
+
+            try:
+                # the first request may have finished between our get and add
+                stored = cache.get(response_key)
+                if stored is not None:
+                    return _replay(stored, fingerprint)
+
+                response = view_func(request, *args, **kwargs)
+                if response.status_code < 500:
+                    cache.set(
+                        response_key,
+                        {"fingerprint": fingerprint, "status": response.status_code, "data": response.data},
+                        timeout=ttl,
+                    )
+                return response
+            finally:
+                cache.delete(lock_key)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,315 @@
+"""
+Inventory for hot products: sharded stock counters plus a stock ledger.
+
+Normally a product's stock is one number on its row, and every checkout
+for it locks that row until commit, so during a promotion all checkouts
+for the hottest product run one at a time. shard() splits a product's
+stock over N StockShard rows instead:
+
+- take() (checkout) grabs any shard with room using SKIP LOCKED, so
+  concurrent checkouts of the same product land on different shards and
+  don't wait for each other. If every such shard is busy it waits for the
+  first one with room; only when no single shard can cover the units does it lock all
+  of them, in index order (no deadlocks: a checkout only holds shards of
+  products it has already finished with). The product row isn't touched.
+- Every unit taken or added is written to the StockMovement ledger.
+- Product.stock of a sharded product is the count as of the last
+  compaction: compact() folds pending ledger rows into it (and evens out
+  the shards). Live availability is available(), which sums the shards
+  (cached for AVAILABLE_CACHE_TTL seconds).
+
+Invariant while sharded: sum(shards) == Product.stock + pending ledger
+deltas, and Product.reserved == 0. Sharded products aren't held in carts
+(reservations would lock the product row again); checkout re-checks them.
+
+Turn sharding on and off with `manage.py shard_stock`; compaction runs
+from Celery beat ("compact_stock_ledger") or `manage.py compact_stock`.
+`manage.py bench_sharded_stock` measures checkout throughput per shard
+count.
+"""
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.utils import timezone
+
+from .models import Product, StockMovement, StockReservation, StockShard
+
+AVAILABLE_CACHE_TTL = 2
+AVAILABLE_KEY = "inventory:available:{}"
+MAX_SHARDS = 64
+# for edits that would set a sharded product's stock directly
+SHARDED_STOCK_ERROR = "Stock of a sharded product can't be set directly; restock it or unshard it first."
+
+
+class InventoryError(Exception):
+    """
+    Not enough stock for `product_id`.
+    """
+
+    def __init__(self, product_id):
+        super().__init__(f"Not enough stock for product {product_id}.")
+        self.product_id = product_id
+
+
+def _products():
+    # Plain QuerySet: shard bookkeeping isn't catalog data (see reservations)
+    return models.QuerySet(Product)
+
+
+def _split(total, shards):
+    return [total // shards + (1 if index < total % shards else 0) for index in range(shards)]
+
+
+def shard(product_id, shards):
+    """
+    Spread the product's live stock over `shards` rows (re-sharding is
+    fine). Cart holds on the product are dropped: their units go back
+    into the pool.
+    """
+    if not 1 <= shards <= MAX_SHARDS:
+        raise ValueError(f"Shard count must be between 1 and {MAX_SHARDS}.")
+    with transaction.atomic():
+        stock = _products().select_for_update().filter(pk=product_id).values_list('stock', flat=True).get()
+        current = list(StockShard.objects.select_for_update().filter(product_id=product_id))
+        # pending ledger rows stay pending: stock + pending == the shard total
+        total = sum(row.available for row in current) if current else stock
+        StockReservation.objects.filter(product_id=product_id).delete()
+        StockShard.objects.filter(product_id=product_id).delete()
+        StockShard.objects.bulk_create([
+            StockShard(product_id=product_id, index=index, available=units)
+            for index, units in enumerate(_split(total, shards))
+        ])
+        _products().filter(pk=product_id).update(reserved=0, stock_shards=shards)
+    cache.delete(AVAILABLE_KEY.format(product_id))
+
+
+def unshard(product_id):
+    """
+    Fold the ledger and put the stock back on the product row.
+    """
+    with transaction.atomic():
+        _products().select_for_update().filter(pk=product_id).exists()
+        shards = list(StockShard.objects.select_for_update().filter(product_id=product_id))
+        if not shards:
+            return
+        StockMovement.objects.filter(product_id=product_id, compacted_at__isnull=True).update(
+            compacted_at=timezone.now()
+        )
+        StockShard.objects.filter(product_id=product_id).delete()
+        Product.objects.filter(pk=product_id).update(stock=sum(row.available for row in shards))
+        _products().filter(pk=product_id).update(stock_shards=0)
+    cache.delete(AVAILABLE_KEY.format(product_id))
+
+
+def take(quantities, order=None):
+    """
+    Checkout side: take {product_id: units} from sharded products' shards
+    and record the sales. Raises InventoryError (nothing is taken: the
+    caller's transaction rolls back).
+    """
+    movements = []
+    for product_id in sorted(quantities):
+        for index, units in _take_one(product_id, quantities[product_id]):
+            movements.append(StockMovement(
+                product_id=product_id,
+                delta=-units,
+                reason=StockMovement.Reason.SALE,
+                shard=index,
+                order=order,
+            ))
+    StockMovement.objects.bulk_create(movements)
+    return movements
+
+
+class _NoShard(Exception):
+    pass
+
+
+def _take_one(product_id, units):
+    # Fast path: any one shard with room that nobody else has locked
+    row = _one_shard(product_id, units, skip_locked=True)
+    if row is None:
+        # All busy: wait for the first one with room, in index order so
+        # waiters can't deadlock. A shard that ran short while we waited
+        # stays locked (Postgres keeps the lock), hence the savepoint.
+        try:
+            with transaction.atomic():
+                row = _one_shard(product_id, units, skip_locked=False)
+                if row is None:
+                    raise _NoShard
+        except _NoShard:
+            pass
+    if row is not None:
+        StockShard.objects.filter(pk=row[0]).update(available=F('available') - units)
+        return [(row[1], units)]
+
+    # Slow path: no single shard has room; lock them all, in index order,
+    # and take what's needed
+    shards = list(
+        StockShard.objects
+        .select_for_update()
+        .filter(product_id=product_id, available__gt=0)
+        .order_by('index')
+        .values_list('pk', 'index', 'available')
+    )
+    if sum(available for _, _, available in shards) < units:
+        raise InventoryError(product_id)
+    taken, left = [], units
+    for pk, index, available in shards:
+        if not left:
+            break
+        part = min(available, left)
+        taken.append((pk, index, part))
+        left -= part
+    StockShard.objects.filter(pk__in=[pk for pk, _, _ in taken]).update(
+        available=F('available') - Case(
+            *[When(pk=pk, then=Value(part)) for pk, _, part in taken],
+            output_field=IntegerField(),
+        )
+    )
+    return [(index, part) for _, index, part in taken]
+
+
+def _one_shard(product_id, units, skip_locked):
+    return (
+        StockShard.objects
+        .select_for_update(skip_locked=skip_locked)
+        .filter(product_id=product_id, available__gte=units)
+        .order_by('?' if skip_locked else 'index')
+        .values_list('pk', 'index')
+        .first()
+    )
+
+
+def record_sales(quantities, order=None):
+    """
+    Ledger rows for units already taken off unsharded product rows.
+    """
+    now = timezone.now()
+    StockMovement.objects.bulk_create([
+        StockMovement(
+            product_id=product_id,
+            delta=-units,
+            reason=StockMovement.Reason.SALE,
+            order=order,
+            compacted_at=now,
+        )
+        for product_id, units in quantities.items()
+    ])
+
+
+def restock(product_id, units):
+    """
+    Add units to a product: to its emptiest shard if sharded, else to the
+    row. Recorded in the ledger either way.
+    """
+    with transaction.atomic():
+        # Lock order as in shard()/unshard(): product row first, so a
+        # concurrent shard() can't read stock before this lands on the row
+        _products().select_for_update().filter(pk=product_id).exists()
+        target = (
+            StockShard.objects
+            .select_for_update()
+            .filter(product_id=product_id)
+            .order_by('available', 'index')
+            .first()
+        )
+        if target is None:
+            Product.objects.filter(pk=product_id).update(stock=F('stock') + units)
+        else:
+            StockShard.objects.filter(pk=target.pk).update(available=F('available') + units)
+        StockMovement.objects.create(
+            product_id=product_id,
+            delta=units,
+            reason=StockMovement.Reason.RESTOCK,
+            shard=target.index if target else None,
+            compacted_at=None if target else timezone.now(),
+        )
+    cache.delete(AVAILABLE_KEY.format(product_id))
+
+
+def available(products):
+    """
+    {product_id: units available to new carts} for (pk, stock, reserved,
+    stock_shards) rows. Sharded products sum their shards (cached briefly);
+    the rest are stock - reserved.
+    """
+    result, sharded = {}, []
+    for pk, stock, reserved, stock_shards in products:
+        if stock_shards:
+            sharded.append(pk)
+        else:
+            result[pk] = max(stock - reserved, 0)
+    if sharded:
+        cached = cache.get_many([AVAILABLE_KEY.format(pk) for pk in sharded])
+        missing = [pk for pk in sharded if AVAILABLE_KEY.format(pk) not in cached]
+        result.update({pk: cached[AVAILABLE_KEY.format(pk)] for pk in sharded if pk not in missing})
+        if missing:
+            sums = dict(
+                StockShard.objects
+                .filter(product_id__in=missing)
+                .values_list('product_id')
+                .annotate(units=Sum('available'))
+                .order_by()
+            )
+            fresh = {pk: sums.get(pk) or 0 for pk in missing}
+            cache.set_many(
+                {AVAILABLE_KEY.format(pk): units for pk, units in fresh.items()},
+                timeout=AVAILABLE_CACHE_TTL,
+            )
+            result.update(fresh)
+    return result
+
+
+def compact():
+    """
+    Fold pending ledger rows into Product.stock and even out the shards of
+    the products involved, one product per transaction. Returns the number
+    of ledger rows folded.
+    """
+    product_ids = (
+        StockMovement.objects
+        .filter(compacted_at__isnull=True)
+        .values_list('product_id', flat=True)
+        .distinct()
+        .order_by('product_id')
+    )
+    return sum(_compact_one(product_id) for product_id in list(product_ids))
+
+
+def _compact_one(product_id):
+    # Lock order as in shard()/unshard(): product row, then ledger rows and
+    # shards. Sharded checkouts never lock the product row, so they carry on.
+    with transaction.atomic():
+        _products().select_for_update().filter(pk=product_id).exists()
+        rows = list(
+            StockMovement.objects
+            .select_for_update()
+            .filter(product_id=product_id, compacted_at__isnull=True)
+            .values_list('pk', 'delta')
+        )
+        if not rows:
+            return 0
+        delta = sum(delta for _, delta in rows)
+        if delta:
+            # the catalog shows stock, so this goes through the cache-bumping manager
+            Product.objects.filter(pk=product_id).update(stock=F('stock') + delta)
+        StockMovement.objects.filter(pk__in=[pk for pk, _ in rows]).update(compacted_at=timezone.now())
+        _rebalance(product_id)
+    return len(rows)
+
+
+def _rebalance(product_id):
+    shards = list(
+        StockShard.objects.select_for_update(skip_locked=True).filter(product_id=product_id).order_by('index')
+    )
+    # skip if a checkout holds any shard; the next run will get it
+    expected = _products().filter(pk=product_id).values_list('stock_shards', flat=True).get()
+    if not shards or len(shards) != expected:
+        return
+    levels = [row.available for row in shards]
+    if max(levels) - min(levels) <= 1:
+        return
+    for row, units in zip(shards, _split(sum(levels), len(shards))):
+        row.available = units
+    StockShard.objects.bulk_update(shards, ['available'])
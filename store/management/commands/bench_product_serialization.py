@@ -0,0 +1,70 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from store.models import Product
+from store.serializers import PRODUCT_READ_COLUMNS, ProductSerializer, serialize_product_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare ProductSerializer with the values()-based fast path used by "
+        "product GETs: checks the rendered JSON is byte-identical and reports rows/sec."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows",
+            type=int,
+            default=1000,
+            help="Number of active products to serialize (default: 1000)",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Timing runs per path; the best run is reported (default: 5)",
+        )
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        repeat = max(1, options["repeat"])
+        queryset = Product.objects.filter(is_active=True).order_by("-created_at", "-id")[:rows]
+
+        renderer = JSONRenderer()
+
+        def serializer_path():
+            products = queryset.select_related("category")
+            return renderer.render(ProductSerializer(products, many=True).data)
+
+        def fast_path():
+            return renderer.render(serialize_product_rows(queryset.values(*PRODUCT_READ_COLUMNS)))
+
+        expected = serializer_path()
+        actual = fast_path()
+        if expected != actual:
+            raise CommandError("Fast path output differs from ProductSerializer output.")
+
+        count = queryset.count()
+        if not count:
+            self.stdout.write(self.style.WARNING("No active products to benchmark (output identical)."))
+            return
+
+        slow = self._best_time(serializer_path, repeat)
+        fast = self._best_time(fast_path, repeat)
+
+        self.stdout.write(f"Rows: {count} ({len(actual)} bytes of JSON, byte-identical)")
+        self.stdout.write(f"  ProductSerializer: {count / slow:,.0f} rows/sec")
+        self.stdout.write(f"  values() fast path: {count / fast:,.0f} rows/sec")
+        self.stdout.write(self.style.SUCCESS(f"Speed-up: {slow / fast:.1f}x"))
+
+    @staticmethod
+    def _best_time(func, repeat):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
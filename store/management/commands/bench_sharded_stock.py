@@ -0,0 +1,164 @@
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+
+from accounts.models import User
+from store import inventory
+from store.checkout import CheckoutError, place_order
+from store.models import CartItem, Category, Order, OrderItem, Product, StockMovement, StockShard
+
+
+class Command(BaseCommand):
+    help = (
+        "Checkout throughput on one hot product, unsharded and with several "
+        "stock shard counts (store/inventory.py). Every customer buys one "
+        "unit; fails on overselling or a ledger that doesn't add up. Uses "
+        "throwaway products/users and deletes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--shards",
+            default="0,1,4,16",
+            help="Comma-separated shard counts to compare, 0 = unsharded (default: 0,1,4,16)",
+        )
+        parser.add_argument(
+            "--customers",
+            type=int,
+            default=300,
+            help="Checkouts per run (default: 300)",
+        )
+        parser.add_argument(
+            "--stock",
+            type=int,
+            default=None,
+            help="Starting stock (default: 90%% of --customers, so some checkouts are rejected)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=32,
+            help="Threads, i.e. simultaneous database connections (default: 32)",
+        )
+        parser.add_argument(
+            "--latency-ms",
+            type=float,
+            default=50.0,
+            help="Work simulated after the stock is taken, before commit, holding the locks (default: 50)",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Row locking needs PostgreSQL; this database is %s." % connection.vendor)
+        try:
+            shard_counts = [int(value) for value in options["shards"].split(",") if value.strip()]
+        except ValueError:
+            raise CommandError("--shards takes comma-separated integers, e.g. 0,1,4,16.")
+        if any(count < 0 or count > inventory.MAX_SHARDS for count in shard_counts):
+            raise CommandError(f"Shard counts must be between 0 and {inventory.MAX_SHARDS}.")
+
+        customers = max(1, options["customers"])
+        stock = options["stock"] if options["stock"] is not None else customers * 9 // 10
+        failures = []
+        for shards in shard_counts:
+            elapsed, outcomes, problems = self.run(shards, customers, max(0, stock), options)
+            failures += [f"{shards} shard(s): {problem}" for problem in problems]
+            self.stdout.write(
+                f"{'unsharded' if not shards else f'{shards} shard(s)':>12}: "
+                f"{customers} checkouts in {elapsed:.2f}s = {outcomes['ok'] / elapsed:.0f} orders/s ("
+                + ", ".join(f"{count} {outcome}" for outcome, count in sorted(outcomes.items()))
+                + ")"
+            )
+        if failures:
+            raise CommandError("\n".join(failures))
+        self.stdout.write(self.style.SUCCESS("No overselling: shards, ledger and order lines match."))
+
+    def run(self, shards, customers, stock, options):
+        workers = max(1, options["workers"])
+        latency = max(0.0, options["latency_ms"]) / 1000
+        run = uuid.uuid4().hex[:8]
+
+        category = Category.objects.create(name=f"bench-{run}", slug=f"bench-{run}")
+        product = Product.objects.create(
+            category=category,
+            name=f"Bench {run}",
+            slug=f"bench-{run}",
+            sku=f"BENCH-{run}",
+            price=10,
+            stock=stock,
+        )
+        if shards:
+            inventory.shard(product.pk, shards)
+        users = [
+            User.objects.create_user(f"bench-{run}-{i}", role=User.Roles.CUSTOMER)
+            for i in range(customers)
+        ]
+        CartItem.objects.bulk_create([CartItem(user=user, product=product, quantity=1) for user in users])
+
+        # one connection per worker, all starting together
+        slices = [users[i::workers] for i in range(min(workers, customers))]
+        barrier = threading.Barrier(len(slices))
+
+        def checkout(user):
+            try:
+                with transaction.atomic():
+                    place_order(user)
+                    time.sleep(latency)
+                return "ok"
+            except CheckoutError:
+                return "rejected"
+            except Exception as exc:
+                return f"error: {exc.__class__.__name__}: {exc}"
+
+        def work(batch):
+            try:
+                connection.ensure_connection()
+                try:
+                    barrier.wait(timeout=10)
+                except threading.BrokenBarrierError:
+                    pass
+                return [checkout(user) for user in batch]
+            finally:
+                connections.close_all()
+
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=len(slices)) as pool:
+                outcomes = Counter(outcome for batch in pool.map(work, slices) for outcome in batch)
+            elapsed = time.perf_counter() - started
+            inventory.compact()
+            problems = self.verify(product, stock, outcomes)
+        finally:
+            Order.objects.filter(user__in=users).delete()
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+            Product.objects.filter(category=category).delete()
+            category.delete()
+        return elapsed, outcomes, problems
+
+    @staticmethod
+    def verify(product, stock, outcomes):
+        problems = [f"{count} checkouts failed with {outcome}" for outcome, count in outcomes.items()
+                    if outcome.startswith("error")]
+
+        remaining = Product.objects.values_list("stock", flat=True).get(pk=product.pk)
+        sold = sum(OrderItem.objects.filter(product=product).values_list("quantity", flat=True))
+        ledger = sum(StockMovement.objects.filter(product=product).values_list("delta", flat=True))
+        shards = list(StockShard.objects.filter(product=product).values_list("available", flat=True))
+
+        if sold > stock:
+            problems.append(f"oversold: {sold} units sold from {stock}")
+        if sold + remaining != stock:
+            problems.append(f"sold {sold} + left {remaining} != started with {stock}")
+        if ledger != -sold:
+            problems.append(f"ledger says {-ledger} units sold, order lines say {sold}")
+        if shards and sum(shards) != remaining:
+            problems.append(f"shards hold {sum(shards)} units, compacted stock is {remaining}")
+        if outcomes["ok"] != min(stock, sum(outcomes.values())):
+            # every customer buys one unit: all stock should sell
+            problems.append(f"{outcomes['ok']} orders placed with stock for {stock}")
+        return problems
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store import inventory
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold pending stock ledger rows into Product.stock and even out the "
+        "shards of sharded products (store/inventory.py)."
+    )
+
+    def handle(self, *args, **options):
+        folded = inventory.compact()
+        self.stdout.write(f"Compacted {folded} ledger row(s).")
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store import outbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Deliver pending outbox events (store/outbox.py) to their subscribers. "
+        "Safe to run several at once: each takes its own rows (SKIP LOCKED)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=outbox.DISPATCH_BATCH_SIZE,
+            help=f"Events locked and delivered per transaction (default: {outbox.DISPATCH_BATCH_SIZE})",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling instead of exiting once the outbox is drained",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds between polls with --loop (default: 1)",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            dispatched, failed = outbox.dispatch(batch_size=options["batch_size"])
+            if dispatched or failed or not options["loop"]:
+                self.stdout.write(f"Dispatched {dispatched} event(s), {failed} failed.")
+            if not options["loop"]:
+                return
+            time.sleep(options["interval"])
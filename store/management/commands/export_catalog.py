@@ -0,0 +1,32 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from store.catalog_io import FORMATS, guess_format, stream_export
+
+
+class Command(BaseCommand):
+    help = "Stream the whole catalog to CSV or JSON Lines (same columns the importer reads)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            help="File to write (default: stdout)",
+        )
+        parser.add_argument(
+            "--file-format",
+            choices=FORMATS,
+            help="File format (default: guessed from --output, else csv)",
+        )
+
+    def handle(self, *args, **options):
+        output = options["output"]
+        file_format = options["file_format"] or guess_format(output)
+
+        if not output:
+            sys.stdout.writelines(stream_export(file_format))
+            return
+
+        with open(output, "w", encoding="utf-8", newline="") as stream:
+            stream.writelines(stream_export(file_format))
+        self.stderr.write(self.style.SUCCESS(f"Catalog written to {output}"))
@@ -0,0 +1,43 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.catalog_io import DEFAULT_CHUNK_SIZE, FORMATS, guess_format, import_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        "Upsert products by SKU from a CSV or JSON Lines file. The file is "
+        "streamed and written in chunks, one transaction per chunk."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSONL file to import")
+        parser.add_argument(
+            "--file-format",
+            choices=FORMATS,
+            help="File format (default: guessed from the extension, else csv)",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help=f"Rows per transaction (default: {DEFAULT_CHUNK_SIZE})",
+        )
+
+    def handle(self, *args, **options):
+        file_format = options["file_format"] or guess_format(options["path"])
+        chunk_size = max(1, options["chunk_size"])
+
+        try:
+            with open(options["path"], encoding="utf-8-sig", newline="") as stream:
+                report = import_catalog(stream, file_format, chunk_size)
+        except OSError as exc:
+            raise CommandError(str(exc))
+
+        for error in report.errors:
+            self.stderr.write(json.dumps(error, default=str))
+        self.stdout.write(self.style.SUCCESS(
+            f"{report.rows} rows: {report.created} created, "
+            f"{report.updated} updated, {report.error_count} errors"
+        ))
@@ -1,9 +1,11 @@
 from datetime import timedelta
 
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.core.mail import send_mail
 from django.utils import timezone
 
+from store import outbox
 from store.models import Product
 from accounts.models import User
 
@@ -11,7 +13,19 @@ from accounts.models import User
 class Command(BaseCommand):
     help = "Find low-stock products (stock < 10), log them, and email store managers."
 
-    LOW_STOCK_THRESHOLD = 10
+    LOW_STOCK_THRESHOLD = getattr(settings, "LOW_STOCK_THRESHOLD", 10)
+    # outbox consumer name for --events
+    CONSUMER = "low-stock-alert"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--events",
+            action="store_true",
+            help=(
+                "Only report products that went under the threshold since the last "
+                "--events run (stock.low outbox events) instead of scanning the catalog."
+            ),
+        )
 
     def handle(self, *args, **options):
         now = timezone.now()
@@ -25,6 +39,14 @@ class Command(BaseCommand):
             .order_by("stock")
         )
 
+        # Event mode: just the products checkout reported, if still low
+        events = None
+        if options["events"]:
+            events = list(outbox.unhandled(self.CONSUMER, [outbox.STOCK_LOW]))
+            low_stock_products = low_stock_products.filter(
+                pk__in={event.payload["product_id"] for event in events}
+            )
+
         # Log to file
         with open(log_path, "a", encoding="utf-8") as f:
             if not low_stock_products.exists():
@@ -91,4 +113,7 @@ class Command(BaseCommand):
             # No low-stock products = nothing to email
             self.stdout.write(self.style.WARNING("No low-stock products. No email sent."))
 
+        if events:
+            outbox.mark_handled(self.CONSUMER, events)
+
         self.stdout.write(self.style.SUCCESS("Low-stock products check completed."))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from store import cache as catalog_cache
+from store.models import Category
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute Category.product_count (active products in each category "
+        "and its descendants). Counts are maintained on every write; this "
+        "repairs drift, e.g. after raw SQL changes."
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            Category.objects.rebuild_product_counts()
+        catalog_cache.bump_categories()
+        self.stdout.write(self.style.SUCCESS("Category product counts rebuilt."))
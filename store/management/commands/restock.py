@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store import inventory
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Add units to a product's stock, recorded in the stock ledger. A "
+        "sharded product gets them on its emptiest shard (store/inventory.py); "
+        "its stock can't be edited directly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("product", help="Product id or slug")
+        parser.add_argument("units", type=int, help="Units to add")
+
+    def handle(self, *args, **options):
+        if options["units"] < 1:
+            raise CommandError("units must be at least 1.")
+        lookup = {"pk": options["product"]} if options["product"].isdigit() else {"slug": options["product"]}
+        product = Product.objects.filter(**lookup).first()
+        if product is None:
+            raise CommandError(f"No product {options['product']!r}.")
+
+        inventory.restock(product.pk, options["units"])
+        product.refresh_from_db(fields=["stock", "reserved", "stock_shards"])
+        available = inventory.available([(product.pk, product.stock, product.reserved, product.stock_shards)])
+        self.stdout.write(f"{product.name}: +{options['units']}, {available[product.pk]} available.")
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store import inventory
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Split a hot product's stock over several counters so concurrent "
+        "checkouts don't queue on its row, or put it back (store/inventory.py)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("product", help="Product id or slug")
+        group = parser.add_mutually_exclusive_group(required=True)
+        group.add_argument(
+            "--shards",
+            type=int,
+            help=f"Number of stock shards (1-{inventory.MAX_SHARDS})",
+        )
+        group.add_argument(
+            "--off",
+            action="store_true",
+            help="Fold the shards back into the product's stock",
+        )
+
+    def handle(self, *args, **options):
+        lookup = {"pk": options["product"]} if options["product"].isdigit() else {"slug": options["product"]}
+        product = Product.objects.filter(**lookup).first()
+        if product is None:
+            raise CommandError(f"No product {options['product']!r}.")
+
+        if options["off"]:
+            inventory.unshard(product.pk)
+            product.refresh_from_db(fields=["stock"])
+            self.stdout.write(f"{product.name}: unsharded, stock {product.stock}.")
+            return
+
+        try:
+            inventory.shard(product.pk, options["shards"])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(f"{product.name}: stock split over {options['shards']} shard(s).")
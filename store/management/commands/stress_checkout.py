@@ -0,0 +1,153 @@
+import random
+import threading
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from accounts.models import User
+from store.cart import CartError, add_to_cart
+from store.checkout import CheckoutError, place_order
+from store.models import CartItem, Category, Order, OrderItem, Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Concurrency stress test for checkout: many customers with the same "
+        "products in their carts check out at once against limited stock. "
+        "Fails if any stock is oversold, lost or deadlocked. Uses throwaway "
+        "products/users and deletes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--customers",
+            type=int,
+            default=50,
+            help="Concurrent checkouts (default: 50)",
+        )
+        parser.add_argument(
+            "--products",
+            type=int,
+            default=3,
+            help="Products every cart contains, added in random order (default: 3)",
+        )
+        parser.add_argument(
+            "--stock",
+            type=int,
+            default=20,
+            help="Starting stock of each product (default: 20)",
+        )
+        parser.add_argument(
+            "--reserve",
+            action="store_true",
+            help="Fill carts through add_to_cart, concurrently, so stock is reserved first",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=16,
+            help="Threads, i.e. simultaneous database connections (default: 16)",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Row locking needs PostgreSQL; this database is %s." % connection.vendor)
+
+        customers = max(1, options["customers"])
+        workers = max(1, options["workers"])
+        stock = max(0, options["stock"])
+        run = uuid.uuid4().hex[:8]
+
+        category = Category.objects.create(name=f"stress-{run}", slug=f"stress-{run}")
+        products = [
+            Product.objects.create(
+                category=category,
+                name=f"Stress {run} #{i}",
+                slug=f"stress-{run}-{i}",
+                sku=f"STRESS-{run}-{i}",
+                price=10,
+                stock=stock,
+            )
+            for i in range(max(1, options["products"]))
+        ]
+        users = [
+            User.objects.create_user(f"stress-{run}-{i}", role=User.Roles.CUSTOMER)
+            for i in range(customers)
+        ]
+        # random insertion order: lock ordering must not depend on it
+        carts = {
+            user.pk: [(product, random.randint(1, 3)) for product in random.sample(products, len(products))]
+            for user in users
+        }
+        wanted = sum(quantity for cart in carts.values() for _, quantity in cart)
+        if not options["reserve"]:
+            for user in users:
+                for product, quantity in carts[user.pk]:
+                    CartItem.objects.create(user=user, product=product, quantity=quantity)
+
+        barrier = threading.Barrier(min(workers, customers))
+
+        def checkout(user):
+            try:
+                try:
+                    barrier.wait(timeout=5)
+                except threading.BrokenBarrierError:
+                    pass
+                if options["reserve"]:
+                    for product, quantity in carts[user.pk]:
+                        try:
+                            add_to_cart(user, product, quantity)
+                        except CartError:
+                            pass
+                place_order(user)
+                return "ok"
+            except CheckoutError:
+                return "rejected"
+            except Exception as exc:
+                return f"error: {exc.__class__.__name__}: {exc}"
+            finally:
+                connections.close_all()
+
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                outcomes = Counter(pool.map(checkout, users))
+            failures = self.verify(products, stock, outcomes)
+        finally:
+            Order.objects.filter(user__in=users).delete()
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+            Product.objects.filter(category=category).delete()
+            category.delete()
+
+        self.stdout.write(
+            f"{customers} checkouts over {len(products)} products "
+            f"(stock {stock} each, {wanted} units requested): "
+            + ", ".join(f"{count} {outcome}" for outcome, count in sorted(outcomes.items()))
+        )
+        if failures:
+            raise CommandError("\n".join(failures))
+        self.stdout.write(self.style.SUCCESS("No overselling: stock and order lines match."))
+
+    @staticmethod
+    def verify(products, stock, outcomes):
+        failures = [f"{count} checkouts failed with {outcome}" for outcome, count in outcomes.items()
+                    if outcome.startswith("error")]
+
+        remaining = dict(Product.objects.filter(pk__in=[p.pk for p in products]).values_list("pk", "stock"))
+        reserved = dict(Product.objects.filter(pk__in=[p.pk for p in products]).values_list("pk", "reserved"))
+        sold = Counter()
+        for product_id, quantity in OrderItem.objects.filter(product__in=products).values_list("product_id", "quantity"):
+            sold[product_id] += quantity
+
+        for product in products:
+            if remaining[product.pk] < 0:
+                failures.append(f"{product.name}: stock went negative ({remaining[product.pk]})")
+            if reserved[product.pk]:
+                failures.append(f"{product.name}: {reserved[product.pk]} units still reserved after checkout")
+            if sold[product.pk] + remaining[product.pk] != stock:
+                failures.append(
+                    f"{product.name}: sold {sold[product.pk]} + left {remaining[product.pk]} != started with {stock}"
+                )
+        return failures
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.8 on 2026-10-17 06:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_paths_and_counts(apps, schema_editor):
+    # Existing categories are all roots
+    Category = apps.get_model('store', 'Category')
+    Product = apps.get_model('store', 'Product')
+    for category in Category.objects.all():
+        Category.objects.filter(pk=category.pk).update(
+            path=f"{category.pk}/",
+            depth=0,
+            product_count=Product.objects.filter(category_id=category.pk, is_active=True).count(),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0004_product_effective_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='children', to='store.category'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['path'], name='store_category_path_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(fill_paths_and_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.8 on 2026-10-17 06:27
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_product_snapshots(apps, schema_editor):
+    OrderItem = apps.get_model('store', 'OrderItem')
+    Product = apps.get_model('store', 'Product')
+    product = Product.objects.filter(pk=OuterRef('product_id'))
+    OrderItem.objects.update(
+        product_name=Subquery(product.values('name')[:1]),
+        product_sku=Subquery(product.values('sku')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_stock_reservations'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_name',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_sku',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_at'], name='store_order_user_id_f28375_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', '-created_at'], name='store_order_status_7b2658_idx'),
+        ),
+        migrations.RunPython(fill_product_snapshots, migrations.RunPython.noop),
+    ]
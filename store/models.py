@@ -1,21 +1,336 @@
+import uuid
+from collections import Counter, defaultdict
+
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, Value
+from django.db.models.functions import Coalesce, Concat, Substr
 from django.utils import timezone
 from django.conf import settings
 from django.core.validators import MinValueValidator
 
+from . import cache as catalog_cache
+
+
+def path_ids(path):
+    """
+    Category ids along a materialized path, root first: "1/5/9/" -> [1, 5, 9].
+    """
+    return [int(part) for part in path.split('/') if part]
+
+
+def product_count_deltas(removed=(), added=()):
+    """
+    Per-category change in active products, from (category_id, is_active)
+    pairs that stopped / started counting.
+    """
+    deltas = Counter()
+    for category_id, is_active in removed:
+        if is_active:
+            deltas[category_id] -= 1
+    for category_id, is_active in added:
+        if is_active:
+            deltas[category_id] += 1
+    return deltas
+
+
+# Product fields that change which category counts a product
+COUNTED_FIELDS = {'category', 'category_id', 'is_active'}
+
+
+class CategoryQuerySet(models.QuerySet):
+    """
+    Bulk writes skip model signals, so bump the catalog cache here.
+    """
+
+    def subtree(self, category):
+        """
+        The category and all its descendants (one indexed prefix scan).
+        """
+        return self.filter(path__startswith=category.path)
+
+    def update(self, **kwargs):
+        category_ids = list(self.values_list('pk', flat=True))
+        rows = super().update(**kwargs)
+        if rows:
+            catalog_cache.bump_categories(category_ids)
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        catalog_cache.bump_categories([obj.pk for obj in objs])
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        rows = super().bulk_update(objs, fields, *args, **kwargs)
+        catalog_cache.bump_categories([obj.pk for obj in objs])
+        return rows
+
+    # ---------- descendant product counts ----------
+    #
+    # Category.product_count is the number of active products in the
+    # category and everything below it. Product writes adjust the counts of
+    # the category and its ancestors in place; rebuild_product_counts()
+    # recomputes them from scratch.
+    #
+    # These updates don't bump the catalog cache themselves: the product
+    # write that causes them already bumps the global generation, which
+    # category listings depend on.
+
+    def adjust_product_counts(self, deltas):
+        deltas = {pk: delta for pk, delta in deltas.items() if pk is not None and delta}
+        if not deltas:
+            return
+        paths = dict(models.QuerySet(self.model).filter(pk__in=deltas).values_list('pk', 'path'))
+
+        per_node = Counter()
+        for pk, delta in deltas.items():
+            for ancestor_id in path_ids(paths.get(pk, '')):
+                per_node[ancestor_id] += delta
+        self._apply_counts(per_node, relative=True)
+
+    def rebuild_product_counts(self):
+        paths = dict(models.QuerySet(self.model).values_list('pk', 'path'))
+        active = (
+            Product.objects
+            .filter(is_active=True)
+            .order_by()
+            .values('category_id')
+            .annotate(total=Count('pk'))
+            .values_list('category_id', 'total')
+        )
+        per_node = Counter({pk: 0 for pk in paths})
+        for category_id, total in active:
+            for ancestor_id in path_ids(paths.get(category_id, '')):
+                per_node[ancestor_id] += total
+        self._apply_counts(per_node, relative=False)
+
+    def _apply_counts(self, per_node, relative):
+        # one UPDATE per distinct value rather than one per category
+        by_value = defaultdict(list)
+        for pk, value in per_node.items():
+            if value or not relative:
+                by_value[value].append(pk)
+        for value, pks in by_value.items():
+            new_value = F('product_count') + value if relative else value
+            # plain QuerySet.update: no catalog bump (see above)
+            models.QuerySet(self.model).filter(pk__in=sorted(pks)).update(product_count=new_value)
+
+
+class ProductQuerySet(models.QuerySet):
+    """
+    Bulk writes skip model signals, so bump the catalog cache here.
+
+    Category product counts are kept in step the same way.
+    """
+
+    def update(self, **kwargs):
+        counted = COUNTED_FIELDS & kwargs.keys()
+        new_category = kwargs.get('category_id', kwargs.get('category'))
+        new_category = getattr(new_category, 'pk', new_category)
+
+        with transaction.atomic():
+            affected = self
+            if counted:
+                # lock the rows so the counts we derive from them stay true
+                affected = affected.select_for_update()
+            affected = list(affected.values_list('category_id', 'slug', 'is_active'))
+            rows = super().update(**kwargs)
+
+            if rows and counted:
+                if any(hasattr(kwargs[field], 'resolve_expression') for field in counted):
+                    Category.objects.rebuild_product_counts()
+                else:
+                    Category.objects.adjust_product_counts(product_count_deltas(
+                        removed=[(category_id, is_active) for category_id, _, is_active in affected],
+                        added=[
+                            (
+                                new_category if {'category', 'category_id'} & counted else category_id,
+                                kwargs.get('is_active', is_active),
+                            )
+                            for category_id, _, is_active in affected
+                        ],
+                    ))
+
+        if rows:
+            category_ids = {category_id for category_id, _, _ in affected}
+            slugs = {slug for _, slug, _ in affected}
+            category_ids.add(new_category)
+            if kwargs.get('slug'):
+                slugs.add(kwargs['slug'])
+            catalog_cache.bump_products(category_ids, slugs)
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        with transaction.atomic():
+            existing = self._conflicting_rows(objs, kwargs)
+            objs = super().bulk_create(objs, *args, **kwargs)
+            if existing is None:
+                Category.objects.rebuild_product_counts()
+            else:
+                Category.objects.adjust_product_counts(self._upsert_count_deltas(objs, existing, kwargs))
+        catalog_cache.bump_products(
+            {obj.category_id for obj in objs} | {category_id for category_id, _ in (existing or {}).values()},
+            {obj.slug for obj in objs},
+        )
+        return objs
+
+    def _conflicting_rows(self, objs, kwargs):
+        """
+        {unique value: (category_id, is_active)} for rows an upsert will
+        overwrite; {} for plain inserts, None when that can't be worked out.
+        """
+        if not kwargs.get('update_conflicts'):
+            return {}
+        unique_fields = kwargs.get('unique_fields') or []
+        if len(unique_fields) != 1:
+            return None
+        field = unique_fields[0]
+        values = [getattr(obj, field) for obj in objs]
+        return {
+            value: (category_id, is_active)
+            for value, category_id, is_active in (
+                models.QuerySet(self.model)
+                .select_for_update()
+                .filter(**{f"{field}__in": values})
+                .values_list(field, 'category_id', 'is_active')
+            )
+        }
+
+    @staticmethod
+    def _upsert_count_deltas(objs, existing, kwargs):
+        if not existing:
+            return product_count_deltas(added=[(obj.category_id, obj.is_active) for obj in objs])
+        field = kwargs['unique_fields'][0]
+        update_fields = set(kwargs.get('update_fields') or ())
+        removed, added = [], []
+        for obj in objs:
+            old = existing.get(getattr(obj, field))
+            if old is None:
+                added.append((obj.category_id, obj.is_active))
+                continue
+            removed.append(old)
+            added.append((
+                obj.category_id if {'category', 'category_id'} & update_fields else old[0],
+                obj.is_active if 'is_active' in update_fields else old[1],
+            ))
+        return product_count_deltas(removed, added)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        with transaction.atomic():
+            rows = super().bulk_update(objs, fields, *args, **kwargs)
+            if COUNTED_FIELDS & set(fields):
+                removed, added = [], []
+                for obj in objs:
+                    original = getattr(obj, '_catalog_original', None)
+                    if original:
+                        removed.append((original[0], original[2]))
+                        added.append((obj.category_id, obj.is_active))
+                Category.objects.adjust_product_counts(product_count_deltas(removed, added))
+
+        category_ids, slugs = set(), set()
+        for obj in objs:
+            category_ids.add(obj.category_id)
+            slugs.add(obj.slug)
+            # values from when the object was loaded (see store.signals)
+            original = getattr(obj, '_catalog_original', None)
+            if original:
+                category_ids.add(original[0])
+                slugs.add(original[1])
+                obj._catalog_original = (obj.category_id, obj.slug, obj.is_active)
+        catalog_cache.bump_products(category_ids, slugs)
+        return rows
+
+
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(max_length=120, unique=True)
     description = models.TextField(blank=True, null=True)
+    parent = models.ForeignKey(
+        'self',
+        related_name='children',
+        on_delete=models.PROTECT,
+        blank=True,
+        null=True,
+    )
+
+    # Materialized path of ids from the root, e.g. "1/5/9/". A subtree is
+    # every category whose path starts with its root's path.
+    path = models.CharField(max_length=255, editable=False, default='')
+    depth = models.PositiveSmallIntegerField(editable=False, default=0)
+    # Active products in this category and all its descendants
+    product_count = models.PositiveIntegerField(editable=False, default=0)
+
+    objects = CategoryQuerySet.as_manager()
 
     class Meta:
         verbose_name_plural = 'Categories'
         indexes = [
             models.Index(fields=['slug']),
+            # varchar_pattern_ops lets LIKE 'prefix%' use the index
+            models.Index(fields=['path'], name='store_category_path_idx', opclasses=['varchar_pattern_ops']),
         ]
 
+    def clean(self):
+        if self.parent_id and self.pk and self.parent.path.startswith(self.path or f"{self.pk}/"):
+            raise ValidationError("A category can't be moved under itself or one of its descendants.")
+
+    # Maintained in the database; an instance's copy may be stale
+    TREE_FIELDS = ('path', 'depth', 'product_count')
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.TREE_FIELDS
+            ]
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self._sync_path()
+
+    def _sync_path(self):
+        """
+        Set path/depth from the parent; on a move, rewrite the whole subtree
+        and carry its product count from the old ancestors to the new ones.
+        """
+        categories = type(self).objects
+        parent_path, parent_depth = '', -1
+        if self.parent_id:
+            parent_path, parent_depth = categories.values_list('path', 'depth').get(pk=self.parent_id)
+
+        old_path, old_depth, product_count = (
+            categories.select_for_update().values_list('path', 'depth', 'product_count').get(pk=self.pk)
+        )
+        new_path = f"{parent_path}{self.pk}/"
+        if new_path == old_path:
+            return
+        if old_path and parent_path.startswith(old_path):
+            raise ValueError("A category can't be moved under itself or one of its descendants.")
+
+        if old_path:
+            categories.filter(path__startswith=old_path).update(
+                path=Concat(Value(new_path), Substr('path', len(old_path) + 1)),
+                depth=F('depth') + (parent_depth + 1 - old_depth),
+            )
+            per_node = Counter()
+            for ancestor_id in path_ids(old_path)[:-1]:
+                per_node[ancestor_id] -= product_count
+            for ancestor_id in path_ids(parent_path):
+                per_node[ancestor_id] += product_count
+            categories.all()._apply_counts(per_node, relative=True)
+        else:
+            categories.filter(pk=self.pk).update(path=new_path, depth=parent_depth + 1)
+
+        self.path, self.depth = new_path, parent_depth + 1
+
+    def get_ancestor_ids(self):
+        return path_ids(self.path)[:-1]
+
     def __str__(self):
         return self.name
 
@@ -41,18 +356,49 @@ class Product(models.Model):
         validators=[MinValueValidator(0)]
     )
 
+    # What the customer actually pays. Generated by Postgres, so it is always
+    # in sync with price/discount_price no matter how they were written.
+    effective_price = models.GeneratedField(
+        expression=Coalesce('discount_price', 'price'),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        db_persist=True,
+    )
+
     stock = models.PositiveIntegerField(default=0)  
+    # Units held by live cart reservations (store/reservations.py).
+    # Available to new carts: stock - reserved.
+    reserved = models.PositiveIntegerField(default=0, editable=False)
+    # > 0: stock is split over this many StockShard rows (store/inventory.py)
+    # and `stock` only catches up when the ledger is compacted.
+    stock_shards = models.PositiveSmallIntegerField(default=0, editable=False)
     is_active = models.BooleanField(default=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Maintained by Postgres itself (STORED generated column), so it stays
+    # current for every write path: API, admin, bulk updates and raw SQL.
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector('sku', weight='A', config='simple')
+            + SearchVector('name', weight='A', config='simple')
+            + SearchVector('description', weight='B', config='simple')
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['slug']),
             models.Index(fields=['category', 'price']),
+            models.Index(fields=['category', 'effective_price']),
+            models.Index(fields=['effective_price']),
             models.Index(fields=['is_active']),
+            GinIndex(fields=['search_vector'], name='store_product_search_gin'),
         ]
     
     def clean(self):
@@ -69,8 +415,33 @@ class Product(models.Model):
             if self.price is not None and self.discount_price > self.price:
                 raise ValidationError("Discount price cannot be greater than price.")
 
+    @property
+    def available_stock(self):
+        return max(self.stock - self.reserved, 0)
+
+    def save(self, *args, **kwargs):
+        # reserved and stock_shards are only ever changed in place by the
+        # reservation/inventory code, and so is a sharded product's stock;
+        # don't write back this instance's possibly stale copy
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            managed = {'reserved', 'stock_shards'} | ({'stock'} if self.stock_shards else set())
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and not field.generated and field.name not in managed
+            ]
+        # atomic so the category count adjustment (store.signals) commits with the row
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+        # Postgres recomputes effective_price, but an UPDATE doesn't send it
+        # back; mirror the Coalesce so this instance isn't stale.
+        price_field = self._meta.get_field('price')
+        discount = price_field.to_python(self.discount_price)
+        self.effective_price = discount if discount is not None else price_field.to_python(self.price)
+
     def __str__(self):
         return self.name
+
+
 class CartItem(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -97,6 +468,92 @@ class CartItem(models.Model):
         return f"{self.quantity} x {self.product.name} for {self.user.username}"
 
 
+class StockReservation(models.Model):
+    """
+    Stock held for a cart line until expires_at. The quantity is counted in
+    Product.reserved from creation until the row is deleted (at checkout,
+    when the line is removed, or by the expiry sweeper).
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='stock_reservations'
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='reservations'
+    )
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'product')
+        indexes = [
+            models.Index(fields=['expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} held for {self.user_id} until {self.expires_at}"
+
+
+class StockShard(models.Model):
+    """
+    One slice of a sharded product's stock. Checkouts take units from any
+    shard with room, so they don't all queue on the product row.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='shards')
+    index = models.PositiveSmallIntegerField()
+    available = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('product', 'index')
+
+    def __str__(self):
+        return f"{self.product_id}#{self.index}: {self.available}"
+
+
+class StockMovement(models.Model):
+    """
+    Append-only stock ledger. Movements of sharded products are folded into
+    Product.stock by compaction (compacted_at set then); the rest are
+    applied to the product row as they happen and recorded compacted.
+    """
+
+    class Reason(models.TextChoices):
+        SALE = "SALE", "Sale"
+        RESTOCK = "RESTOCK", "Restock"
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_movements')
+    delta = models.IntegerField()
+    reason = models.CharField(max_length=10, choices=Reason.choices)
+    shard = models.PositiveSmallIntegerField(null=True, blank=True)
+    order = models.ForeignKey(
+        'Order',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='stock_movements'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    compacted_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'created_at']),
+            # compaction's scan: only pending rows are indexed
+            models.Index(
+                fields=['product'],
+                name='store_stockmove_pending_idx',
+                condition=models.Q(compacted_at__isnull=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.delta:+d} x {self.product_id} ({self.reason})"
+
+
 class Order(models.Model):
     class Status(models.TextChoices):
         PENDING = "PENDING", "Pending"
@@ -117,6 +574,14 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # order history: a customer's orders newest first / by date range
+            models.Index(fields=['user', '-created_at']),
+            # manager listing filtered by status
+            models.Index(fields=['status', '-created_at']),
+        ]
+
     def __str__(self):
         return f"Order #{self.id} by {self.user.username}"
 
@@ -134,6 +599,10 @@ class OrderItem(models.Model):
     )
     quantity = models.PositiveIntegerField()
     price_at_purchase = models.DecimalField(max_digits=10, decimal_places=2)
+    # Copied at checkout, so order history shows what was bought even after
+    # the product is renamed, and compact listings don't join products.
+    product_name = models.CharField(max_length=200, blank=True, default='')
+    product_sku = models.CharField(max_length=50, blank=True, default='')
 
     def clean(self):
         if self.quantity <= 0:
@@ -142,6 +611,98 @@ class OrderItem(models.Model):
     def __str__(self):
         return f"{self.quantity} x {self.product.name} in order {self.order.id}"
 
+class CheckoutJob(models.Model):
+    """
+    A queued checkout (store/checkout_queue.py). The request that creates it
+    returns 202 straight away; a worker runs place_order later and links
+    the resulting order, or records why it failed.
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = "QUEUED", "Queued"
+        RUNNING = "RUNNING", "Running"
+        DONE = "DONE", "Done"
+        FAILED = "FAILED", "Failed"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='checkout_jobs'
+    )
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.QUEUED)
+    # Which checkout queue the job went to
+    partition = models.PositiveSmallIntegerField(default=0)
+    order = models.OneToOneField(
+        Order,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='checkout_job'
+    )
+    error = models.CharField(max_length=255, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'partition']),
+            models.Index(fields=['user', 'status']),
+            models.Index(fields=['finished_at']),
+        ]
+
+    def __str__(self):
+        return f"Checkout {self.id} for {self.user_id}: {self.status}"
+
+
+class OutboxEvent(models.Model):
+    """
+    A domain event written in the same transaction as the change it
+    describes (store/outbox.py). `key` makes publishing idempotent; the
+    dispatcher sets dispatched_at once every subscriber has it.
+    """
+    topic = models.CharField(max_length=64)
+    key = models.CharField(max_length=200, unique=True)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # retries are pushed back here with a backoff
+    available_at = models.DateTimeField(default=timezone.now)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.CharField(max_length=255, blank=True, default='')
+
+    class Meta:
+        indexes = [
+            # the dispatcher's scan: only undispatched rows are indexed
+            models.Index(
+                fields=['available_at'],
+                name='store_outbox_pending_idx',
+                condition=models.Q(dispatched_at__isnull=True),
+            ),
+            models.Index(fields=['topic', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} {self.key}"
+
+
+class OutboxReceipt(models.Model):
+    """
+    `consumer` has handled `event`. Written in the consumer's transaction,
+    so a redelivered event is skipped (dedupe for at-least-once delivery).
+    """
+    consumer = models.CharField(max_length=100)
+    event = models.ForeignKey(OutboxEvent, on_delete=models.CASCADE, related_name='receipts')
+    handled_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('consumer', 'event')
+
+    def __str__(self):
+        return f"{self.consumer} handled {self.event_id}"
+
+
 class OrderReminder(models.Model):
     """
     Tracks when a reminder email was sent for an order.
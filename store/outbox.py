@@ -0,0 +1,193 @@
+"""
+Transactional outbox for side effects of orders and stock changes.
+
+Code that changes state publishes events in the same transaction
+(publish_many), so an event exists if and only if the change committed.
+Nothing else happens in the request: emails, analytics etc. run later.
+
+Push: dispatch() drains undispatched events in batches, locking them
+with SELECT ... FOR UPDATE SKIP LOCKED so several dispatchers can run at
+once without taking the same rows. Each event goes to the subscribers
+listed for its topic in OUTBOX_SUBSCRIBERS:
+
+    "task:<name>"   Celery task, called with the event id
+    "<dotted.path>" local callable, called with the event inside the
+                    dispatcher's transaction
+
+An event is marked dispatched once every subscriber has it; a failure
+leaves it undispatched with a backoff, so delivery is at-least-once.
+Consumers dedupe with receipts (OutboxReceipt): local handlers get this
+for free, Celery tasks wrap their work in `with delivery(event_id, name)`.
+
+Pull: polling commands read the events they haven't handled yet
+(unhandled) and record receipts (mark_handled) instead of rescanning the
+tables the events came from.
+
+Run the dispatcher from Celery beat ("dispatch_outbox") or
+`manage.py dispatch_outbox --loop`.
+"""
+import logging
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import timedelta
+
+from celery import current_app
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OutboxEvent, OutboxReceipt
+
+logger = logging.getLogger(__name__)
+
+ORDER_PLACED = "order.placed"
+STOCK_LOW = "stock.low"
+
+TASK_PREFIX = "task:"
+DISPATCH_BATCH_SIZE = 100
+MAX_BACKOFF = timedelta(hours=1)
+DEFAULT_RETENTION = timedelta(days=7)
+
+Event = namedtuple("Event", ["topic", "key", "payload"])
+
+
+def publish_many(events):
+    """
+    Record events in the current transaction. An event whose key already
+    exists is dropped, so republishing is harmless.
+    """
+    if events:
+        OutboxEvent.objects.bulk_create(
+            [OutboxEvent(topic=event.topic, key=event.key, payload=event.payload) for event in events],
+            ignore_conflicts=True,
+        )
+
+
+def publish(topic, key, payload):
+    publish_many([Event(topic, key, payload)])
+
+
+# ---------- push ----------
+
+def subscribers(topic):
+    return getattr(settings, "OUTBOX_SUBSCRIBERS", {}).get(topic, [])
+
+
+def _backoff(attempts):
+    return min(timedelta(seconds=2 ** attempts), MAX_BACKOFF)
+
+
+def _deliver(event):
+    """
+    Hand the event to each subscriber, each in its own savepoint so one
+    failing doesn't undo the others' receipts: a retry only reaches the
+    subscribers that haven't handled it. Raises the first failure.
+    """
+    error = None
+    for subscriber in subscribers(event.topic):
+        try:
+            with transaction.atomic():
+                if subscriber.startswith(TASK_PREFIX):
+                    current_app.send_task(subscriber[len(TASK_PREFIX):], args=[event.pk])
+                elif _receipt(event, subscriber):
+                    import_string(subscriber)(event)
+        except Exception as exc:
+            logger.exception("Outbox subscriber %s failed on event %s", subscriber, event.pk)
+            error = error or exc
+    if error is not None:
+        raise error
+
+
+def dispatch(batch_size=DISPATCH_BATCH_SIZE, max_batches=None):
+    """
+    Deliver pending events. Returns (dispatched, failed) counts.
+    """
+    dispatched = failed = batches = 0
+    while max_batches is None or batches < max_batches:
+        batches += 1
+        now = timezone.now()
+        with transaction.atomic():
+            events = list(
+                OutboxEvent.objects
+                .select_for_update(skip_locked=True)
+                .filter(dispatched_at__isnull=True, available_at__lte=now)
+                .order_by('pk')[:batch_size]
+            )
+            for event in events:
+                try:
+                    _deliver(event)
+                except Exception as exc:
+                    event.attempts += 1
+                    event.last_error = str(exc)[:255]
+                    event.available_at = now + _backoff(event.attempts)
+                    failed += 1
+                else:
+                    event.dispatched_at = now
+                    dispatched += 1
+            if events:
+                OutboxEvent.objects.bulk_update(
+                    events, ['dispatched_at', 'attempts', 'last_error', 'available_at']
+                )
+        if len(events) < batch_size:
+            break
+    return dispatched, failed
+
+
+# ---------- dedupe ----------
+
+def _receipt(event, consumer):
+    """
+    Record that `consumer` handles `event`; False if it already did.
+    Call inside the consumer's transaction.
+    """
+    _, created = OutboxReceipt.objects.get_or_create(consumer=consumer, event=event)
+    return created
+
+
+@contextmanager
+def delivery(event_id, consumer):
+    """
+    For Celery subscribers:
+
+        with outbox.delivery(event_id, "order-confirmation-email") as event:
+            if event is None:
+                return   # unknown event, or already handled
+            ...
+
+    The receipt is part of the block's transaction, so it is rolled back
+    (and the event handled again on redelivery) if the block raises.
+    """
+    with transaction.atomic():
+        event = OutboxEvent.objects.filter(pk=event_id).first()
+        yield event if event is not None and _receipt(event, consumer) else None
+
+
+# ---------- pull ----------
+
+def unhandled(consumer, topics):
+    """
+    Events on `topics` that `consumer` has no receipt for, oldest first.
+    """
+    return (
+        OutboxEvent.objects
+        .filter(topic__in=topics)
+        .exclude(receipts__consumer=consumer)
+        .order_by('pk')
+    )
+
+
+def mark_handled(consumer, events):
+    OutboxReceipt.objects.bulk_create(
+        [OutboxReceipt(consumer=consumer, event=event) for event in events],
+        ignore_conflicts=True,
+    )
+
+
+def prune(older_than=None):
+    """
+    Delete dispatched events (and their receipts) past the retention period.
+    """
+    retention = older_than or getattr(settings, "OUTBOX_RETENTION", DEFAULT_RETENTION)
+    deleted, _ = OutboxEvent.objects.filter(dispatched_at__lt=timezone.now() - retention).delete()
+    return deleted
@@ -0,0 +1,226 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(PageNumberPagination):
+    """
+    Page-number pagination by default, keyset (seek) pagination on request.
+
+    Send ?cursor= (empty on the first call) to switch to keyset mode; then
+    follow the `next` / `previous` links. The seek key is whatever ordering
+    the queryset ends up with (so ?ordering= is respected) plus the primary
+    key as a tie-breaker, e.g. (-created_at, -id) or (price, id).
+
+    Keyset pages skip COUNT(*) unless ?with_count=true is passed, and cost
+    the same on page 5,000 as on page 1.
+    """
+    cursor_query_param = 'cursor'
+    count_query_param = 'with_count'
+    invalid_cursor_message = 'Invalid cursor.'
+
+    # Used when neither the client nor the model picks an ordering
+    default_keyset_ordering = ('-pk',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.cursor_query_param in request.query_params
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.with_count = request.query_params.get(self.count_query_param, '').lower() in ('1', 'true')
+        self.count = queryset.count() if self.with_count else None
+
+        self.ordering = self.get_keyset_ordering(queryset)
+        self.pk_name = queryset.model._meta.pk.name
+        position, reverse = self.decode_cursor(request, queryset.model)
+
+        ordering = self._reversed(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._seek_condition(ordering, position))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        # "more" is relative to the direction we were walking in
+        self.has_next = has_more if not reverse else position is not None
+        self.has_previous = position is not None if not reverse else has_more
+        self.first_row = rows[0] if rows else None
+        self.last_row = rows[-1] if rows else None
+        return rows
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+
+        payload = OrderedDict()
+        if self.with_count:
+            payload['count'] = self.count
+        payload['next'] = self.get_next_link()
+        payload['previous'] = self.get_previous_link()
+        payload['results'] = data
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema['properties']['count']['description'] = (
+            'Omitted in cursor mode unless with_count=true.'
+        )
+        schema['required'] = ['results']
+        return schema
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters += [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Switches to cursor pagination. Pass an empty value for the first page.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.count_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Include the total count in cursor mode (costs a COUNT query).',
+                'schema': {'type': 'boolean'},
+            },
+        ]
+        return parameters
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if not self.has_next or self.last_row is None:
+            return None
+        return self._link(self.last_row, reverse=False)
+
+    def get_previous_link(self):
+        if not self.keyset:
+            return super().get_previous_link()
+        if not self.has_previous or self.first_row is None:
+            return None
+        return self._link(self.first_row, reverse=True)
+
+    # ---------- keyset helpers ----------
+
+    def get_keyset_ordering(self, queryset):
+        """
+        Ordering already applied to the queryset (OrderingFilter, search rank
+        or Meta.ordering), with the primary key appended as a tie-breaker.
+        """
+        if queryset.query.order_by:
+            ordering = list(queryset.query.order_by)
+        elif queryset.query.default_ordering and queryset.model._meta.ordering:
+            ordering = list(queryset.model._meta.ordering)
+        else:
+            ordering = list(self.default_keyset_ordering)
+
+        if not all(isinstance(field, str) for field in ordering):
+            ordering = list(self.default_keyset_ordering)
+
+        pk_name = queryset.model._meta.pk.name
+        names = {field.lstrip('-') for field in ordering}
+        if not names & {'pk', pk_name}:
+            descending = ordering[0].startswith('-')
+            ordering.append(f"-{pk_name}" if descending else pk_name)
+        return ordering
+
+    @staticmethod
+    def _reversed(ordering):
+        return [field[1:] if field.startswith('-') else f"-{field}" for field in ordering]
+
+    @staticmethod
+    def _seek_condition(ordering, position):
+        """
+        Rows strictly after `position` in `ordering`:
+        (a > x) OR (a = x AND b > y) OR ...
+        """
+        condition = Q()
+        equal_so_far = Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal_so_far & Q(**{f"{name}__{lookup}": value})
+            equal_so_far &= Q(**{name: value})
+        return condition
+
+    def _link(self, row, reverse):
+        values = [self._row_value(row, field.lstrip('-')) for field in self.ordering]
+
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(values, reverse))
+
+    def _row_value(self, row, name):
+        # rows are model instances, or dicts from a values() queryset
+        if isinstance(row, dict):
+            return row[self.pk_name if name == 'pk' else name]
+        value = row
+        for part in name.split('__'):
+            value = getattr(value, part)
+        return value
+
+    def encode_cursor(self, values, reverse):
+        payload = {
+            'o': self.ordering,
+            'v': [value if isinstance(value, (int, float)) else str(value) for value in values],
+        }
+        if reverse:
+            payload['r'] = 1
+        raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii')
+
+    def decode_cursor(self, request, model):
+        """
+        Returns (position, reverse). position is None for the first page.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            ordering, raw_values = payload['o'], payload['v']
+            reverse = bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+        # A cursor is only valid for the ordering it was issued for
+        if ordering != self.ordering or len(raw_values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        position = []
+        for field, raw in zip(ordering, raw_values):
+            position.append(self._to_python(model, field.lstrip('-'), raw))
+        return position, reverse
+
+    def _to_python(self, model, name, raw):
+        if '__' in name:
+            return raw
+        if name == 'pk':
+            field = model._meta.pk
+        else:
+            try:
+                field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                # annotations such as search_rank
+                return raw
+        try:
+            return field.to_python(raw)
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
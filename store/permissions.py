@@ -29,6 +29,21 @@ class IsAdminOrManagerOrReadOnly(BasePermission):
 
         return False
         
+class IsAdminOrManager(BasePermission):
+    """
+    Admins or Store Managers only, reads included.
+    """
+
+    def has_permission(self, request, view):
+        user = request.user
+        if not user or not user.is_authenticated:
+            return False
+        return user.is_superuser or (
+            (hasattr(user, "is_admin") and user.is_admin())
+            or (hasattr(user, "is_store_manager") and user.is_store_manager())
+        )
+
+
 class IsCustomer(BasePermission):
     """
     Only allow authenticated customers.
@@ -0,0 +1,272 @@
+"""
+Time-bounded stock reservations for cart lines.
+
+Adding to the cart reserves the units for CART_RESERVATION_TTL seconds.
+Product.reserved is a maintained counter of all reservation rows, so
+availability is `stock - reserved` read off the product row; there is no
+SUM over reservations per request.
+
+- reserve()        cart add/update: one conditional UPDATE on the counter
+                   (WHERE stock - reserved >= extra units) plus an upsert
+- reserve_many()   whole-cart version: a fixed number of queries for any
+                   number of products (bulk cart endpoint)
+- release()        cart line removed
+- release_expired() the sweeper: deletes expired rows in batches and gives
+                   their units back with one UPDATE per batch
+
+Checkout (store/checkout.py) consumes the user's reservations: reserved
+units are already accounted for, so they can't fail for lack of stock.
+
+Sharded products (store/inventory.py) aren't held: a hold would lock
+the product row, which is what sharding avoids. Their availability is
+checked against the live shard total instead, and checkout re-checks it.
+
+Cart code calls these holding the user's cart lock (store/cart.py), so a
+user's reservations never change concurrently.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from . import inventory
+from .models import Product, StockReservation
+
+DEFAULT_TTL = 60 * 15
+SWEEP_BATCH_SIZE = 1000
+
+
+class ReservationError(Exception):
+    """
+    Not enough unreserved stock; the message is user-facing. `errors` maps
+    product ids to messages when several products were involved.
+    """
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors or {}
+
+
+def get_ttl():
+    return getattr(settings, "CART_RESERVATION_TTL", DEFAULT_TTL)
+
+
+def _products():
+    # Plain QuerySet: `reserved` isn't part of any catalog payload, so these
+    # updates don't need ProductQuerySet's cache bumps.
+    return models.QuerySet(Product)
+
+
+def _per_product(values):
+    return Case(
+        *[When(pk=product_id, then=Value(value)) for product_id, value in values.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def reserve(user, product, quantity, message="Not enough stock available."):
+    """
+    Hold `quantity` units of `product` for `user` (the cart line's total,
+    not an increment) and restart the TTL. Raises ReservationError.
+    """
+    if product.stock_shards:
+        live = inventory.available([(product.pk, product.stock, product.reserved, product.stock_shards)])
+        if not product.is_active or quantity > live[product.pk]:
+            raise ReservationError(message)
+        return
+
+    with transaction.atomic():
+        current = (
+            StockReservation.objects
+            .select_for_update()
+            .filter(user=user, product=product)
+            .values_list('quantity', flat=True)
+            .first()
+        ) or 0
+
+        extra = quantity - current
+        if extra > 0 and not _hold(product.pk, extra):
+            # expired holds may still be counted; free them and try once more
+            freed = release_expired(product_ids=[product.pk], exclude_user=user)
+            if not freed or not _hold(product.pk, extra):
+                raise ReservationError(message)
+        elif extra < 0:
+            _products().filter(pk=product.pk).update(reserved=Greatest(F('reserved') + extra, 0))
+
+        StockReservation.objects.update_or_create(
+            user=user,
+            product=product,
+            defaults={'quantity': quantity, 'expires_at': timezone.now() + timedelta(seconds=get_ttl())},
+        )
+
+
+def _hold(product_id, units):
+    return _products().filter(
+        pk=product_id,
+        is_active=True,
+        stock__gte=F('reserved') + units,
+    ).update(reserved=F('reserved') + units) == 1
+
+
+def reserve_many(user, targets):
+    """
+    Set the user's holds to `targets` ({product_id: units}, 0 releases) in a
+    fixed number of queries. Validates every product first and raises
+    ReservationError listing each problem; nothing is held in that case.
+    Returns {product_id: product name} for the products involved.
+    """
+    if not targets:
+        return {}
+    sharded, names, errors = _check_sharded(targets)
+    targets = {product_id: units for product_id, units in targets.items() if product_id not in sharded}
+    with transaction.atomic():
+        held = dict(
+            StockReservation.objects
+            .select_for_update()
+            .filter(user=user, product_id__in=list(targets))
+            .values_list('product_id', 'quantity')
+        )
+        extra = {product_id: units - held.get(product_id, 0) for product_id, units in targets.items()}
+
+        rows, plain_errors = _check_products(extra)
+        short = [product_id for product_id, message in plain_errors.items() if message is _SHORT]
+        if short and release_expired(product_ids=short, exclude_user=user):
+            # expired holds were still counted; look again
+            rows, plain_errors = _check_products(extra)
+        errors.update(plain_errors)
+        names.update((product_id, row[0]) for product_id, row in rows.items())
+        if errors:
+            errors = {
+                product_id: f"Not enough stock for {names[product_id]}." if message is _SHORT else message
+                for product_id, message in errors.items()
+            }
+            raise ReservationError("Some products can't be added to your cart.", errors)
+
+        changed = {product_id: units for product_id, units in extra.items() if units}
+        if changed:
+            _products().filter(pk__in=sorted(changed)).update(
+                reserved=Greatest(F('reserved') + _per_product(changed), 0)
+            )
+
+        expires_at = timezone.now() + timedelta(seconds=get_ttl())
+        if targets:
+            StockReservation.objects.bulk_create(
+                [
+                    StockReservation(user=user, product_id=product_id, quantity=units, expires_at=expires_at)
+                    for product_id, units in targets.items() if units > 0
+                ],
+                update_conflicts=True,
+                unique_fields=['user', 'product'],
+                update_fields=['quantity', 'expires_at'],
+            )
+        released = [product_id for product_id, units in targets.items() if units <= 0 and product_id in held]
+        if released:
+            StockReservation.objects.filter(user=user, product_id__in=released).delete()
+
+    return names
+
+
+# marker for "short of stock" until we know the product name
+_SHORT = object()
+
+
+def _check_products(extra):
+    """
+    Lock the products (pk order) and check each can cover its extra units.
+    Returns ({product_id: (name, stock, reserved, is_active)}, {product_id: error}).
+    """
+    rows = {
+        pk: (name, stock, reserved, is_active)
+        for pk, name, stock, reserved, is_active in (
+            _products()
+            .select_for_update()
+            .filter(pk__in=list(extra))
+            .order_by('pk')
+            .values_list('pk', 'name', 'stock', 'reserved', 'is_active')
+        )
+    }
+    errors = {}
+    for product_id, units in extra.items():
+        if product_id not in rows:
+            errors[product_id] = "Product not found."
+        elif units > 0 and not rows[product_id][3]:
+            errors[product_id] = f"{rows[product_id][0]} is no longer available."
+        elif units > 0 and units > rows[product_id][1] - rows[product_id][2]:
+            errors[product_id] = _SHORT
+    return rows, errors
+
+
+def _check_sharded(targets):
+    """
+    Check sharded products against their live shard totals, without locks.
+    Returns ({product_id} sharded, {product_id: name}, {product_id: error}).
+    """
+    rows = list(
+        _products()
+        .filter(pk__in=list(targets), stock_shards__gt=0)
+        .values_list('pk', 'name', 'stock', 'reserved', 'stock_shards', 'is_active')
+    )
+    live = inventory.available((pk, stock, reserved, shards) for pk, _, stock, reserved, shards, _ in rows)
+    names, errors = {}, {}
+    for pk, name, _, _, _, is_active in rows:
+        names[pk] = name
+        if targets[pk] > 0 and not is_active:
+            errors[pk] = f"{name} is no longer available."
+        elif targets[pk] > live[pk]:
+            errors[pk] = _SHORT
+    return set(names), names, errors
+
+
+def release(user, product_ids):
+    """
+    Drop the user's reservations for these products and return the units.
+    """
+    with transaction.atomic():
+        held = dict(
+            StockReservation.objects
+            .select_for_update()
+            .filter(user=user, product_id__in=list(product_ids))
+            .values_list('product_id', 'quantity')
+        )
+        if held:
+            StockReservation.objects.filter(user=user, product_id__in=held).delete()
+            _give_back(held)
+
+
+def _give_back(units_by_product):
+    units = _per_product(units_by_product)
+    _products().filter(pk__in=sorted(units_by_product)).update(reserved=Greatest(F('reserved') - units, 0))
+
+
+def release_expired(now=None, product_ids=None, exclude_user=None, batch_size=SWEEP_BATCH_SIZE):
+    """
+    Delete expired reservations and give their units back. Rows locked by a
+    checkout in progress are skipped. Returns the number released.
+    """
+    now = now or timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            expired = StockReservation.objects.select_for_update(skip_locked=True).filter(expires_at__lte=now)
+            if product_ids is not None:
+                expired = expired.filter(product_id__in=product_ids)
+            if exclude_user is not None:
+                expired = expired.exclude(user=exclude_user)
+            rows = list(expired.order_by('pk').values_list('pk', 'product_id', 'quantity')[:batch_size])
+            if not rows:
+                return released
+
+            units = Counter()
+            for _, product_id, quantity in rows:
+                units[product_id] += quantity
+            StockReservation.objects.filter(pk__in=[pk for pk, _, _ in rows]).delete()
+            _give_back(units)
+
+        released += len(rows)
+        if len(rows) < batch_size:
+            return released
@@ -0,0 +1,85 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
+
+# Same config the generated Product.search_vector column is built with.
+SEARCH_CONFIG = 'simple'
+
+# Only word characters are kept; everything else has meaning to to_tsquery().
+_TOKEN_RE = re.compile(r"\w+")
+
+MAX_TERMS = 8
+
+
+def build_search_query(term):
+    """
+    Turn free text into a prefix-matching tsquery.
+
+    "blue shi" -> 'blue:* & shi:*'
+    Returns None if nothing searchable is left after cleaning.
+    """
+    tokens = _TOKEN_RE.findall((term or "").lower())[:MAX_TERMS]
+    if not tokens:
+        return None
+    raw = " & ".join(f"{token}:*" for token in tokens)
+    return SearchQuery(raw, search_type='raw', config=SEARCH_CONFIG)
+
+
+def search_products(queryset, term):
+    """
+    Search a Product queryset using the indexed search vector.
+
+    - Exact SKU match is tried first and uses the unique sku index.
+    - Otherwise matches go through the GIN index and are ordered by rank.
+    """
+    term = (term or "").strip()
+    if not term:
+        return queryset
+
+    # Fast path: a single token that is an exact SKU
+    if " " not in term:
+        sku_matches = queryset.filter(sku__in={term, term.upper()})
+        if sku_matches.exists():
+            return sku_matches
+
+    query = build_search_query(term)
+    if query is None:
+        return queryset.none()
+
+    return (
+        queryset
+        .filter(search_vector=query)
+        # ts_rank() is float4; as float8 the value survives a round trip
+        # through a pagination cursor unchanged.
+        .annotate(search_rank=Cast(SearchRank(F('search_vector'), query), FloatField()))
+        .order_by('-search_rank', '-created_at')
+    )
+
+
+class ProductSearchFilter(BaseFilterBackend):
+    """
+    Drop-in replacement for SearchFilter on products.
+    Uses the same ?search= parameter, but ranked and index-backed.
+    """
+    search_param = api_settings.SEARCH_PARAM
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.search_param, '')
+        return search_products(queryset, term)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.search_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Ranked search over name, description and SKU (prefix matching).',
+                'schema': {
+                    'type': 'string',
+                },
+            },
+        ]
@@ -1,11 +1,57 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.urls import reverse
 from rest_framework import serializers
-from .models import Category, Product, CartItem, Order, OrderItem
+from .models import Category, Product, CartItem, CheckoutJob, Order, OrderItem
+from . import cache as catalog_cache, inventory
+from .cart import MAX_BULK_LINES
 
 
 class CategorySerializer(serializers.ModelSerializer):
+    parent = serializers.PrimaryKeyRelatedField(
+        queryset=Category.objects.all(),
+        required=False,
+        allow_null=True,
+    )
+
     class Meta:
         model = Category
-        fields = ['id', 'name', 'slug', 'description']
+        fields = ['id', 'name', 'slug', 'description', 'parent']
+
+    def validate_parent(self, value):
+        if value is not None and self.instance is not None and value.path.startswith(self.instance.path):
+            raise serializers.ValidationError("A category can't be moved under itself or one of its descendants.")
+        return value
+
+
+class CategoryTreeSerializer(CategorySerializer):
+    """
+    Category endpoints only. product_count changes with every product write,
+    so it stays out of the category nested in product payloads.
+    """
+
+    class Meta(CategorySerializer.Meta):
+        fields = CategorySerializer.Meta.fields + ['depth', 'product_count']
+        read_only_fields = ['depth', 'product_count']
+
+
+def validate_prices(price, discount_price):
+    """
+    Shared by ProductSerializer and the catalog importer.
+    """
+    if price is not None and price < 0:
+        raise serializers.ValidationError({"price": "Price cannot be negative."})
+
+    if discount_price is not None:
+        if discount_price < 0:
+            raise serializers.ValidationError({"discount_price": "Discount price cannot be negative."})
+        if price is not None and discount_price > price:
+            raise serializers.ValidationError(
+                {"discount_price": "Discount price cannot be greater than price."}
+            )
 
 
 class ProductSerializer(serializers.ModelSerializer):
@@ -15,6 +61,7 @@ class ProductSerializer(serializers.ModelSerializer):
         source='category',
         write_only=True
     )
+    effective_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
 
     class Meta:
         model = Product
@@ -26,6 +73,7 @@ class ProductSerializer(serializers.ModelSerializer):
             'description',
             'price',
             'discount_price',
+            'effective_price',
             'stock',
             'is_active',
             'created_at',
@@ -36,6 +84,9 @@ class ProductSerializer(serializers.ModelSerializer):
     def validate_stock(self, value):
         if value <0:
             raise serializers.ValidationError("Stock cannot be negative.")
+        if self.instance is not None and self.instance.stock_shards and value != self.instance.stock:
+            # lives in StockShard rows; see store/inventory.py
+            raise serializers.ValidationError(inventory.SHARDED_STOCK_ERROR)
         return value
 
     def validate(self, attrs):
@@ -47,18 +98,7 @@ class ProductSerializer(serializers.ModelSerializer):
         """
         price = attrs.get('price', getattr(self.instance, 'price', None))
         discount_price = attrs.get('discount_price', getattr(self.instance, 'discount_price', None))
-
-        if price is not None and price < 0:
-            raise serializers.ValidationError({"price": "Price cannot be negative."})
-
-        if discount_price is not None:
-            if discount_price < 0:
-                raise serializers.ValidationError({"discount_price": "Discount price cannot be negative."})
-            if price is not None and discount_price > price:
-                raise serializers.ValidationError(
-                    {"discount_price": "Discount price cannot be greater than price."}
-                )
-
+        validate_prices(price, discount_price)
         return attrs
 
 class CartItemSerializer(serializers.ModelSerializer):
@@ -86,12 +126,75 @@ class CartItemSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Quantity must be at least 1.")
         return value
 
+class CartBulkLineSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField()
+
+
+class CartBulkSerializer(serializers.Serializer):
+    """
+    PUT: the full desired cart (quantity >= 1; unlisted lines are removed).
+    PATCH: per-product deltas (negative removes units; <= 0 drops the line).
+    """
+    items = CartBulkLineSerializer(many=True, allow_empty=True)
+
+    def validate_items(self, items):
+        if len(items) > MAX_BULK_LINES:
+            raise serializers.ValidationError(f"At most {MAX_BULK_LINES} products per request.")
+        product_ids = [item['product_id'] for item in items]
+        if len(set(product_ids)) != len(product_ids):
+            raise serializers.ValidationError("Each product may appear only once.")
+        if self.context.get('replace') and any(item['quantity'] < 1 for item in items):
+            raise serializers.ValidationError("Quantities must be at least 1; leave a product out to remove it.")
+        return items
+
+    def to_quantities(self):
+        return {item['product_id']: item['quantity'] for item in self.validated_data['items']}
+
+
+class CartSummaryLineSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField()
+    effective_price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    short = serializers.BooleanField()
+
+
+class CartSummarySerializer(serializers.Serializer):
+    """
+    Cart totals computed in the database (store/cart.py: cart_summary).
+    `lines` is only present with ?lines=true.
+    """
+    line_count = serializers.IntegerField()
+    item_count = serializers.IntegerField()
+    subtotal = serializers.DecimalField(max_digits=12, decimal_places=2)
+    discount_total = serializers.DecimalField(max_digits=12, decimal_places=2)
+    short_lines = serializers.IntegerField()
+    has_shortfall = serializers.BooleanField()
+    lines = CartSummaryLineSerializer(many=True, required=False)
+
+
+class GuestCartLineSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    name = serializers.CharField()
+    slug = serializers.CharField()
+    effective_price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    quantity = serializers.IntegerField()
+
+
+class GuestCartSerializer(serializers.Serializer):
+    """
+    Response shape of the guest cart; `token` goes back in X-Cart-Token.
+    """
+    token = serializers.CharField(allow_null=True)
+    items = GuestCartLineSerializer(many=True)
+
+
 class OrderItemSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
 
     class Meta:
         model = OrderItem
-        fields = ['id', 'product', 'quantity', 'price_at_purchase']
+        fields = ['id', 'product', 'product_name', 'product_sku', 'quantity', 'price_at_purchase']
 
 
 class OrderSerializer(serializers.ModelSerializer):
@@ -100,3 +203,163 @@ class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = ['id', 'status', 'total_amount', 'created_at', 'updated_at', 'items']
+
+
+class CheckoutJobSerializer(serializers.ModelSerializer):
+    """
+    A queued checkout; `order` is filled in once it is DONE.
+    """
+    order = OrderSerializer(read_only=True)
+    status_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = CheckoutJob
+        fields = ['id', 'status', 'error', 'order', 'status_url', 'created_at', 'started_at', 'finished_at']
+
+    def get_status_url(self, job) -> str:
+        url = reverse('checkout-job-detail', args=[job.pk])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
+class OrderItemCompactSerializer(serializers.ModelSerializer):
+    """
+    Snapshot taken at checkout; no product (or category) lookup.
+    """
+
+    class Meta:
+        model = OrderItem
+        fields = ['id', 'product_id', 'product_name', 'product_sku', 'quantity', 'price_at_purchase']
+
+
+class OrderCompactSerializer(serializers.ModelSerializer):
+    items = OrderItemCompactSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ['id', 'status', 'total_amount', 'created_at', 'updated_at', 'items']
+
+
+class ProductImportRowSerializer(serializers.Serializer):
+    """
+    One row of a catalog import. Only `sku` is required: rows for existing
+    SKUs are partial updates. Category is a slug or an id. No DB lookups
+    here; the importer resolves categories and SKUs per chunk.
+    """
+    sku = serializers.CharField(max_length=50)
+    name = serializers.CharField(max_length=200, required=False)
+    slug = serializers.SlugField(max_length=220, required=False)
+    description = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+    discount_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=0, required=False, allow_null=True
+    )
+    stock = serializers.IntegerField(min_value=0, required=False)
+    is_active = serializers.BooleanField(required=False)
+    category = serializers.CharField(max_length=120, required=False)
+
+
+# Read-only shapes for the product facets endpoint
+
+class CategoryFacetSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    slug = serializers.CharField()
+    count = serializers.IntegerField()
+
+
+class PriceBucketSerializer(serializers.Serializer):
+    min = serializers.DecimalField(max_digits=12, decimal_places=2)
+    max = serializers.DecimalField(max_digits=12, decimal_places=2)
+    count = serializers.IntegerField()
+
+
+class ProductFacetsSerializer(serializers.Serializer):
+    total = serializers.IntegerField()
+    discounted = serializers.IntegerField()
+    in_stock = serializers.IntegerField()
+    categories = CategoryFacetSerializer(many=True)
+    price_buckets = PriceBucketSerializer(many=True)
+
+
+# ---------- Read-only fast path for product GETs ----------
+#
+# ProductSerializer builds a nested CategorySerializer and a queryset-backed
+# PrimaryKeyRelatedField for every row. For list/retrieve we only need to
+# turn a values() row into the same JSON, so do that directly.
+# `manage.py bench_product_serialization` checks the output is identical.
+
+PRODUCT_READ_COLUMNS = (
+    'id',
+    'name',
+    'slug',
+    'sku',
+    'description',
+    'price',
+    'discount_price',
+    'effective_price',
+    'stock',
+    'is_active',
+    'created_at',
+    'updated_at',
+    'category_id',
+)
+
+_CENT = Decimal('0.01')
+
+
+def _decimal(value):
+    # Same as DRF DecimalField(decimal_places=2) with COERCE_DECIMAL_TO_STRING
+    return None if value is None else '{:f}'.format(value.quantize(_CENT))
+
+
+def _datetime(value):
+    # Same as DRF DateTimeField with the default ISO 8601 format
+    if value is None:
+        return None
+    value = timezone.localtime(value).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def get_category_representations():
+    """
+    {category_id: CategorySerializer data} for every category, cached until
+    the next category write (same generation the catalog views use). Copies
+    left behind by a bump age out with the catalog TTL.
+    """
+    generation = catalog_cache.get_generations([catalog_cache.CATEGORIES])[catalog_cache.CATEGORIES]
+    key = f"{catalog_cache.KEY_PREFIX}:category-data:{generation}"
+    return cache.get_or_set(
+        key,
+        lambda: {category.pk: dict(CategorySerializer(category).data) for category in Category.objects.all()},
+        timeout=getattr(settings, "CACHE_TTL_CATALOG", 60 * 60),
+    )
+
+
+def product_row_to_representation(row, categories):
+    return {
+        'id': row['id'],
+        'name': row['name'],
+        'slug': row['slug'],
+        'sku': row['sku'],
+        'description': row['description'],
+        'price': _decimal(row['price']),
+        'discount_price': _decimal(row['discount_price']),
+        'effective_price': _decimal(row['effective_price']),
+        'stock': row['stock'],
+        'is_active': row['is_active'],
+        'created_at': _datetime(row['created_at']),
+        'updated_at': _datetime(row['updated_at']),
+        'category': categories.get(row['category_id']),
+    }
+
+
+def serialize_product_rows(rows):
+    """
+    ProductSerializer(many=True).data equivalent for values() rows that
+    include PRODUCT_READ_COLUMNS.
+    """
+    categories = get_category_representations()
+    return [product_row_to_representation(row, categories) for row in rows]
@@ -0,0 +1,64 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import cache as catalog_cache
+from .models import Category, Product, product_count_deltas
+
+
+@receiver(post_init, sender=Product)
+def remember_catalog_keys(sender, instance, **kwargs):
+    # Read straight from __dict__ so deferred fields don't trigger a query
+    instance._catalog_original = (
+        instance.__dict__.get('category_id'),
+        instance.__dict__.get('slug'),
+        instance.__dict__.get('is_active'),
+    )
+
+
+def _original(instance):
+    original_category_id, original_slug, original_active = getattr(
+        instance, '_catalog_original', (None, None, None)
+    )
+    # a field deferred at load time can't have been changed through this instance
+    if original_category_id is None:
+        original_category_id = instance.category_id
+    if original_active is None:
+        original_active = instance.is_active
+    return original_category_id, original_slug, original_active
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, raw=False, **kwargs):
+    original_category_id, original_slug, original_active = _original(instance)
+
+    if not raw:
+        removed = [] if created else [(original_category_id, original_active)]
+        Category.objects.adjust_product_counts(
+            product_count_deltas(removed, [(instance.category_id, instance.is_active)])
+        )
+
+    # covers products moving between categories or being renamed
+    catalog_cache.bump_products(
+        {instance.category_id, original_category_id},
+        {instance.slug, original_slug},
+    )
+    instance._catalog_original = (instance.category_id, instance.slug, instance.is_active)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    original_category_id, original_slug, original_active = _original(instance)
+
+    Category.objects.adjust_product_counts(
+        product_count_deltas(removed=[(original_category_id, original_active)])
+    )
+    catalog_cache.bump_products(
+        {instance.category_id, original_category_id},
+        {instance.slug, original_slug},
+    )
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_cache(sender, instance, **kwargs):
+    catalog_cache.bump_categories([instance.pk])
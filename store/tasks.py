@@ -2,10 +2,14 @@ from datetime import timedelta
 from decimal import Decimal
 
 from celery import shared_task
+from django.core.mail import send_mail
 from django.utils import timezone
 
 from accounts.models import User
 from store.models import Order, Product
+from store.reservations import release_expired
+from store.checkout_queue import run_job
+from store import inventory, outbox
 
 
 @shared_task(name="generate_crm_report")
@@ -83,3 +87,80 @@ def generate_crm_report():
         "low_stock_count": low_stock_count,
         "pending_orders": pending_orders,
     }
+
+
+@shared_task(name="release_expired_reservations")
+def release_expired_reservations():
+    """
+    Give the stock held by expired cart reservations back to the catalog.
+    """
+    return release_expired()
+
+
+@shared_task(name="process_checkout_job")
+def process_checkout_job(job_id):
+    """
+    Place the order for a queued checkout (store/checkout_queue.py). Sent to
+    the job's partition queue, "checkout.<n>".
+    """
+    return run_job(job_id)
+
+
+@shared_task(name="dispatch_outbox")
+def dispatch_outbox():
+    """
+    Deliver pending outbox events to their subscribers (store/outbox.py).
+    """
+    dispatched, failed = outbox.dispatch()
+    return {"dispatched": dispatched, "failed": failed}
+
+
+@shared_task(name="prune_outbox")
+def prune_outbox():
+    return outbox.prune()
+
+
+@shared_task(name="compact_stock_ledger")
+def compact_stock_ledger():
+    """
+    Fold pending stock ledger rows into Product.stock (store/inventory.py).
+    """
+    return inventory.compact()
+
+
+@shared_task(
+    name="send_order_confirmation",
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    max_retries=5,
+)
+def send_order_confirmation(event_id):
+    """
+    order.placed subscriber: email the customer. Redelivered events are
+    skipped by the outbox receipt.
+    """
+    with outbox.delivery(event_id, "order-confirmation-email") as event:
+        if event is None:
+            return False
+
+        order = Order.objects.select_related("user").filter(pk=event.payload["order_id"]).first()
+        if order is None or not order.user.email:
+            return False
+        user = order.user
+
+        message = (
+            f"Hi {user.username},\n\n"
+            f"Thank you for your order (ID: {order.id}). "
+            f"We received your payment of {order.total_amount}.\n\n"
+            f"You can follow it from your Duka account.\n\n"
+            f"Thank you,\n"
+            f"The Duka Team"
+        )
+        send_mail(
+            f"Your Duka order #{order.id}",
+            message,
+            None,  # uses DEFAULT_FROM_EMAIL
+            [user.email],
+            fail_silently=False,
+        )
+    return True
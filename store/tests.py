@@ -1,3 +1,200 @@
-from django.test import TestCase
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test import TransactionTestCase
+from rest_framework.test import APIClient
+
+from accounts.models import User
+
+from . import inventory, outbox
+from .cart import CartError, add_to_cart
+from .checkout import CheckoutError, place_order
+from .models import (
+    CartItem, Category, Order, OrderItem, OutboxEvent, Product, StockMovement, StockReservation, StockShard,
+)
+
+
+def run_concurrently(func, args_list):
+    """
+    Call func(*args) for every args tuple, each on its own thread and
+    database connection, all released at once. Returns the results (or
+    the exceptions raised) in order.
+    """
+    barrier = threading.Barrier(len(args_list))
+
+    def call(args):
+        try:
+            barrier.wait(timeout=10)
+            return func(*args)
+        except Exception as exc:
+            return exc
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=len(args_list)) as pool:
+        return list(pool.map(call, args_list))
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "row locking needs PostgreSQL")
+class ConcurrentCheckoutTests(TransactionTestCase):
+    """
+    Real concurrent transactions (hence TransactionTestCase): every thread
+    commits on its own connection, as separate requests would.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name="Hot", slug="hot")
+        self.product = Product.objects.create(
+            category=self.category, name="Hot item", slug="hot-item", sku="HOT-1", price=10, stock=5,
+        )
+        self.customers = [
+            User.objects.create_user(f"customer-{i}", password="p", role=User.Roles.CUSTOMER)
+            for i in range(12)
+        ]
+
+    def checkout(self, user):
+        try:
+            return place_order(user)
+        except CheckoutError:
+            return None
+
+    def test_concurrent_orders_do_not_oversell(self):
+        CartItem.objects.bulk_create([
+            CartItem(user=user, product=self.product, quantity=1) for user in self.customers
+        ])
+
+        results = run_concurrently(self.checkout, [(user,) for user in self.customers])
+
+        self.assertFalse([result for result in results if isinstance(result, Exception)])
+        placed = [result for result in results if result is not None]
+        self.assertEqual(len(placed), 5)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+        self.assertEqual(sum(OrderItem.objects.values_list("quantity", flat=True)), 5)
+        # one order.placed event per order, written in the order's transaction
+        self.assertEqual(
+            set(OutboxEvent.objects.filter(topic=outbox.ORDER_PLACED).values_list("key", flat=True)),
+            {f"order:{order.pk}" for order in placed},
+        )
+
+    def test_reservations_are_counted_and_consumed(self):
+        def add(user):
+            try:
+                return add_to_cart(user, self.product, 1)
+            except CartError:
+                return None
+
+        results = run_concurrently(add, [(user,) for user in self.customers])
+
+        self.assertFalse([result for result in results if isinstance(result, Exception)])
+        self.assertEqual(len([result for result in results if result is not None]), 5)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 5)
+        self.assertEqual(sum(StockReservation.objects.values_list("quantity", flat=True)), 5)
+
+        holders = list(User.objects.filter(stock_reservations__isnull=False))
+        results = run_concurrently(self.checkout, [(user,) for user in holders])
+
+        self.assertTrue(all(isinstance(result, Order) for result in results), results)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.reserved), (0, 0))
+        self.assertFalse(StockReservation.objects.exists())
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "row locking needs PostgreSQL")
+class ShardedCheckoutTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name="Promo", slug="promo")
+        self.product = Product.objects.create(
+            category=category, name="Promo item", slug="promo-item", sku="PROMO-1", price=10, stock=7,
+        )
+        inventory.shard(self.product.pk, 4)
+        self.customers = [
+            User.objects.create_user(f"shopper-{i}", password="p", role=User.Roles.CUSTOMER)
+            for i in range(12)
+        ]
+        CartItem.objects.bulk_create([
+            CartItem(user=user, product=self.product, quantity=1) for user in self.customers
+        ])
+
+    def checkout(self, user):
+        try:
+            return place_order(user)
+        except CheckoutError:
+            return None
+
+    def test_concurrent_orders_do_not_oversell(self):
+        results = run_concurrently(self.checkout, [(user,) for user in self.customers])
+
+        self.assertFalse([result for result in results if isinstance(result, Exception)])
+        self.assertEqual(len([result for result in results if result is not None]), 7)
+        self.assertEqual(sum(OrderItem.objects.values_list("quantity", flat=True)), 7)
+        self.assertEqual(sum(StockShard.objects.values_list("available", flat=True)), 0)
+        sales = StockMovement.objects.filter(product=self.product, reason=StockMovement.Reason.SALE)
+        self.assertEqual(-sum(sales.values_list("delta", flat=True)), 7)
+
+        # stock lags the shards until compaction
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 7)
+        inventory.compact()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, sum(StockShard.objects.values_list("available", flat=True)))
+        self.assertFalse(StockMovement.objects.filter(compacted_at__isnull=True).exists())
+
+    def test_restock_and_reshard_during_checkout_keep_the_ledger_balanced(self):
+        jobs = [(self.checkout, user) for user in self.customers[:6]] + [
+            (inventory.restock, self.product.pk, 5),
+            (inventory.shard, self.product.pk, 8),
+        ]
+        run_concurrently(lambda func, *args: func(*args), jobs)
+
+        self.product.refresh_from_db()
+        pending = StockMovement.objects.filter(product=self.product, compacted_at__isnull=True)
+        self.assertEqual(
+            sum(StockShard.objects.values_list("available", flat=True)),
+            self.product.stock + sum(pending.values_list("delta", flat=True)),
+        )
+        inventory.compact()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 7 + 5 - 6)
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "row locking needs PostgreSQL")
+class IdempotentCheckoutTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name="Books", slug="books")
+        self.product = Product.objects.create(
+            category=category, name="Book", slug="book", sku="BOOK-1", price=10, stock=5,
+        )
+        self.user = User.objects.create_user("buyer", password="p", role=User.Roles.CUSTOMER)
+        CartItem.objects.create(user=self.user, product=self.product, quantity=2)
+
+    def post_checkout(self, key):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        return client.post("/api/checkout/", HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_replayed_key_returns_the_same_order(self):
+        first = self.post_checkout("order-1")
+        second = self.post_checkout("order-1")
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.json()["id"], first.json()["id"])
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_concurrent_retries_place_one_order(self):
+        responses = run_concurrently(self.post_checkout, [("order-2",)] * 4)
+
+        self.assertEqual({response.status_code for response in responses}, {201})
+        self.assertEqual(len({response.json()["id"] for response in responses}), 1)
+        self.assertEqual(Order.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
@@ -1,16 +1,37 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CategoryViewSet, ProductViewSet, CartItemListCreateView, CartItemDetailView, CheckoutView
+from .views import (
+    CategoryViewSet,
+    ProductViewSet,
+    CartItemListCreateView,
+    CartItemDetailView,
+    CartBulkView,
+    GuestCartView,
+    CartSummaryView,
+    CheckoutView,
+    CheckoutJobDetailView,
+    CheckoutMetricsView,
+    OrderViewSet,
+    CatalogCacheStatsView,
+)
 
 router = DefaultRouter()
 router.register(r'categories', CategoryViewSet, basename='category')
 router.register(r'products', ProductViewSet, basename='product')
+router.register(r'orders', OrderViewSet, basename='order')
 
 urlpatterns = [
     path('', include(router.urls)),
 
     path('cart/', CartItemListCreateView.as_view(), name='cart-list-create'),
+    path('cart/bulk/', CartBulkView.as_view(), name='cart-bulk'),
+    path('cart/guest/', GuestCartView.as_view(), name='cart-guest'),
+    path('cart/summary/', CartSummaryView.as_view(), name='cart-summary'),
     path('cart/<int:pk>/', CartItemDetailView.as_view(), name='cart-detail'),
 
     path('checkout/', CheckoutView.as_view(), name='checkout'),
+    path('checkout/jobs/<uuid:pk>/', CheckoutJobDetailView.as_view(), name='checkout-job-detail'),
+    path('checkout/metrics/', CheckoutMetricsView.as_view(), name='checkout-metrics'),
+
+    path('catalog/cache-stats/', CatalogCacheStatsView.as_view(), name='catalog-cache-stats'),
 ]
\ No newline at end of file
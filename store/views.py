@@ -1,34 +1,112 @@
-from rest_framework import generics, status,  viewsets, permissions
+from rest_framework import generics, status,  viewsets, permissions, serializers
+from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from django.shortcuts import render
 from rest_framework.views import APIView
 from rest_framework.filters import OrderingFilter, SearchFilter
-from .models import Category, Product, CartItem, Order, OrderItem
-from .serializers import CategorySerializer, ProductSerializer,  CartItemSerializer, OrderSerializer
-from .permissions import IsAdminOrManagerOrReadOnly, IsCustomer
+from .models import Category, Product, CartItem, CheckoutJob, Order, OrderItem
+from .serializers import (
+    CategoryTreeSerializer,
+    ProductSerializer,
+    CartItemSerializer,
+    CartBulkSerializer,
+    CartSummarySerializer,
+    GuestCartSerializer,
+    OrderSerializer,
+    OrderCompactSerializer,
+    CheckoutJobSerializer,
+    ProductFacetsSerializer,
+    PRODUCT_READ_COLUMNS,
+    serialize_product_rows,
+)
+from .facets import compute_facets, parse_bucket_size
+from .checkout import CheckoutError, place_order
+from . import checkout_queue
+from .cart import (
+    CartError,
+    add_to_cart,
+    apply_cart_deltas,
+    cart_summary,
+    remove_from_cart,
+    replace_cart,
+    update_cart_item,
+)
+from . import guest_cart, idempotency
+from .idempotency import idempotent
+from .permissions import IsAdminOrManager, IsAdminOrManagerOrReadOnly, IsCustomer
+from . import catalog_io
+from .pagination import KeysetPagination
+from .search import ProductSearchFilter
+from .filters import ProductOrderingFilter
+from .conditional import conditional_catalog_response
+from .cache import (
+    cache_catalog_response,
+    category_scopes,
+    product_detail_scopes,
+    product_list_scopes,
+    get_stats,
+)
+from django.core.cache import cache
+from django.db.models import Prefetch, ProtectedError
+from django.http import StreamingHttpResponse
+from rest_framework.parsers import MultiPartParser
 from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
+from drf_spectacular.types import OpenApiTypes
 from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import datetime, time, timedelta
 
 
+@method_decorator(conditional_catalog_response(category_scopes), name="list")
+@method_decorator(conditional_catalog_response(category_scopes), name="retrieve")
+@method_decorator(cache_catalog_response(settings.CACHE_TTL_CATALOG, category_scopes), name="list")
+@method_decorator(cache_catalog_response(settings.CACHE_TTL_CATALOG, category_scopes), name="retrieve")
 class CategoryViewSet(viewsets.ModelViewSet):
-    queryset = Category.objects.all()
-    serializer_class = CategorySerializer
+    serializer_class = CategoryTreeSerializer
     permission_classes = [IsAdminOrManagerOrReadOnly]
+    pagination_class = KeysetPagination
     filter_backends = [OrderingFilter, SearchFilter]
-    ordering_fields = ['name']
+    # ordering=path lists the tree depth-first
+    ordering_fields = ['name', 'path']
     search_fields = ['name', 'description']
 
-# decorators for cache products for 5 min and slug retrival for 10 min
-@method_decorator(cache_page(settings.CACHE_TTL_5_MIN), name="list")
-@method_decorator(cache_page(settings.CACHE_TTL_10_MIN), name="retrieve")
+    def get_queryset(self):
+        queryset = Category.objects.all()
+        parent = self.request.query_params.get('parent')
+        if parent == 'root':
+            queryset = queryset.filter(parent__isnull=True)
+        elif parent:
+            queryset = queryset.filter(parent_id=parent)
+        return queryset
+
+    def destroy(self, request, *args, **kwargs):
+        try:
+            return super().destroy(request, *args, **kwargs)
+        except ProtectedError:
+            return Response(
+                {"detail": "Category still has subcategories or products that were ordered."},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+# Cached until a product/category write bumps the matching generation
+# (see store/cache.py), so TTLs can be long. Conditional GETs are answered
+# with 304 before the response cache is even consulted.
+@method_decorator(conditional_catalog_response(product_list_scopes), name="list")
+@method_decorator(conditional_catalog_response(product_detail_scopes), name="retrieve")
+@method_decorator(cache_catalog_response(settings.CACHE_TTL_CATALOG, product_list_scopes), name="list")
+@method_decorator(cache_catalog_response(settings.CACHE_TTL_CATALOG, product_detail_scopes), name="retrieve")
+@method_decorator(cache_catalog_response(settings.CACHE_TTL_CATALOG, product_list_scopes), name="facets")
 class ProductViewSet(viewsets.ModelViewSet):
     serializer_class = ProductSerializer
     permission_classes = [IsAdminOrManagerOrReadOnly]
-    filter_backends = [OrderingFilter, SearchFilter]
-    ordering_fields = ['price', 'created_at']
-    search_fields = ['name', 'description', 'sku']
+    pagination_class = KeysetPagination
+    # search runs first so an explicit ?ordering= still wins over rank
+    filter_backends = [ProductSearchFilter, ProductOrderingFilter]
+    ordering_fields = ['price', 'effective_price', 'created_at']
     lookup_field = 'slug'
 
     def get_queryset(self):
@@ -38,15 +116,166 @@ class ProductViewSet(viewsets.ModelViewSet):
         if category_id:
             queryset = queryset.filter(category_id=category_id)
 
+        # Whole subtree (id or slug): one indexed prefix match on the path
+        tree_root = self.request.query_params.get('category_tree')
+        if tree_root:
+            lookup = {'pk': tree_root} if tree_root.isdigit() else {'slug': tree_root}
+            path = Category.objects.filter(**lookup).values_list('path', flat=True).first()
+            if path is None:
+                return queryset.none()
+            queryset = queryset.filter(category__path__startswith=path)
+
+        # Price filters apply to what customers pay (discount if any)
         min_price = self.request.query_params.get('min_price')
         max_price = self.request.query_params.get('max_price')
         if min_price:
-            queryset = queryset.filter(price__gte=min_price)
+            queryset = queryset.filter(effective_price__gte=min_price)
         if max_price:
-            queryset = queryset.filter(price__lte=max_price)
+            queryset = queryset.filter(effective_price__lte=max_price)
 
         return queryset
 
+    # GETs skip ProductSerializer and render values() rows directly
+    # (same JSON, see serialize_product_rows); writes still use it.
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = queryset.values(*self._read_columns(queryset))
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(serialize_product_rows(page))
+        return Response(serialize_product_rows(rows))
+
+    def retrieve(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup = {self.lookup_field: kwargs[self.lookup_url_kwarg or self.lookup_field]}
+        rows = list(queryset.filter(**lookup).values(*PRODUCT_READ_COLUMNS)[:1])
+        if not rows:
+            raise NotFound()
+        return Response(serialize_product_rows(rows)[0])
+
+    @staticmethod
+    def _read_columns(queryset):
+        # keep annotations used for ordering (e.g. search_rank) so keyset
+        # pagination can read them off the row
+        extra = [
+            field.lstrip('-') for field in queryset.query.order_by
+            if isinstance(field, str) and field.lstrip('-') in queryset.query.annotations
+        ]
+        return PRODUCT_READ_COLUMNS + tuple(extra)
+
+    @extend_schema(
+        summary="Catalog facets",
+        description=(
+            "Per-category counts, price buckets and discount/in-stock counts for the "
+            "same filters as the list (category, min_price, max_price, search)."
+        ),
+        responses={200: ProductFacetsSerializer},
+        parameters=[
+            OpenApiParameter(
+                name="bucket_size",
+                description="Width of each price bucket (default: 50).",
+                required=False,
+                type=float,
+            ),
+        ],
+    )
+    @action(detail=False, methods=['get'], pagination_class=None)
+    def facets(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        bucket_size = parse_bucket_size(request.query_params.get('bucket_size'))
+        serializer = ProductFacetsSerializer(compute_facets(queryset, bucket_size))
+        return Response(serializer.data)
+
+    @extend_schema(
+        summary="Bulk import products (upsert by SKU)",
+        description=(
+            "Multipart upload with a `file` field (CSV or JSON Lines). Rows are "
+            "validated and upserted in chunks; invalid rows are reported, not fatal."
+        ),
+        request={
+            "multipart/form-data": {
+                "type": "object",
+                "properties": {
+                    "file": {"type": "string", "format": "binary"},
+                    "file_format": {"type": "string", "enum": catalog_io.FORMATS},
+                },
+                "required": ["file"],
+            }
+        },
+        responses={200: OpenApiTypes.OBJECT},
+    )
+    @action(
+        detail=False,
+        methods=['post'],
+        url_path='import',
+        permission_classes=[IsAdminOrManager],
+        parser_classes=[MultiPartParser],
+    )
+    def import_catalog(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"detail": "Upload a file in the 'file' field."}, status=status.HTTP_400_BAD_REQUEST)
+
+        file_format = request.data.get('file_format') or catalog_io.guess_format(upload.name)
+        if file_format not in catalog_io.FORMATS:
+            return Response({"detail": f"file_format must be one of {', '.join(catalog_io.FORMATS)}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        report = catalog_io.import_catalog(catalog_io.open_text(upload), file_format)
+        return Response(report.as_dict())
+
+    @extend_schema(
+        summary="Export the catalog",
+        description="Streams every product (active or not) as CSV or JSON Lines.",
+        parameters=[
+            OpenApiParameter(
+                name="file_format",
+                description="csv (default) or jsonl",
+                required=False,
+                type=str,
+                enum=catalog_io.FORMATS,
+            ),
+        ],
+        responses={(200, "text/csv"): OpenApiTypes.BINARY},
+    )
+    @action(
+        detail=False,
+        methods=['get'],
+        url_path='export',
+        permission_classes=[IsAdminOrManager],
+        pagination_class=None,
+    )
+    def export_catalog(self, request):
+        file_format = request.query_params.get('file_format', catalog_io.CSV)
+        if file_format not in catalog_io.FORMATS:
+            return Response({"detail": f"file_format must be one of {', '.join(catalog_io.FORMATS)}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        content_type = "text/csv" if file_format == catalog_io.CSV else "application/x-ndjson"
+        response = StreamingHttpResponse(catalog_io.stream_export(file_format), content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="catalog.{file_format}"'
+        return response
+
+class CatalogCacheStatsView(APIView):
+    """
+    Admin-only: hit/miss counters for the catalog response cache.
+    """
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(summary="Catalog cache hit rate", responses={200: OpenApiTypes.OBJECT})
+    def get(self, request):
+        data = get_stats()
+        # per-tier counters when running on core.cache_backends.TwoTierCache
+        if hasattr(cache, "tier_stats"):
+            data["tiers"] = cache.tier_stats()
+        return Response(data)
+
+
+# Retried adds (same Idempotency-Key) replay the first response
+@method_decorator(idempotent("cart-add"), name="post")
+@extend_schema_view(post=extend_schema(parameters=[idempotency.SCHEMA_PARAMETER]))
 class CartItemListCreateView(generics.ListCreateAPIView):
     """
     GET: list current user's cart items
@@ -54,33 +283,165 @@ class CartItemListCreateView(generics.ListCreateAPIView):
     """
     serializer_class = CartItemSerializer
     permission_classes = [IsAuthenticated, IsCustomer]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        return CartItem.objects.filter(user=self.request.user).select_related('product')
+        return (
+            CartItem.objects
+            .filter(user=self.request.user)
+            .select_related('product')
+            .order_by('-created_at')
+        )
 
     def perform_create(self, serializer):
-        user = self.request.user
-        product = serializer.validated_data['product']
-        quantity = serializer.validated_data['quantity']
-
-        # Check stock before adding
-        if product.stock < quantity:
-            raise serializers.ValidationError("Not enough stock available.")
-
-        cart_item, created = CartItem.objects.get_or_create(
-            user=user,
-            product=product,
-            defaults={'quantity': quantity}
+        # adds to an existing line, and reserves the stock (store/cart.py)
+        try:
+            serializer.instance = add_to_cart(
+                self.request.user,
+                serializer.validated_data['product'],
+                serializer.validated_data['quantity'],
+            )
+        except CartError as exc:
+            raise serializers.ValidationError(str(exc))
+
+
+class CartBulkView(generics.GenericAPIView):
+    """
+    PUT: replace the whole cart. PATCH: apply per-product quantity deltas.
+    Either way the cart is validated and written in a fixed number of
+    queries (store/cart.py) and the resulting cart is returned.
+    """
+    serializer_class = CartBulkSerializer
+    permission_classes = [IsAuthenticated, IsCustomer]
+
+    @extend_schema(responses={200: CartItemSerializer(many=True)})
+    def put(self, request):
+        return self._apply(request, replace=True)
+
+    @extend_schema(
+        responses={200: CartItemSerializer(many=True)},
+        parameters=[idempotency.SCHEMA_PARAMETER],
+    )
+    @method_decorator(idempotent("cart-bulk"))
+    def patch(self, request):
+        return self._apply(request, replace=False)
+
+    def _apply(self, request, replace):
+        serializer = self.get_serializer(
+            data=request.data,
+            context={**self.get_serializer_context(), 'replace': replace},
         )
+        serializer.is_valid(raise_exception=True)
+        change = replace_cart if replace else apply_cart_deltas
+        try:
+            change(request.user, serializer.to_quantities())
+        except CartError as exc:
+            return Response(
+                {"detail": str(exc), "errors": exc.errors},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        if not created:
-            new_quantity = cart_item.quantity + quantity
-            if new_quantity > product.stock:
-                raise serializers.ValidationError("Not enough stock for this quantity.")
-            cart_item.quantity = new_quantity
-            cart_item.save()
+        cart_items = (
+            CartItem.objects
+            .filter(user=request.user)
+            .select_related('product__category')
+            .order_by('-created_at', '-pk')
+        )
+        return Response(CartItemSerializer(cart_items, many=True).data)
+
+
+class CartSummaryView(APIView):
+    """
+    Cart badge / checkout sidebar numbers without serializing the products.
+    """
+    permission_classes = [IsAuthenticated, IsCustomer]
 
-        serializer.instance = cart_item
+    @extend_schema(
+        responses={200: CartSummarySerializer},
+        parameters=[
+            OpenApiParameter(
+                name='lines',
+                type=OpenApiTypes.BOOL,
+                required=False,
+                description="Include a compact list of product ids, quantities and prices.",
+            ),
+        ],
+    )
+    def get(self, request):
+        with_lines = request.query_params.get('lines', '').lower() in ('1', 'true')
+        return Response(CartSummarySerializer(cart_summary(request.user, with_lines=with_lines)).data)
+
+
+_CART_TOKEN_PARAMETER = OpenApiParameter(
+    name=guest_cart.HEADER,
+    location=OpenApiParameter.HEADER,
+    required=False,
+    type=str,
+    description="Guest cart token from a previous response; omit to start a new cart.",
+)
+
+
+@extend_schema_view(
+    get=extend_schema(responses={200: GuestCartSerializer}, parameters=[_CART_TOKEN_PARAMETER]),
+    put=extend_schema(responses={200: GuestCartSerializer}, parameters=[_CART_TOKEN_PARAMETER]),
+    patch=extend_schema(responses={200: GuestCartSerializer}, parameters=[_CART_TOKEN_PARAMETER]),
+    delete=extend_schema(responses={204: None}, parameters=[_CART_TOKEN_PARAMETER]),
+)
+class GuestCartView(generics.GenericAPIView):
+    """
+    Cart for shoppers who aren't logged in, kept in the cache under the
+    X-Cart-Token header rather than in the database. Same body as the bulk
+    cart endpoint: PUT replaces, PATCH applies deltas. Send the token with
+    the login request to merge the cart into the account.
+    """
+    serializer_class = CartBulkSerializer
+    permission_classes = [AllowAny]
+
+    def _token(self, request, create=False):
+        token = request.headers.get(guest_cart.HEADER)
+        if token and not guest_cart.is_valid_token(token):
+            raise serializers.ValidationError({guest_cart.HEADER: "Invalid cart token."})
+        if not token and create:
+            token = guest_cart.new_token()
+        return token
+
+    def _respond(self, token, lines):
+        response = Response(GuestCartSerializer({'token': token, 'items': guest_cart.describe(lines)}).data)
+        if token:
+            response[guest_cart.HEADER] = token
+        return response
+
+    def get(self, request):
+        token = self._token(request)
+        return self._respond(token, guest_cart.get_lines(token))
+
+    def put(self, request):
+        return self._apply(request, replace=True)
+
+    def patch(self, request):
+        return self._apply(request, replace=False)
+
+    def delete(self, request):
+        guest_cart.clear(self._token(request))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def _apply(self, request, replace):
+        token = self._token(request, create=True)
+        serializer = self.get_serializer(
+            data=request.data,
+            context={**self.get_serializer_context(), 'replace': replace},
+        )
+        serializer.is_valid(raise_exception=True)
+        try:
+            lines = guest_cart.change_lines(token, serializer.to_quantities(), replace=replace)
+        except guest_cart.GuestCartBusy as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_409_CONFLICT)
+        except guest_cart.GuestCartError as exc:
+            return Response(
+                {"detail": str(exc), "errors": exc.errors},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return self._respond(token, lines)
 
 
 class CartItemDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -90,6 +451,112 @@ class CartItemDetailView(generics.RetrieveUpdateDestroyAPIView):
     def get_queryset(self):
         return CartItem.objects.filter(user=self.request.user).select_related('product')
 
+    def perform_update(self, serializer):
+        cart_item = serializer.instance
+        try:
+            update_cart_item(
+                self.request.user,
+                cart_item,
+                serializer.validated_data.get('product', cart_item.product),
+                serializer.validated_data.get('quantity', cart_item.quantity),
+            )
+        except CartError as exc:
+            raise serializers.ValidationError(str(exc))
+
+    def perform_destroy(self, instance):
+        remove_from_cart(self.request.user, instance)
+
+def _parse_moment(value, end_of_day=False):
+    """
+    ISO date or datetime from a query parameter. A bare date means the start
+    of that day, or the start of the next one for an exclusive upper bound.
+    """
+    # a bare date first: parse_datetime would read it as midnight
+    day = parse_date(value)
+    if day is not None:
+        moment = datetime.combine(day + timedelta(days=1) if end_of_day else day, time.min)
+    else:
+        moment = parse_datetime(value)
+        if moment is None:
+            raise ValueError(value)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+@extend_schema_view(
+    list=extend_schema(
+        parameters=[
+            OpenApiParameter(name='status', type=str, enum=Order.Status.values, required=False),
+            OpenApiParameter(
+                name='created_after', type=str, required=False,
+                description="ISO date or datetime; orders placed at or after it.",
+            ),
+            OpenApiParameter(
+                name='created_before', type=str, required=False,
+                description="ISO date (inclusive) or datetime (exclusive).",
+            ),
+            OpenApiParameter(
+                name='user', type=int, required=False,
+                description="Managers and admins only: one customer's orders.",
+            ),
+            OpenApiParameter(
+                name='compact', type=OpenApiTypes.BOOL, required=False,
+                description="Line snapshots (name, SKU, price paid) instead of nested products.",
+            ),
+        ],
+    ),
+    retrieve=extend_schema(
+        parameters=[OpenApiParameter(name='compact', type=OpenApiTypes.BOOL, required=False)],
+    ),
+)
+class OrderViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Order history. Customers see their own orders; managers and admins see
+    everyone's. A page costs the same number of queries whatever its size:
+    the orders, then one prefetch for their lines (with products and
+    categories unless ?compact=true).
+    """
+    permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    filter_backends = [OrderingFilter]
+    ordering_fields = ['created_at', 'total_amount']
+    ordering = ['-created_at']
+
+    def _compact(self):
+        return self.request.query_params.get('compact', '').lower() in ('1', 'true')
+
+    def get_serializer_class(self):
+        return OrderCompactSerializer if self._compact() else OrderSerializer
+
+    def get_queryset(self):
+        params = self.request.query_params
+        queryset = Order.objects.all()
+        if IsAdminOrManager().has_permission(self.request, self):
+            if params.get('user'):
+                if not params['user'].isdigit():
+                    raise serializers.ValidationError({"user": "Must be a user id."})
+                queryset = queryset.filter(user_id=params['user'])
+        else:
+            queryset = queryset.filter(user_id=self.request.user.pk)
+
+        if params.get('status'):
+            queryset = queryset.filter(status=params['status'].upper())
+        try:
+            if params.get('created_after'):
+                queryset = queryset.filter(created_at__gte=_parse_moment(params['created_after']))
+            if params.get('created_before'):
+                queryset = queryset.filter(created_at__lt=_parse_moment(params['created_before'], end_of_day=True))
+        except ValueError:
+            raise serializers.ValidationError({"detail": "Dates must be ISO 8601, e.g. 2025-01-31."})
+
+        lines = OrderItem.objects.order_by('pk')
+        if not self._compact():
+            lines = lines.select_related('product__category')
+        return queryset.prefetch_related(Prefetch('items', queryset=lines))
+
+
+@method_decorator(idempotent("checkout"), name="post")
 class CheckoutView(generics.GenericAPIView):
     """
     Convert the current user's cart into an order.
@@ -97,50 +564,68 @@ class CheckoutView(generics.GenericAPIView):
     permission_classes = [IsAuthenticated, IsCustomer]
     serializer_class = OrderSerializer
 
+    @extend_schema(
+        request=None,
+        responses={201: OrderSerializer, 202: CheckoutJobSerializer},
+        parameters=[
+            idempotency.SCHEMA_PARAMETER,
+            OpenApiParameter(
+                name='Prefer',
+                location=OpenApiParameter.HEADER,
+                required=False,
+                type=str,
+                description="`respond-async` queues the checkout and returns 202 with a status URL.",
+            ),
+        ],
+    )
     def post(self, request):
-        user = request.user
-        cart_items = CartItem.objects.filter(user=user).select_related('product')
-
-        if not cart_items.exists():
-            return Response({"detail": "Cart is empty."}, status=status.HTTP_400_BAD_REQUEST)
-
-        # 1. Check all stock first
-        for item in cart_items:
-            if item.quantity > item.product.stock:
-                return Response(
-                    {"detail": f"Not enough stock for {item.product.name}."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-        # 2. Create order
-        order = Order.objects.create(
-            user=user,
-            status=Order.Status.PENDING,
-            total_amount=0
-        )
-        total = 0
-
-        for item in cart_items:
-            product = item.product
-            price = product.discount_price or product.price
-            total += price * item.quantity
-
-            OrderItem.objects.create(
-                order=order,
-                product=product,
-                quantity=item.quantity,
-                price_at_purchase=price,
-            )
+        if checkout_queue.requested(request):
+            return self._enqueue(request)
 
-            product.stock -= item.quantity
-            product.save()
+        # atomic, row-locked and set-based; see store/checkout.py
+        try:
+            order = place_order(request.user)
+        except CheckoutError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
-        order.total_amount = total
-        order.status = Order.Status.PAID
-        order.save()
+        serializer = self.get_serializer(order)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        # Clear cart
-        cart_items.delete()
+    def _enqueue(self, request):
+        # validated now, placed by a worker (store/checkout_queue.py)
+        try:
+            job, _ = checkout_queue.submit(request.user)
+        except CheckoutError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
-        serializer = self.get_serializer(order)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
\ No newline at end of file
+        data = CheckoutJobSerializer(job, context=self.get_serializer_context()).data
+        return Response(data, status=status.HTTP_202_ACCEPTED, headers={'Location': data['status_url']})
+
+
+class CheckoutJobDetailView(generics.RetrieveAPIView):
+    """
+    Poll a queued checkout; once DONE it carries the order.
+    """
+    serializer_class = CheckoutJobSerializer
+    permission_classes = [IsAuthenticated, IsCustomer]
+
+    def get_queryset(self):
+        return (
+            CheckoutJob.objects
+            .filter(user_id=self.request.user.pk)
+            .select_related('order')
+            .prefetch_related(
+                Prefetch('order__items', queryset=OrderItem.objects.select_related('product__category'))
+            )
+        )
+
+
+class CheckoutMetricsView(APIView):
+    """
+    Managers/admins: queued checkout depth and time-to-complete.
+    """
+    permission_classes = [IsAdminOrManager]
+
+    @extend_schema(summary="Checkout queue metrics", responses={200: OpenApiTypes.OBJECT})
+    def get(self, request):
+        return Response(checkout_queue.metrics())